@@ -1,11 +1,26 @@
 #!/Users/qyq/miniconda3/envs/quant/bin/python
 
 
-import akshare as ak
+import os
+import sys
 import pandas as pd
 import talib
 from datetime import datetime, timedelta
 
+from zt_pool_archive import ZtPoolArchive
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "反转战法")
+)
+# QUANT_DATA_MODE=record/replay 时录制/回放 akshare 数据（见 反转战法/data_provider.py）
+try:
+    from data_provider import akshare as ak
+except ImportError:
+    import akshare as ak
+
+# 涨停/炸板股池统一走本地归档，已收盘的日期不再重复请求
+archive = ZtPoolArchive()
+
 
 # 主函数：每日策略执行
 def dragon_strategy_main():
@@ -36,16 +51,23 @@ def dragon_strategy_main():
 def select_main_board_stocks(date):
     """主板选股逻辑"""
     # 获取涨停数据
-    zt_pool = ak.stock_zt_pool_em(date=date)
+    zt_pool = archive.get_pool("zt", date)
+    # 获取炸板数据用于计算炸板次数
+    zbgc_data = archive.get_pool("zbgc", date)
+    return score_main_board_stocks(zt_pool, zbgc_data)
+
+
+def score_main_board_stocks(zt_pool, zbgc_data, top_n=5):
+    """对当日涨停股池打分，返回前 top_n 只主板标的"""
+    if zt_pool.empty:
+        return pd.DataFrame(columns=["代码", "名称", "连板数", "所属行业", "总分"])
+
     zt_pool = zt_pool[
         zt_pool["代码"].apply(
             lambda x: x[:3] not in ["300", "688"] and x[0] in ["6", "0"]
         )
     ]
 
-    # 获取炸板数据用于计算炸板次数
-    zbgc_data = ak.stock_zt_pool_zbgc_em(date=date)
-
     # 主板筛选条件
     filtered = zt_pool[
         (zt_pool["流通市值"].between(80e8, 500e8))
@@ -79,7 +101,7 @@ def select_main_board_stocks(date):
     # 计算总分并排序
     filtered["总分"] = calculate_scores(filtered)
 
-    return filtered.sort_values("总分", ascending=False).head(5)[
+    return filtered.sort_values("总分", ascending=False).head(top_n)[
         ["代码", "名称", "连板数", "所属行业", "总分"]
     ]
 
@@ -89,8 +111,8 @@ class MarketSentiment:
 
     def __init__(self, trade_date):
         self.trade_date = trade_date
-        self.zt_data = ak.stock_zt_pool_em(date=trade_date)  # 涨停股池
-        self.zbgc_data = ak.stock_zt_pool_zbgc_em(date=trade_date)  # 新增炸板股池
+        self.zt_data = archive.get_pool("zt", trade_date)  # 涨停股池
+        self.zbgc_data = archive.get_pool("zbgc", trade_date)  # 新增炸板股池
         self.index_data = ak.stock_zh_index_daily(symbol="sh000001")
 
     def _get_stock_data(self, symbol):
@@ -133,45 +155,55 @@ class MarketSentiment:
         return total_premium / valid_count if valid_count > 0 else 0
 
     def get_sentiment_phase(self):
-        day_data = self.zt_data
+        return judge_sentiment_phase(
+            self.zt_data, self.zbgc_data, self._calculate_zt_premium
+        )
 
-        # 情绪指标
-        zt_count = len(day_data)
-        lb_height = day_data["连板数"].max()
 
-        # 计算真实炸板率：炸板股数 / (涨停股数 + 炸板股数)
-        zt_codes = set(day_data["代码"])
-        zb_codes = set(self.zbgc_data["代码"])
-        real_zb_count = len(zt_codes & zb_codes)  # 先涨停后炸板的股票
+def judge_sentiment_phase(zt_data, zbgc_data, premium_fn):
+    """根据当日涨停/炸板股池判断情绪周期
+
+    premium_fn 为无参函数，仅在需要时才计算涨停溢价（涉及行情请求）。
+    回测时传入基于本地K线的实现即可复用同一套判断逻辑。
+    """
+    # 情绪指标
+    zt_count = len(zt_data)
+    lb_height = zt_data["连板数"].max() if zt_count > 0 else 0
+
+    # 计算真实炸板率：炸板股数 / (涨停股数 + 炸板股数)
+    zt_codes = set(zt_data["代码"]) if zt_count > 0 else set()
+    zb_codes = set(zbgc_data["代码"]) if not zbgc_data.empty else set()
+    real_zb_count = len(zt_codes & zb_codes)  # 先涨停后炸板的股票
+
+    zhaban_rate = (
+        real_zb_count / (zt_count + len(zb_codes))
+        if (zt_count + len(zb_codes)) > 0
+        else 0
+    )
+
+    # 情绪判断逻辑
+    if zhaban_rate > 0.4 or lb_height <= 4:
+        return "退潮期"
+    elif lb_height >= 6 and zt_count > 80:
+        return "高潮期"
+    elif lb_height in [4, 5] and premium_fn() > 0.03:
+        return "发酵期"
+    else:
+        return "启动期"
 
-        zhaban_rate = (
-            real_zb_count / (zt_count + len(zb_codes))
-            if (zt_count + len(zb_codes)) > 0
-            else 0
-        )
 
-        # 情绪判断逻辑
-        if zhaban_rate > 0.4 or lb_height <= 4:
-            return "退潮期"
-        elif lb_height >= 6 and zt_count > 80:
-            return "高潮期"
-        elif lb_height in [4, 5] and self._calculate_zt_premium() > 0.03:
-            return "发酵期"
-        else:
-            return "启动期"
+def market_trend_series(index_data):
+    """逐日大盘趋势：收盘在20日线上方且MACD>0为多头"""
+    ma20 = index_data["close"].rolling(20).mean()
+    macd, _, _ = talib.MACD(index_data["close"])
+    is_bull = (index_data["close"] > ma20) & (macd > 0)
+    return is_bull.map({True: "多头趋势", False: "空头趋势"})
 
 
 def market_trend_judge():
     """大盘趋势判断"""
     index_data = ak.stock_zh_index_daily(symbol="sh000001")
-    index_data["MA20"] = index_data["close"].rolling(20).mean()
-    macd, _, _ = talib.MACD(index_data["close"])
-
-    last_close = index_data["close"].iloc[-1]
-    if (last_close > index_data["MA20"].iloc[-1]) and (macd.iloc[-1] > 0):
-        return "多头趋势"
-    else:
-        return "空头趋势"
+    return market_trend_series(index_data).iloc[-1]
 
 
 def generate_trading_signal(stocks, sentiment, trend):
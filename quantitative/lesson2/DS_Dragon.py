@@ -1,12 +1,22 @@
 #!/Users/qyq/miniconda3/envs/quant/bin/python
 
+import os
+import sys
 from datetime import datetime, timedelta
 
-import akshare as ak
 import numpy as np
 import pandas as pd
 import talib
 
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "反转战法")
+)
+# QUANT_DATA_MODE=record/replay 时录制/回放 akshare 数据（见 反转战法/data_provider.py）
+try:
+    from data_provider import akshare as ak
+except ImportError:
+    import akshare as ak
+
 
 # 工具函数：过滤股票
 def filter_stocks(stock_list):
@@ -10,9 +10,20 @@ FilePath: /Users/qyq/Library/Mobile Documents/com~apple~CloudDocs/Development/
 
 import time
 
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
 from apscheduler.schedulers.blocking import BlockingScheduler
 from job import run_today_120
 
+# 长驻进程不会退出，每次任务结束后导出数据接口健康度指标（见 反转战法/metrics_exporter.py）
+# 定时任务显式开启导出，不依赖 QUANT_METRICS_EXPORT
+try:
+    from metrics_exporter import EXPORTERS, export_metrics
+except ImportError:
+    EXPORTERS = ()
+
+    def export_metrics(*args, **kwargs):
+        return []
+
 sched = BlockingScheduler()
 sched.add_job(
     run_today_120,
@@ -23,5 +34,8 @@ sched.add_job(
     timezone="Asia/Shanghai",
 )
 
+sched.add_listener(
+    lambda event: export_metrics(exporters=EXPORTERS), EVENT_JOB_EXECUTED | EVENT_JOB_ERROR
+)
 
 sched.start()
@@ -0,0 +1,468 @@
+#!/Users/qyq/miniconda3/envs/quant/bin/python
+# -*- coding:utf-8 -*-
+"""
+涨停"龙头"策略离线回测
+
+回放 zt_pool_archive 中归档的每日涨停/炸板股池和本地缓存的日K线，
+逐日复用实盘脚本的选股与择时逻辑：
+- ds_db:    DS_DB.score_main_board_stocks + 情绪周期 + 大盘趋势 + generate_trading_signal
+- mingtian: 明天冲谁.evaluate_stock 的五个条件 + 情绪冰点判断
+
+信号在 T 日收盘产生，T+1 日按涨跌停规则撮合：
+- 一字涨停（开盘即封死涨停）无法买入
+- 打板介入：高开 3%-5% 时开盘买入；分歧低吸：回踩前一日5日线时买入
+- 一字跌停无法卖出，顺延到下一交易日
+
+K线按代码整段请求一次并缓存到本地，之后的回测全部离线完成。
+
+用法:
+    python dragon_backtest.py --start 20220101 --end 20241231 --strategy ds_db
+"""
+
+import argparse
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import DS_DB
+import 明天冲谁 as mtcs
+from zt_pool_archive import ZtPoolArchive
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "反转战法")
+)
+# QUANT_DATA_MODE=record/replay 时录制/回放 akshare 数据（见 反转战法/data_provider.py）
+try:
+    from data_provider import akshare as ak
+except ImportError:
+    import akshare as ak
+
+# 交易成本
+COMMISSION_RATE = 0.00025  # 佣金（双边）
+MIN_COMMISSION = 5  # 最低佣金
+STAMP_TAX_RATE = 0.0005  # 印花税（卖出）
+
+WARMUP_DAYS = 90  # 指标预热所需的自然日
+DEFAULT_BAR_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "dragon_bars"
+)
+
+
+def limit_ratio(code, name=""):
+    """涨跌停幅度：主板10%，创业板/科创板20%，ST 5%"""
+    if "ST" in str(name):
+        return 0.05
+    if code.startswith(("300", "301", "688")):
+        return 0.2
+    return 0.1
+
+
+def limit_prices(prev_close, code, name=""):
+    """涨停价、跌停价（四舍五入到分）"""
+    ratio = limit_ratio(code, name)
+    return round(prev_close * (1 + ratio), 2), round(prev_close * (1 - ratio), 2)
+
+
+class DailyBarCache:
+    """按代码缓存的不复权日K线，一个代码只请求一次"""
+
+    def __init__(self, start, end, cache_dir=DEFAULT_BAR_DIR):
+        self.start = start
+        self.end = end
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, code):
+        return os.path.join(self.cache_dir, f"{code}.pkl")
+
+    def load(self, code):
+        path = self._path(code)
+        if os.path.exists(path):
+            cached = pd.read_pickle(path)
+            # 缓存的请求区间覆盖回测区间则直接使用
+            if cached["start"] <= self.start and cached["end"] >= min(
+                self.end, datetime.now().strftime("%Y%m%d")
+            ):
+                return cached["data"]
+
+        try:
+            data = ak.stock_zh_a_hist(
+                symbol=code,
+                period="daily",
+                start_date=self.start,
+                end_date=self.end,
+                adjust="",  # 涨跌停价基于不复权价格计算
+            )
+        except Exception as e:
+            print(f"获取{code}日线失败: {e}")
+            return None
+        if data is None or data.empty:
+            return None
+
+        data["日期"] = pd.to_datetime(data["日期"]).dt.strftime("%Y%m%d")
+        data = data.set_index("日期").sort_index()
+        # 请求区间截止到今天，避免未来日期导致每次都判定缓存失效
+        fetched_end = min(self.end, datetime.now().strftime("%Y%m%d"))
+        pd.to_pickle({"start": self.start, "end": fetched_end, "data": data}, path)
+        return data
+
+
+class SymbolBars:
+    """单只股票的K线与预计算指标，按日期字符串 O(1) 定位"""
+
+    def __init__(self, code, data):
+        self.code = code
+        self.pos = {date: i for i, date in enumerate(data.index)}
+        self.open = data["开盘"].to_numpy(dtype=float)
+        self.close = data["收盘"].to_numpy(dtype=float)
+        self.high = data["最高"].to_numpy(dtype=float)
+        self.low = data["最低"].to_numpy(dtype=float)
+        self.ma5 = data["收盘"].rolling(5).mean().to_numpy()
+
+        # 明天冲谁.evaluate_stock 的技术条件，一次性向量化计算
+        tech = mtcs.calculate_technical(data.copy())
+        volume = tech["成交量"]
+        avg_volume = volume.shift(1).rolling(5).mean()
+        cond_volume = volume >= mtcs.VOLUME_MULTIPLE * avg_volume
+        cond_ma = (tech["MA5"] > tech["MA10"]) & (tech["MA10"] > tech["MA10"].shift(5))
+        cond_macd = (tech["MACD"] > tech["Signal"]) & (
+            tech["MACD"].shift(1) < tech["Signal"].shift(1)
+        )
+        enough = pd.Series(np.arange(len(tech)) >= 29, index=tech.index)
+        self.mtcs_ok = (cond_volume & cond_ma & cond_macd & enough).to_numpy()
+
+    def row(self, date):
+        return self.pos.get(date)
+
+
+class DragonBacktest:
+    """事件驱动的涨停策略回测引擎"""
+
+    def __init__(
+        self,
+        start,
+        end,
+        strategy="ds_db",
+        initial_cash=1000000,
+        max_positions=3,
+        hold_days=1,
+        archive=None,
+        bar_cache=None,
+    ):
+        if strategy not in ("ds_db", "mingtian"):
+            raise ValueError(f"未知策略: {strategy}")
+        self.start = start.replace("-", "")
+        self.end = end.replace("-", "")
+        self.strategy = strategy
+        self.initial_cash = initial_cash
+        self.max_positions = max_positions
+        self.hold_days = hold_days
+        self.archive = archive or ZtPoolArchive()
+        warmup_start = (
+            datetime.strptime(self.start, "%Y%m%d") - timedelta(days=WARMUP_DAYS)
+        ).strftime("%Y%m%d")
+        self.bar_cache = bar_cache or DailyBarCache(warmup_start, self.end)
+        self.bars = {}
+        self.names = {}
+        self.trend_by_date = {}
+
+    # ------------------------------------------------------------------
+    # 数据准备
+    # ------------------------------------------------------------------
+    def _prepare(self, dates):
+        """预加载回测区间内出现过的全部涨停股K线和大盘趋势"""
+        codes = set()
+        for date in dates:
+            zt = self.archive.get_pool("zt", date)
+            codes.update(zt["代码"])
+            self.names.update(zip(zt["代码"], zt["名称"]))
+
+        print(f"预加载 {len(codes)} 只涨停股日线...")
+        for i, code in enumerate(sorted(codes)):
+            if i % 200 == 0:
+                print(f"进度: {i}/{len(codes)}")
+            data = self.bar_cache.load(code)
+            if data is not None and len(data) > 0:
+                self.bars[code] = SymbolBars(code, data)
+
+        index_data = ak.stock_zh_index_daily(symbol="sh000001")
+        index_dates = pd.to_datetime(index_data["date"]).dt.strftime("%Y%m%d")
+        trend = DS_DB.market_trend_series(index_data)
+        self.trend_by_date = dict(zip(index_dates, trend))
+
+    def _pct_change(self, code, date):
+        """date 当日涨跌幅（%）"""
+        bars = self.bars.get(code)
+        i = bars.row(date) if bars else None
+        if i is None or i == 0:
+            return None
+        return (bars.close[i] / bars.close[i - 1] - 1) * 100
+
+    def _zt_premium(self, zt, date):
+        """涨停股当日开盘溢价，对应 MarketSentiment._calculate_zt_premium"""
+        premiums = []
+        for code in zt["代码"]:
+            bars = self.bars.get(code)
+            i = bars.row(date) if bars else None
+            if i is None or i == 0:
+                continue
+            premiums.append(bars.open[i] / bars.close[i - 1] - 1)
+        return float(np.mean(premiums)) if premiums else 0
+
+    # ------------------------------------------------------------------
+    # 信号
+    # ------------------------------------------------------------------
+    def _signals_ds_db(self, date):
+        zt = self.archive.get_pool("zt", date)
+        zb = self.archive.get_pool("zbgc", date)
+        stocks = DS_DB.score_main_board_stocks(zt, zb)
+        sentiment = DS_DB.judge_sentiment_phase(
+            zt, zb, lambda: self._zt_premium(zt, date)
+        )
+        trend = self.trend_by_date.get(date, "空头趋势")
+        signals = DS_DB.generate_trading_signal(stocks, sentiment, trend)
+        return [
+            {"code": s["代码"], "action": s["推荐操作"]}
+            for s in signals
+            if s["推荐操作"] in ("打板介入", "分歧低吸")
+        ]
+
+    def _signals_mingtian(self, date, prev_date):
+        curr_zt = self.archive.get_pool("zt", date)
+        if prev_date is not None:
+            prev_zt = self.archive.get_pool("zt", prev_date)
+            prev_codes = set(prev_zt["代码"])
+        else:
+            prev_codes = set()
+
+        # 情绪冰点判断，对应 明天冲谁.get_market_sentiment
+        zt_count = len(curr_zt)
+        jr_rate = (
+            len(prev_codes & set(curr_zt["代码"])) / len(prev_codes)
+            if prev_codes
+            else 0
+        )
+        pct_changes = [self._pct_change(code, date) for code in prev_codes]
+        pct_changes = [p for p in pct_changes if p is not None]
+        avg_pct = np.mean(pct_changes) if pct_changes else 0
+        params = mtcs.SENTIMENT_PARAMS
+        if (
+            zt_count < params["zt_threshold"]
+            and jr_rate < params["jr_rate"]
+            and avg_pct < params["avg_pct"]
+        ):
+            return []
+
+        signals = []
+        for _, zt_info in curr_zt.iterrows():
+            code = zt_info["代码"]
+            bars = self.bars.get(code)
+            i = bars.row(date) if bars else None
+            time_str = str(zt_info["首次封板时间"]).zfill(6)
+            if i is None or time_str > "103000":
+                continue
+            if zt_info.get("总市值", 0) / 1e8 < mtcs.CAPITAL_LIMIT:
+                continue
+            if bars.mtcs_ok[i]:
+                signals.append({"code": code, "action": "次日开盘买入"})
+        return signals
+
+    # ------------------------------------------------------------------
+    # 撮合
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _buy_cost(amount):
+        return max(amount * COMMISSION_RATE, MIN_COMMISSION)
+
+    @staticmethod
+    def _sell_cost(amount):
+        return max(amount * COMMISSION_RATE, MIN_COMMISSION) + amount * STAMP_TAX_RATE
+
+    def _try_fill_entry(self, order, date):
+        """按涨停约束撮合买单，返回(成交价, 止损价)或None"""
+        bars = self.bars.get(order["code"])
+        i = bars.row(date) if bars else None
+        if i is None or i == 0:
+            return None  # 停牌
+        prev_close = bars.close[i - 1]
+        limit_up, _ = limit_prices(prev_close, order["code"], self.names.get(order["code"], ""))
+        open_, low = bars.open[i], bars.low[i]
+
+        # 一字涨停买不进
+        if open_ >= limit_up and low >= limit_up:
+            return None
+
+        action = order["action"]
+        if action == "打板介入":
+            gap = open_ / prev_close - 1
+            if not 0.03 <= gap <= 0.05:
+                return None
+            return open_, low * 0.97  # 当日最低价-3%，次日起生效
+        if action == "分歧低吸":
+            ma5 = bars.ma5[i - 1]
+            if np.isnan(ma5) or low > ma5:
+                return None
+            price = min(open_, ma5)
+            return price, price * 0.95  # 成本价-5%
+        return open_, None
+
+    def run(self):
+        all_dates = self.archive.trade_dates(end=self.end)
+        dates = [d for d in all_dates if d >= self.start]
+        if not dates:
+            print("❌ 归档中没有回测区间内的交易日，请先运行 zt_pool_archive.py 回补")
+            return None
+        self._prepare(dates)
+
+        cash = float(self.initial_cash)
+        positions = {}  # code -> dict
+        pending = []
+        trades = []
+        equity = []
+        prev_date = all_dates[all_dates.index(dates[0]) - 1] if all_dates[0] < dates[0] else None
+
+        for date in dates:
+            # 1. 处理持仓卖出（T+1，仅处理今日之前买入的持仓）
+            for code in list(positions):
+                pos = positions[code]
+                bars = self.bars[code]
+                i = bars.row(date)
+                if i is None:
+                    continue  # 停牌顺延
+                pos["held"] += 1
+                _, limit_down = limit_prices(bars.close[i - 1], code, self.names.get(code, ""))
+                locked = bars.open[i] <= limit_down and bars.high[i] <= limit_down
+                if locked:
+                    continue  # 一字跌停卖不出
+
+                exit_price, reason = None, None
+                if pos["stop"] is not None and bars.low[i] <= pos["stop"]:
+                    exit_price, reason = min(bars.open[i], pos["stop"]), "止损"
+                elif pos["held"] >= self.hold_days:
+                    exit_price, reason = bars.close[i], "到期"
+                if exit_price is None:
+                    continue
+
+                amount = exit_price * pos["shares"]
+                cash += amount - self._sell_cost(amount)
+                trades.append(
+                    {
+                        "代码": code,
+                        "名称": self.names.get(code, code),
+                        "信号": pos["action"],
+                        "买入日": pos["entry_date"],
+                        "买入价": pos["entry_price"],
+                        "卖出日": date,
+                        "卖出价": exit_price,
+                        "股数": pos["shares"],
+                        "收益率": (exit_price / pos["entry_price"] - 1) * 100,
+                        "卖出原因": reason,
+                    }
+                )
+                del positions[code]
+
+            # 2. 撮合前一日信号，按前一日总资产等权分配
+            last_equity = equity[-1]["总资产"] if equity else cash
+            target_amount = last_equity / self.max_positions
+            for order in pending:
+                if len(positions) >= self.max_positions:
+                    break
+                if order["code"] in positions:
+                    continue
+                fill = self._try_fill_entry(order, date)
+                if fill is None:
+                    continue
+                price, stop = fill
+                shares = int(min(target_amount, cash) / price) // 100 * 100
+                if shares < 100:
+                    continue
+                amount = price * shares
+                cash -= amount + self._buy_cost(amount)
+                positions[order["code"]] = {
+                    "shares": shares,
+                    "entry_price": price,
+                    "entry_date": date,
+                    "stop": stop,
+                    "held": 0,
+                    "action": order["action"],
+                }
+
+            # 3. 收盘市值
+            market_value = 0.0
+            for code, pos in positions.items():
+                bars = self.bars[code]
+                i = bars.row(date)
+                price = bars.close[i] if i is not None else pos["entry_price"]
+                market_value += price * pos["shares"]
+            equity.append({"日期": date, "现金": cash, "总资产": cash + market_value})
+
+            # 4. 收盘后生成次日信号
+            if self.strategy == "ds_db":
+                pending = self._signals_ds_db(date)
+            else:
+                pending = self._signals_mingtian(date, prev_date)
+            prev_date = date
+
+        equity_df = pd.DataFrame(equity).set_index("日期")
+        trades_df = pd.DataFrame(trades)
+        return {
+            "equity": equity_df,
+            "trades": trades_df,
+            "metrics": self._metrics(equity_df["总资产"], trades_df),
+        }
+
+    def _metrics(self, equity, trades):
+        returns = equity.pct_change().dropna()
+        total_return = equity.iloc[-1] / self.initial_cash - 1
+        years = max(len(equity) / 250, 1 / 250)
+        drawdown = equity / equity.cummax() - 1
+        return {
+            "总收益率(%)": total_return * 100,
+            "年化收益率(%)": (math.pow(1 + total_return, 1 / years) - 1) * 100,
+            "最大回撤(%)": drawdown.min() * 100,
+            "夏普比率": returns.mean() / returns.std() * math.sqrt(250)
+            if len(returns) > 1 and returns.std() > 0
+            else 0,
+            "交易次数": len(trades),
+            "胜率(%)": (trades["收益率"] > 0).mean() * 100 if len(trades) else 0,
+        }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="涨停龙头策略离线回测")
+    parser.add_argument("--start", required=True, help="开始日期 (YYYYMMDD)")
+    parser.add_argument(
+        "--end", default=datetime.now().strftime("%Y%m%d"), help="结束日期 (YYYYMMDD)"
+    )
+    parser.add_argument(
+        "--strategy", choices=["ds_db", "mingtian"], default="ds_db", help="回测策略"
+    )
+    parser.add_argument("--cash", type=float, default=1000000, help="初始资金")
+    parser.add_argument("--max-positions", type=int, default=3, help="最大持仓数")
+    parser.add_argument("--hold-days", type=int, default=1, help="持有交易日数")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    backtest = DragonBacktest(
+        args.start,
+        args.end,
+        strategy=args.strategy,
+        initial_cash=args.cash,
+        max_positions=args.max_positions,
+        hold_days=args.hold_days,
+    )
+    result = backtest.run()
+    if result is not None:
+        print(f"\n【{args.strategy} 回测结果 {args.start} - {args.end}】")
+        for key, value in result["metrics"].items():
+            print(f"{key}: {value:.2f}")
+        tag = f"{args.strategy}_{args.start}_{args.end}"
+        result["trades"].to_csv(f"dragon_trades_{tag}.csv", index=False, encoding="utf-8-sig")
+        result["equity"].to_csv(f"dragon_equity_{tag}.csv", encoding="utf-8-sig")
+        print(f"交易记录已保存到 dragon_trades_{tag}.csv")
@@ -10,6 +10,8 @@ FilePath: /Users/yiqianqian/Library/Mobile Documents/com~apple~CloudDocs/Develop
 """
 
 import math
+import os
+import sys
 import time
 from datetime import datetime, timedelta
 
@@ -19,12 +21,40 @@ import pandas as pd
 
 # from jqdatasdk.technical_analysis import *
 # import jqdatasdk as jq
-import qstock as qs
 import seaborn as sns
 import talib
 
 from sendmail import mail, send_wechat
 
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "反转战法")
+)
+
+# QUANT_DATA_MODE=record/replay 时录制/回放 qstock 数据（见 反转战法/data_provider.py）
+try:
+    from data_provider import OFFLINE, qstock as qs
+except ImportError:
+    import qstock as qs
+
+    OFFLINE = False
+
+# 共享内存行情快照（由 反转战法/snapshot_ring.py 生产者写入），不可用时直接请求 qstock
+try:
+    from snapshot_ring import read_realtime_data
+
+    SNAPSHOT_RING_AVAILABLE = True
+except ImportError:
+    SNAPSHOT_RING_AVAILABLE = False
+
+
+def realtime_snapshot():
+    """全市场实时快照：优先读共享内存，避免多个进程重复请求上游"""
+    if SNAPSHOT_RING_AVAILABLE:
+        snapshot = read_realtime_data()
+        if snapshot is not None:
+            return snapshot
+    return qs.realtime_data()
+
 # the default backend TKAgg can not be run in a new process, when this script is automated.
 plt.switch_backend("Agg")
 
@@ -60,7 +90,7 @@ def get_stock_pool():
     # stock_df = jq.get_fundamentals(q)
     # stock_pool_all = [code for code in stock_df["code"]]
     # current_dt = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    all_stock = qs.realtime_data()
+    all_stock = realtime_snapshot()
     # 剔除创业板、科创板、ST和退市的股票
     all_stock = all_stock[
         (~all_stock["名称"].str.contains("ST"))  # 剔除ST股票
@@ -92,11 +122,12 @@ num_days = 5  # plot 5 day line plot
 
 # send_info = [] # define it in function so that it will be re-initialized every time when run_today function runs.
 
-today = datetime.now().date()
-before = today - timedelta(days=100)
-current_dt = datetime.strftime(today, "%Y%m%d")
-before_dt = datetime.strftime(before, "%Y%m%d")
-print(f"Start Calculating {current_dt}")
+# 日期在每次运行时计算，Money.py 等长驻进程跨天运行也不会沿用启动当天的日期
+
+
+def data_start_date(days=100):
+    """个股数据的起始日期（YYYYMMDD），取调用当天往前 days 天"""
+    return datetime.strftime(datetime.now().date() - timedelta(days=days), "%Y%m%d")
 
 
 # 财务数据查询
@@ -116,7 +147,7 @@ print(f"Start Calculating {current_dt}")
 
 
 def get_stock_code(stock_name):
-    securities = qs.realtime_data()
+    securities = realtime_snapshot()
     stock_code = securities[securities["名称"] == stock_name]["代码"].values[0]
     return stock_code
 
@@ -142,6 +173,7 @@ def get_rank_120(stock_pool):
     stock_dict_list = []
     MA3_list = []
     MA10_list = []
+    before_dt = data_start_date()
     stock_pool_copy = stock_pool.copy()  # to remove stocks in a for loop
     for stock in stock_pool_copy:
         score_list = []
@@ -278,6 +310,7 @@ def get_rank_daily(stock_pool):
     stock_dict_list = []
     MA3_list = []
     MA10_list = []
+    before_dt = data_start_date()
     stock_pool_copy = stock_pool.copy()  # to remove stocks in a for loop
     for stock in stock_pool_copy:
         score_list = []
@@ -513,6 +546,30 @@ def initial_slope_series():
     return [get_ols(data.low[i : i + N], data.high[i : i + N])[1] for i in range(M)]
 
 
+# RSRS 斜率序列在第一次计算择时信号时才初始化（导入本模块不请求网络），
+# 同一进程内之后的每次运行复用并追加当天的斜率；同一交易日重复运行时覆盖而不是重复追加
+RSRS_STATE = {"slope_series": None, "last_date": None}
+
+
+def get_slope_series():
+    if RSRS_STATE["slope_series"] is None:
+        print("Initializing RSRS slope series")
+        # 除去回测第一天的 slope ，避免运行时重复加入
+        RSRS_STATE["slope_series"] = initial_slope_series()[:-1]
+    return RSRS_STATE["slope_series"]
+
+
+def update_slope_series(slope, bar_date):
+    """把最新交易日的斜率加入序列，返回序列"""
+    slope_series = get_slope_series()
+    if RSRS_STATE["last_date"] == bar_date:
+        slope_series[-1] = slope
+    else:
+        slope_series.append(slope)
+        RSRS_STATE["last_date"] = bar_date
+    return slope_series
+
+
 # 2-3 择时模块-计算标准分
 # 通过斜率列表计算并返回截至回测结束日的最新标准分
 
@@ -571,7 +628,7 @@ def get_timing_signal(stock):
     )
     high_low_data = high_low_data[-N:]
     intercept, slope, r2 = get_ols(high_low_data.low, high_low_data.high)
-    slope_series.append(slope)
+    slope_series = update_slope_series(slope, high_low_data.index[-1])
     rsrs_score = get_zscore(slope_series[-M:]) * r2
 
     # 计算个股择时信号
@@ -599,11 +656,6 @@ def get_timing_signal(stock):
         return "KEEP"
 
 
-slope_series = initial_slope_series()[
-    :-1
-]  # 除去回测第一天的 slope ，避免运行时重复加入
-
-
 def test_100_days():
     for each_day in range(1, 100)[::-1]:
         current_dt = time.strftime("%Y-%m-%d", time.localtime())
@@ -626,6 +678,7 @@ def test_100_days():
 def run_today_120():
     current_dt = time.strftime("%Y-%m-%d", time.localtime())
     current_dt = datetime.strptime(current_dt, "%Y-%m-%d")
+    print(f"Start Calculating {current_dt:%Y%m%d}")
     message = "这是120分钟数据\n"
     stock_pool = get_stock_pool()
     check_out_list, rank_stock, send_info = get_rank_120(stock_pool)
@@ -688,6 +741,9 @@ def run_today_120():
     message += "\r\n\r\n".join(send_info[:21])
     message += "\r\n\r\n"
     message += "食用方式：当第一只股是'冲冲冲'并且大盘信号也是'买买买'时，只买入排名第一的股，后面几只仅供参考;当大盘信号或个股信号只要其中之一是跑路，就卖出。极速之星是每日评分上升最快的股，可以留意观察机会。\n"
+    if OFFLINE:
+        print("📴 回放模式，不推送通知")
+        return
     ret = 0
     for _ in range(10):
         if ret:
@@ -704,6 +760,7 @@ def run_today_120():
 def run_today_daily():
     current_dt = time.strftime("%Y-%m-%d", time.localtime())
     current_dt = datetime.strptime(current_dt, "%Y-%m-%d")
+    print(f"Start Calculating {current_dt:%Y%m%d}")
     message = "这是日K数据\n"
     stock_pool = get_stock_pool()
     print(f"The number of stock pool is {len(stock_pool)}")
@@ -770,6 +827,9 @@ def run_today_daily():
     message += "\r\n\r\n".join(send_info[:21])
     message += "\r\n\r\n"
     message += "食用方式：当第一只股是'冲冲冲'并且大盘信号也是'买买买'时，只买入排名第一的股，后面几只仅供参考;当大盘信号或个股信号只要其中之一是跑路，就卖出。极速之星是每日评分上升最快的股，可以留意观察机会。\n"
+    if OFFLINE:
+        print("📴 回放模式，不推送通知")
+        return
     ret = 0
     for _ in range(10):
         if ret:
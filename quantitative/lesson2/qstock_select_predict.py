@@ -1,15 +1,44 @@
 #!/Users/qyq/miniconda3/envs/quant/bin/python
 
 # import necessary packages
+import os
+import sys
+
 import numpy as np
 import pandas as pd
-import qstock as qs
 import matplotlib.pyplot as plt
 import mplfinance as mpl
 from sklearn.linear_model import LinearRegression
 from datetime import datetime, timedelta
 from tqdm import tqdm
 
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "反转战法")
+)
+
+# QUANT_DATA_MODE=record/replay 时录制/回放 qstock 数据（见 反转战法/data_provider.py）
+try:
+    from data_provider import qstock as qs
+except ImportError:
+    import qstock as qs
+
+# 共享内存行情快照（由 反转战法/snapshot_ring.py 生产者写入），不可用时直接请求 qstock
+try:
+    from snapshot_ring import read_realtime_data
+
+    SNAPSHOT_RING_AVAILABLE = True
+except ImportError:
+    SNAPSHOT_RING_AVAILABLE = False
+
+
+def realtime_snapshot():
+    """全市场实时快照：优先读共享内存，避免多个进程重复请求上游"""
+    if SNAPSHOT_RING_AVAILABLE:
+        snapshot = read_realtime_data()
+        if snapshot is not None:
+            return snapshot
+    return qs.realtime_data()
+
 # 设置中文字体
 plt.rcParams["font.sans-serif"] = [
     "Noto Sans CJK SC",
@@ -22,7 +51,7 @@ plt.rcParams["axes.unicode_minus"] = False  # 用来正常显示负号
 
 # 获取A股股票池（排除创业板、科创板、北交所、ST和退市股票）
 def get_stock_pool():
-    all_stock = qs.realtime_data()
+    all_stock = realtime_snapshot()
     # 剔除创业板（300开头）、科创板（688开头）、北交所（8开头）、ST和退市股票
     all_stock = all_stock[
         ~(
@@ -0,0 +1,282 @@
+#!/Users/qyq/miniconda3/envs/quant/bin/python
+# -*- coding:utf-8 -*-
+"""
+涨停 / 炸板 / 跌停股池本地归档
+
+DS_DB.py、明天冲谁.py、大盘_龙虎榜.py 原本各自请求 stock_zt_pool_em、
+stock_zt_pool_zbgc_em、stock_zt_pool_dtgc_em，且都不保留历史。
+本模块把每日股池按 {股池}/{YYYYMMDD}.csv 只追加地存到本地：
+- 已收盘的交易日只请求一次，之后全部从本地读取
+- 提供按日期区间、按代码查询，以及连板（streak）重建
+- 提供晋级率、连板高度、炸板率等多日情绪序列
+
+用法:
+    archive = ZtPoolArchive()
+    zt_pool = archive.get_pool("zt", "20250225")
+    archive.sentiment_series("20250101", "20250225")
+"""
+
+import os
+import sys
+from datetime import datetime, time as dt_time, timedelta
+
+import pandas as pd
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "反转战法")
+)
+# QUANT_DATA_MODE=record/replay 时录制/回放 akshare 数据（见 反转战法/data_provider.py）
+try:
+    from data_provider import OFFLINE, akshare as ak
+except ImportError:
+    import akshare as ak
+
+    OFFLINE = False
+
+# 股池名称 -> akshare 接口
+POOL_FETCHERS = {
+    "zt": ak.stock_zt_pool_em,  # 涨停股池
+    "zbgc": ak.stock_zt_pool_zbgc_em,  # 炸板股池
+    "dtgc": ak.stock_zt_pool_dtgc_em,  # 跌停股池
+}
+
+DEFAULT_ARCHIVE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "zt_pool_archive"
+)
+
+# 读取归档时需保持为字符串的列（代码及 HHMMSS 格式的封板时间）
+TEXT_COLUMNS = {"代码": str, "首次封板时间": str, "最后封板时间": str}
+
+# 收盘后股池才会定稿，之前请求到的当日数据不入档
+POOL_FINAL_TIME = dt_time(15, 30)
+
+
+def _empty_pool():
+    """空股池（非交易日或请求失败）：保留“代码”列，按代码取集合、isin 等操作不会出错"""
+    return pd.DataFrame(columns=["代码"])
+
+
+def _normalize_date(date):
+    """统一日期格式为 YYYYMMDD"""
+    if isinstance(date, (datetime, pd.Timestamp)):
+        return date.strftime("%Y%m%d")
+    return str(date).replace("-", "")
+
+
+class ZtPoolArchive:
+    """只追加的每日股池归档"""
+
+    def __init__(self, archive_dir=DEFAULT_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self._memory = {}  # (pool, date) -> DataFrame，进程内缓存
+        if OFFLINE:
+            return  # 回放时只读已有归档，不创建目录也不写入
+        for pool in POOL_FETCHERS:
+            os.makedirs(os.path.join(self.archive_dir, pool), exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+    def _path(self, pool, date):
+        return os.path.join(self.archive_dir, pool, f"{date}.csv")
+
+    def _is_final(self, date):
+        """判断该日股池是否已定稿（历史日期或当日收盘后）"""
+        now = datetime.now()
+        today = now.strftime("%Y%m%d")
+        if date < today:
+            return True
+        return date == today and now.time() >= POOL_FINAL_TIME
+
+    def _read(self, pool, date):
+        path = self._path(pool, date)
+        try:
+            df = pd.read_csv(path, dtype=TEXT_COLUMNS)
+        except pd.errors.EmptyDataError:  # 旧版本为非交易日写入的空文件
+            return _empty_pool()
+        if df.columns.empty:
+            return _empty_pool()
+        for col in TEXT_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].str.zfill(6)
+        return df
+
+    def _write(self, pool, date, df):
+        """原子写入，已存在的日期不覆盖（只追加）；回放模式下不写入"""
+        path = self._path(pool, date)
+        if OFFLINE or os.path.exists(path):
+            return
+        if df.columns.empty:
+            df = _empty_pool()  # 写出只有表头的 CSV，读取时不会报 EmptyDataError
+        tmp_path = path + ".tmp"
+        df.to_csv(tmp_path, index=False, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def has(self, pool, date):
+        return os.path.exists(self._path(pool, _normalize_date(date)))
+
+    def get_pool(self, pool, date):
+        """获取某日股池：优先本地归档，缺失时请求接口并归档"""
+        if pool not in POOL_FETCHERS:
+            raise ValueError(f"未知股池: {pool}，可选 {list(POOL_FETCHERS)}")
+        date = _normalize_date(date)
+
+        key = (pool, date)
+        if key in self._memory:
+            return self._memory[key].copy()
+
+        if self.has(pool, date):
+            df = self._read(pool, date)
+            self._memory[key] = df
+            return df.copy()
+
+        try:
+            df = POOL_FETCHERS[pool](date=date)
+        except Exception as e:
+            print(f"获取{pool}股池({date})失败: {e}")
+            return _empty_pool()
+        if df is None or df.columns.empty:
+            df = _empty_pool()
+        if "代码" in df.columns:
+            df["代码"] = df["代码"].astype(str).str.zfill(6)
+
+        # 未定稿的当日数据不入档，也不缓存，下次重新请求
+        if self._is_final(date):
+            self._write(pool, date, df)
+            self._memory[key] = df
+        return df.copy()
+
+    def backfill(self, start, end, pools=None):
+        """回补区间内所有工作日的股池（已归档的日期直接跳过）"""
+        pools = pools or list(POOL_FETCHERS)
+        start_dt = datetime.strptime(_normalize_date(start), "%Y%m%d")
+        end_dt = datetime.strptime(_normalize_date(end), "%Y%m%d")
+        day = start_dt
+        while day <= end_dt:
+            if day.weekday() < 5:
+                for pool in pools:
+                    self.get_pool(pool, day)
+            day += timedelta(days=1)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def archived_dates(self, pool="zt", start=None, end=None):
+        """已归档的日期（升序）"""
+        pool_dir = os.path.join(self.archive_dir, pool)
+        if not os.path.isdir(pool_dir):
+            return []
+        dates = sorted(
+            name[:-4] for name in os.listdir(pool_dir) if name.endswith(".csv")
+        )
+        if start is not None:
+            dates = [d for d in dates if d >= _normalize_date(start)]
+        if end is not None:
+            dates = [d for d in dates if d <= _normalize_date(end)]
+        return dates
+
+    def trade_dates(self, start=None, end=None):
+        """已归档的交易日：涨停股池非空的日期"""
+        return [
+            date
+            for date in self.archived_dates("zt", start, end)
+            if not self.get_pool("zt", date).empty
+        ]
+
+    def load_range(self, pool, start=None, end=None):
+        """按日期区间读取股池，返回带“日期”列的长表"""
+        frames = []
+        for date in self.archived_dates(pool, start, end):
+            df = self.get_pool(pool, date)
+            if df.empty:
+                continue
+            df.insert(0, "日期", date)
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def query_code(self, code, start=None, end=None, pools=None):
+        """查询单只股票在各股池中的出现记录"""
+        code = str(code).zfill(6)
+        frames = []
+        for pool in pools or list(POOL_FETCHERS):
+            df = self.load_range(pool, start, end)
+            if df.empty:
+                continue
+            df = df[df["代码"] == code]
+            if not df.empty:
+                df.insert(0, "股池", pool)
+                frames.append(df)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True).sort_values("日期")
+
+    def streaks(self, date, lookback=30):
+        """根据归档重建 date 当日每只涨停股的连板数
+
+        从 date 往前按交易日逐日求交集，股票一旦断板就不再累计。
+        返回 Series: 代码 -> 连板天数
+        """
+        date = _normalize_date(date)
+        dates = [d for d in self.trade_dates(end=date)][-lookback:]
+        if not dates or dates[-1] != date:
+            return pd.Series(dtype=int)
+
+        alive = set(self.get_pool("zt", date)["代码"])
+        counts = dict.fromkeys(alive, 1)
+        for prev_date in reversed(dates[:-1]):
+            if not alive:
+                break
+            alive &= set(self.get_pool("zt", prev_date)["代码"])
+            for code in alive:
+                counts[code] += 1
+        return pd.Series(counts, dtype=int).sort_values(ascending=False)
+
+    def streak(self, code, date, lookback=30):
+        """单只股票在 date 的连板数（未涨停返回0）"""
+        return int(self.streaks(date, lookback).get(str(code).zfill(6), 0))
+
+    def sentiment_series(self, start=None, end=None):
+        """多日情绪指标：涨停/炸板/跌停家数、炸板率、连板高度、晋级率"""
+        rows = []
+        prev_codes = None
+        for date in self.trade_dates(start, end):
+            zt = self.get_pool("zt", date)
+            zb = self.get_pool("zbgc", date)
+            dt = self.get_pool("dtgc", date)
+            zt_codes = set(zt["代码"])
+            zb_count = len(zb)
+
+            if prev_codes:
+                jr_rate = len(prev_codes & zt_codes) / len(prev_codes)
+            else:
+                jr_rate = float("nan")
+
+            rows.append(
+                {
+                    "日期": date,
+                    "涨停家数": len(zt),
+                    "炸板家数": zb_count,
+                    "跌停家数": len(dt),
+                    "炸板率": zb_count / (len(zt) + zb_count)
+                    if (len(zt) + zb_count) > 0
+                    else 0,
+                    "连板高度": int(zt["连板数"].max())
+                    if "连板数" in zt.columns and not zt.empty
+                    else 0,
+                    "晋级率": jr_rate,
+                }
+            )
+            prev_codes = zt_codes
+        return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # 回补最近一个月的股池并打印情绪序列
+    archive = ZtPoolArchive()
+    end = datetime.now()
+    archive.backfill(end - timedelta(days=30), end)
+    pd.set_option("display.unicode.ambiguous_as_wide", True)
+    pd.set_option("display.unicode.east_asian_width", True)
+    print(archive.sentiment_series().to_string(index=False))
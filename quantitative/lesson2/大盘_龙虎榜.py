@@ -1,12 +1,27 @@
 #!//Users/qyq/miniconda3/envs/quant/bin/python
 
 
+import os
+import sys
 import pandas as pd
-import akshare as ak
 from datetime import datetime
 
+from zt_pool_archive import ZtPoolArchive
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "反转战法")
+)
+# QUANT_DATA_MODE=record/replay 时录制/回放 akshare 数据（见 反转战法/data_provider.py）
+try:
+    from data_provider import akshare as ak
+except ImportError:
+    import akshare as ak
+
 today = datetime.now().strftime("%Y-%m-%d")
 
+# 涨停/跌停股池走本地归档
+archive = ZtPoolArchive()
+
 
 def get_market_overview():
     """获取大盘概况数据"""
@@ -142,7 +157,7 @@ def get_enhanced_data():
         date_str = datetime.now().strftime("%Y%m%d")
 
         # 获取并处理涨停数据
-        zt_df = ak.stock_zt_pool_em(date=date_str)
+        zt_df = archive.get_pool("zt", date_str)
         zt_df = pd.merge(
             zt_df,
             lhb_df[["代码", "龙虎榜净买额", "机构买入净额"]],
@@ -152,7 +167,7 @@ def get_enhanced_data():
         zt_df["代码"] = zt_df["代码"].astype(str).str.zfill(6)
 
         # 获取并处理跌停数据
-        dt_df = ak.stock_zt_pool_dtgc_em(date=date_str)
+        dt_df = archive.get_pool("dtgc", date_str)
         dt_df = pd.merge(
             dt_df,
             lhb_df[["代码", "龙虎榜净买额", "机构买入净额"]],
@@ -1,11 +1,26 @@
 #!/Users/yiqianqian/miniforge3/envs/quant/bin/python
 
-import akshare as ak
+import os
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 
+from zt_pool_archive import ZtPoolArchive
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "反转战法")
+)
+# QUANT_DATA_MODE=record/replay 时录制/回放 akshare 数据（见 反转战法/data_provider.py）
+try:
+    from data_provider import akshare as ak
+    from bar_store import HIST_COLUMNS, adjusted_bars  # 不复权K线+复权因子缓存
+except ImportError:
+    import akshare as ak
+
+    adjusted_bars = None
+
 # 配置参数
 TRADE_DATE = datetime.now().strftime("%Y%m%d")  # 指定交易日
 CAPITAL_LIMIT = 100  # 市值限制（亿）
@@ -16,25 +31,36 @@ SENTIMENT_PARAMS = {  # 情绪冰点阈值
     "avg_pct": -0.5,  # 昨日涨停股平均涨幅阈值
 }
 
+# 涨停股池走本地归档，前序交易日和当日股池不再重复请求
+archive = ZtPoolArchive()
+
 
 def get_zt_pool(date):
     """获取当日涨停板数据"""
-    zt_pool = ak.stock_zt_pool_em(date=date)
-    return zt_pool[["代码", "名称", "首次封板时间", "封板资金"]]
+    zt_pool = archive.get_pool("zt", date)
+    columns = ["代码", "名称", "首次封板时间", "封板资金"]
+    if zt_pool.empty:  # 非交易日或请求失败
+        return pd.DataFrame(columns=columns)
+    return zt_pool[columns]
 
 
 def get_stock_data(symbol, days=30):
     """获取个股历史数据"""
     end_date = datetime.strptime(TRADE_DATE, "%Y%m%d")
     start_date = end_date - timedelta(days=days * 2)
-    df = ak.stock_zh_a_hist(
-        symbol=symbol,
-        period="daily",
-        start_date=start_date.strftime("%Y%m%d"),
-        end_date=TRADE_DATE,
-        adjust="qfq",
-    )
-    return df
+    if adjusted_bars is None:
+        return ak.stock_zh_a_hist(
+            symbol=symbol,
+            period="daily",
+            start_date=start_date.strftime("%Y%m%d"),
+            end_date=TRADE_DATE,
+            adjust="qfq",
+        )
+    # 前复权价格由本地缓存的不复权K线和复权因子计算，列名还原为 stock_zh_a_hist 的中文列名
+    df = adjusted_bars(symbol, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+    if df is None:
+        return pd.DataFrame()
+    return df.rename(columns={en: cn for cn, en in HIST_COLUMNS.items()})
 
 
 def calculate_technical(df):
@@ -128,12 +154,9 @@ def get_previous_trade_date(current_date):
     for i in range(1, 10):
         prev_dt = current_dt - timedelta(days=i)
         prev_date = prev_dt.strftime("%Y%m%d")
-        try:
-            df = ak.stock_zt_pool_em(date=prev_date)
-            if not df.empty:
-                return prev_date
-        except:
-            continue
+        # 历史日期的股池已归档，回溯不再触发网络请求
+        if not archive.get_pool("zt", prev_date).empty:
+            return prev_date
     raise ValueError("前序交易日获取失败")
 
 
@@ -141,8 +164,8 @@ def get_market_sentiment(current_date):
     """计算市场情绪指标"""
     # 获取前后交易日数据
     prev_date = get_previous_trade_date(current_date)
-    prev_zt = ak.stock_zt_pool_em(date=prev_date)
-    curr_zt = ak.stock_zt_pool_em(date=current_date)
+    prev_zt = archive.get_pool("zt", prev_date)
+    curr_zt = archive.get_pool("zt", current_date)
 
     # 基础指标
     zt_count = len(curr_zt)  # 当日涨停家数
@@ -1,58 +1,40 @@
-# 安装必要的包（如果还没有安装）
-# !pip install lib-pybroker akshare
-
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.ticker import FuncFormatter
-import akshare as ak
-from datetime import datetime
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩量十字星反转策略 - PyBroker 回测
+
+导入本模块没有副作用：pandas、akshare、PyBroker、TA-Lib、matplotlib 都在用到的函数里才导入，
+指标在 build_indicators() 首次调用时注册，日志文件、行情下载和回测只在 run_backtest() 中进行。
+参数扫描或测试可以直接调用各函数：
+
+    import backetest
+    backetest.BACKTEST_START = "2024-01-01"
+    result = backetest.run_backtest(stock_data, plot=False)
+
+命令行:
+    python backetest.py                                   # 2023-01-01 至今
+    python backetest.py --start 2024-01-01 --end 2024-12-31 --max-positions 5 --no-plot
+"""
+
+import argparse
+import hashlib
+import os
 import time
 import warnings
+from datetime import datetime
+from typing import TYPE_CHECKING
 
-warnings.filterwarnings("ignore")
-
-# 设置matplotlib中文字体
-plt.rcParams["font.sans-serif"] = [
-    "SimHei",
-    "Microsoft YaHei",
-    "DejaVu Sans",
-    "Arial Unicode MS",
-]  # 用来正常显示中文标签
-plt.rcParams["axes.unicode_minus"] = False  # 用来正常显示负号
-
-# 导入 pybroker 和 talib
-try:
-    import pybroker
-
-    try:
-        from pybroker import Strategy, StrategyConfig, ExecContext
-    except ImportError:
-        from pybroker.strategy import Strategy
-        from pybroker.config import StrategyConfig
-        from pybroker.context import ExecContext
-
-    from pybroker.common import PriceType
-    import talib
-
-    print("PyBroker 和 TA-Lib 导入成功")
-except ImportError:
-    print("请先安装 PyBroker 和 TA-Lib: pip install lib-pybroker TA-Lib")
-    raise
+if TYPE_CHECKING:
+    from pybroker import ExecContext
 
-# 设置回测参数
+# 设置回测参数（命令行参数会覆盖；选股、交易回调直接读取这些全局变量）
 BACKTEST_START = "2023-01-01"
 BACKTEST_END = datetime.now().strftime("%Y-%m-%d")
 MAX_POSITIONS = 3
 INITIAL_CASH = 1000000
 
-print(f"回测期间: {BACKTEST_START} 到 {BACKTEST_END}")
-
-# 启用缓存 (如果支持)
-try:
-    pybroker.enable_data_source_cache("yang_bao_yin_strategy")
-except AttributeError:
-    print("注意：当前PyBroker版本不支持enable_data_source_cache")
-
+# 决定回测结果的源码：选股/交易阈值直接写在这些文件里，内容变化即视为参数不同
+STRATEGY_SOURCES = ("backetest.py", "compact_bars.py", "universe.py")
 
 # 全局变量存储股票代码到名称的映射
 STOCK_NAME_MAP = {}
@@ -65,108 +47,47 @@ MARKET_SENTIMENT = {
     "max_7day_gain": 0.0,
 }
 
+# PyBroker 不支持 param 时的选股结果
+SELECTED_STOCKS = []
+
+# 本次回测每日入选的股票（date, rank, symbol, score），回测结束后写入运行登记
+SELECTION_HISTORY = []
+
 
 # 获取主板股票列表
 def get_main_board_stocks():
-    """获取主板股票列表"""
-    global STOCK_NAME_MAP
+    """获取主板股票列表（当日快照已存在时不再下载）"""
+    import pandas as pd
 
-    # 使用akshare获取A股股票信息
-    try:
-        # 获取A股股票基本信息
-        print("正在获取A股股票基本信息...")
-        all_stocks = ak.stock_info_a_code_name()
-        time.sleep(1)  # 获取股票列表后休眠1秒
-    except Exception as e:
-        print(f"获取股票列表失败，尝试备用方法: {e}")
-        try:
-            # 备用方法：获取沪深A股实时数据
-            print("使用备用方法获取股票列表...")
-            time.sleep(2)  # 切换方法前休眠2秒
-            all_stocks = ak.stock_zh_a_spot_em()
-            time.sleep(1)  # 获取成功后休眠1秒
-        except Exception as e2:
-            print(f"备用方法也失败: {e2}")
-            # 如果都失败，返回空DataFrame
-            return pd.DataFrame()
-
-    def is_main_board_stock(code, name):
-        if any(code.startswith(prefix) for prefix in ["300", "688"]):
-            return False
-        if any(keyword in name for keyword in ["ST", "st", "退"]):
-            return False
-        main_board_prefixes = ["600", "601", "603", "605", "000", "001", "002"]
-        return any(code.startswith(prefix) for prefix in main_board_prefixes)
-
-    # akshare返回的列名可能不同，需要适配
-    try:
-        # 尝试标准列名
-        code_col = "代码" if "代码" in all_stocks.columns else "code"
-        name_col = "名称" if "名称" in all_stocks.columns else "name"
-        if code_col not in all_stocks.columns:
-            # 查找可能的代码列
-            for col in all_stocks.columns:
-                if "代码" in col or "code" in col.lower():
-                    code_col = col
-                    break
-        if name_col not in all_stocks.columns:
-            # 查找可能的名称列
-            for col in all_stocks.columns:
-                if "名称" in col or "name" in col.lower():
-                    name_col = col
-                    break
-    except Exception:
-        # 如果都没有，使用第一列和第二列
-        if len(all_stocks.columns) >= 2:
-            code_col = all_stocks.columns[0]
-            name_col = all_stocks.columns[1]
-        else:
-            return pd.DataFrame()
+    from universe import code_name_map, load_universe
 
-    main_board_stocks = all_stocks[
-        all_stocks.apply(
-            lambda row: is_main_board_stock(row[code_col], row[name_col]), axis=1
-        )
-    ]
+    universe = load_universe()
+    if universe is None:
+        return pd.DataFrame()
 
     # 创建股票代码到名称的映射
-    for _, row in main_board_stocks.iterrows():
-        STOCK_NAME_MAP[row[code_col]] = row[name_col]
+    STOCK_NAME_MAP.update(code_name_map(universe))
 
-    return main_board_stocks
+    return universe
 
 
 # 获取单只股票历史数据的辅助函数
 def get_single_stock_data(stock_code, start_date, end_date, max_retries=3):
-    """获取单只股票的历史数据 - 使用akshare的stock_zh_a_hist接口"""
+    """获取单只股票的前复权历史数据
+
+    经由 bar_store.adjusted_bars：本地只缓存不复权K线和复权因子，读取时计算前复权价格，
+    分红送转后不会读到按旧基准复权的缓存。
+    """
+    import pandas as pd
+
+    from bar_store import adjusted_bars
 
     for retry in range(max_retries):
         try:
-            # 使用akshare的stock_zh_a_hist获取历史K线数据
-            # 参数说明：
-            # symbol: 股票代码，直接使用6位数字代码
-            # period: 周期，'daily'表示日线
-            # start_date: 开始日期，格式YYYYMMDD
-            # end_date: 结束日期，格式YYYYMMDD
-            # adjust: 复权类型，"qfq"表示前复权
-
-            # stock_zh_a_hist接口直接使用股票代码，不需要市场前缀
-            formatted_code = stock_code
-
-            start_formatted = start_date.replace("-", "")
-            end_formatted = end_date.replace("-", "")
-
-            data = ak.stock_zh_a_hist(
-                symbol=formatted_code,
-                period="daily",
-                start_date=start_formatted,
-                end_date=end_formatted,
-                adjust="qfq",  # 使用前复权
-            )
+            data = adjusted_bars(stock_code, start_date, end_date, adjust="qfq")
 
             if data is not None and not data.empty:
-                # akshare的stock_zh_a_hist返回的列名标准化
-                # stock_zh_a_hist列名: 日期, 股票代码, 开盘, 收盘, 最高, 最低, 成交量, 成交额, 振幅, 涨跌幅, 涨跌额, 换手率
+                # 列名标准化（adjusted_bars 已是英文列名，兼容 stock_zh_a_hist 的中文列名）
                 data = data.reset_index()  # 确保日期列可访问
 
                 # 检查并重命名列
@@ -227,9 +148,10 @@ def get_single_stock_data(stock_code, start_date, end_date, max_retries=3):
                 data = data[available_cols]
 
                 return data
-            else:
-                print(f"stock_zh_a_hist返回空数据: {stock_code}")
-                return None
+            elif data is not None:
+                print(f"区间内没有K线数据: {stock_code}")
+                return data  # 空 DataFrame：无数据，与请求失败（None）区分开
+            return None
 
         except Exception as e:
             if retry < max_retries - 1:
@@ -250,6 +172,12 @@ def get_single_stock_data(stock_code, start_date, end_date, max_retries=3):
 # 获取股票历史数据并转换为PyBroker格式
 def prepare_stock_data():
     """准备PyBroker格式的股票数据 - 使用akshare的stock_zh_a_hist接口"""
+    import numpy as np
+
+    from compact_bars import CompactBarBuffer
+    from download_job import DEFAULT_JOB_ROOT, DownloadJob, purge_old_jobs
+    from universe import UniverseHistory
+
     print("正在获取主板股票列表...")
     main_board_stocks = get_main_board_stocks()
 
@@ -264,43 +192,60 @@ def prepare_stock_data():
     except:
         stock_codes = []
 
+    # 时点股票池：包含回测期间退市、新上市的股票，避免幸存者偏差
+    universe_history = UniverseHistory.load_or_build()
+    if universe_history is not None:
+        for code, name in universe_history.name_map().items():
+            STOCK_NAME_MAP.setdefault(code, name)
+        stock_codes = universe_history.members_between(BACKTEST_START, BACKTEST_END)
+        print(f"📜 时点股票池: 回测期间共 {len(stock_codes)} 只主板股票")
+
     print(f"回测期间: {BACKTEST_START} 到 {BACKTEST_END}")
     print(f"正在获取 {len(stock_codes)} 只股票的历史数据...")
 
-    all_data = []
+    # 下载即写入预分配的紧凑列缓冲区，不保留逐只股票的 DataFrame
+    bar_buffer = CompactBarBuffer(stock_codes, BACKTEST_START, BACKTEST_END)
+    success_count = 0
     failed_count = 0
 
-    for i, stock_code in enumerate(stock_codes):
-        if i % 50 == 0:
-            progress = (i + 1) / len(stock_codes) * 100
-            print(f"进度: {i+1}/{len(stock_codes)} ({progress:.1f}%)")
-
-        try:
-            # 使用stock_zh_a_hist获取单只股票历史数据
-            data = get_single_stock_data(stock_code, BACKTEST_START, BACKTEST_END)
-
-            if data is not None and not data.empty and len(data) > 50:
-                all_data.append(data)
-            else:
-                failed_count += 1
-
-            time.sleep(0.1)  # 基础请求间隔
-
-            # 每获取100只股票休眠10秒防止被风控
-            if (i + 1) % 100 == 0:
-                print(f"已获取{i+1}只股票，休眠10秒防止风控...")
-                time.sleep(10)
+    # 逐只落盘并记录完成状态，中断后重新运行从断点继续。
+    # 任务里存的是前复权价格，以当天的复权因子为基准，因此任务按日期区分；
+    # 跨天重跑时不复权K线仍从 bar_store 缓存读取，只刷新复权因子
+    job = DownloadJob(
+        os.path.join(
+            DEFAULT_JOB_ROOT,
+            f"backtest_{BACKTEST_START}_{BACKTEST_END}_qfq{datetime.now():%Y%m%d}",
+        ),
+        # 重试统一交给任务的退避轮次，单次请求不再内部重试
+        fetch=lambda code: get_single_stock_data(
+            code, BACKTEST_START, BACKTEST_END, max_retries=1
+        ),
+    )
+    purge_old_jobs(prefix="backtest_")
 
-        except Exception as e:
-            print(f"获取 {stock_code} 数据失败: {e}")
+    for stock_code, data in job.run(stock_codes, progress_every=50):
+        if data is not None and not data.empty and len(data) > 50:
+            bar_buffer.append(stock_code, data)
+            success_count += 1
+        else:
             failed_count += 1
-            continue
 
-    if all_data:
-        combined_data = pd.concat(all_data, ignore_index=True)
-        print(f"✅ 成功获取 {len(all_data)} 只股票的数据")
+    if success_count:
+        combined_data = bar_buffer.to_frame()
+        del bar_buffer
+
+        # 逐K线标记当日是否属于股票池（已上市、未退市、非ST），选股时跳过不符合的股票
+        if universe_history is not None:
+            eligible = universe_history.eligible_mask(
+                combined_data["symbol"], combined_data["date"]
+            )
+        else:
+            eligible = np.ones(len(combined_data), dtype=bool)
+        combined_data["eligible"] = eligible.astype(np.float32)
+        print(f"✅ 成功获取 {success_count} 只股票的数据")
         print(f"❌ 失败 {failed_count} 只股票")
         print(f"📊 总数据行数: {len(combined_data)}")
+        print(f"💾 数据内存占用: {combined_data.memory_usage(deep=True).sum() / 1024**2:.1f} MB")
         print(
             f"📅 数据日期范围: {combined_data['date'].min()} 到 {combined_data['date'].max()}"
         )
@@ -314,129 +259,42 @@ def prepare_stock_data():
         return None
 
 
-# 注册自定义列 (如果支持)
-try:
-    pybroker.register_columns("pct_change")
-except AttributeError:
-    print("注意：当前PyBroker版本不支持register_columns")
+# 指标在首次构建策略时注册，导入本模块时不加载 PyBroker/TA-Lib
+_INDICATORS = None
 
-# 定义5日均线指标 - 使用 talib (用于选股)
-try:
-    ma5_indicator = pybroker.indicator(
-        "ma5", lambda data: talib.SMA(data.close.astype(float), timeperiod=5)
-    )
-except AttributeError:
-    from pybroker.indicator import indicator
 
-    ma5_indicator = indicator(
-        "ma5", lambda data: talib.SMA(data.close.astype(float), timeperiod=5)
-    )
+def _import_pybroker():
+    """延迟导入 PyBroker 和 TA-Lib"""
+    try:
+        import pybroker
+        import talib
+    except ImportError:
+        print("请先安装 PyBroker 和 TA-Lib: pip install lib-pybroker TA-Lib")
+        raise
+    return pybroker, talib
 
-# 定义13日均线指标 - 使用 talib (用于卖出)
-try:
-    ma13_indicator = pybroker.indicator(
-        "ma13", lambda data: talib.SMA(data.close.astype(float), timeperiod=13)
-    )
-except AttributeError:
-    ma13_indicator = indicator(
-        "ma13", lambda data: talib.SMA(data.close.astype(float), timeperiod=13)
-    )
 
-# 新增：20日均线指标 - 用于趋势判断
-try:
-    ma20_indicator = pybroker.indicator(
-        "ma20", lambda data: talib.SMA(data.close.astype(float), timeperiod=20)
-    )
-except AttributeError:
-    ma20_indicator = indicator(
-        "ma20", lambda data: talib.SMA(data.close.astype(float), timeperiod=20)
-    )
+def build_indicators():
+    """注册自定义列并创建策略用到的技术指标（只执行一次）"""
+    global _INDICATORS
+    if _INDICATORS is not None:
+        return _INDICATORS
 
-# 修改：30日均线指标 - 降低周期要求，加速启动
-try:
-    ma30_indicator = pybroker.indicator(
-        "ma30", lambda data: talib.SMA(data.close.astype(float), timeperiod=30)
-    )
-except AttributeError:
-    ma30_indicator = indicator(
-        "ma30", lambda data: talib.SMA(data.close.astype(float), timeperiod=30)
-    )
+    pybroker, talib = _import_pybroker()
 
-# 新增：RSI指标 - 用于强势判断
-try:
-    rsi_indicator = pybroker.indicator(
-        "rsi", lambda data: talib.RSI(data.close.astype(float), timeperiod=14)
-    )
-except AttributeError:
-    rsi_indicator = indicator(
-        "rsi", lambda data: talib.RSI(data.close.astype(float), timeperiod=14)
-    )
-
-# 新增：MACD线指标 - 用于动量判断
-try:
-    macd_line_indicator = pybroker.indicator(
-        "macd_line",
-        lambda data: talib.MACD(
-            data.close.astype(float), fastperiod=12, slowperiod=26, signalperiod=9
-        )[
-            0
-        ],  # [0] 是MACD线
-    )
-except AttributeError:
-    macd_line_indicator = indicator(
-        "macd_line",
-        lambda data: talib.MACD(
-            data.close.astype(float), fastperiod=12, slowperiod=26, signalperiod=9
-        )[
-            0
-        ],  # [0] 是MACD线
-    )
-
-# 新增：DEA线指标 - 用于动量判断
-try:
-    dea_line_indicator = pybroker.indicator(
-        "dea_line",
-        lambda data: talib.MACD(
-            data.close.astype(float), fastperiod=12, slowperiod=26, signalperiod=9
-        )[
-            1
-        ],  # [1] 是DEA线（信号线）
-    )
-except AttributeError:
-    dea_line_indicator = indicator(
-        "dea_line",
-        lambda data: talib.MACD(
-            data.close.astype(float), fastperiod=12, slowperiod=26, signalperiod=9
-        )[
-            1
-        ],  # [1] 是DEA线（信号线）
-    )
-
-# 新增：成交量均线指标 - 用于量能判断
-try:
-    volume_ma_indicator = pybroker.indicator(
-        "volume_ma", lambda data: talib.SMA(data.volume.astype(float), timeperiod=20)
-    )
-except AttributeError:
-    volume_ma_indicator = indicator(
-        "volume_ma", lambda data: talib.SMA(data.volume.astype(float), timeperiod=20)
-    )
+    # 注册自定义列 (如果支持)
+    try:
+        pybroker.register_columns("pct_change", "eligible")
+    except AttributeError:
+        print("注意：当前PyBroker版本不支持register_columns")
 
-# 新增：10日成交量均线指标 - 用于买入时的成交量过滤
-try:
-    volume_ma10_indicator = pybroker.indicator(
-        "volume_ma10", lambda data: talib.SMA(data.volume.astype(float), timeperiod=10)
-    )
-except AttributeError:
-    volume_ma10_indicator = indicator(
-        "volume_ma10", lambda data: talib.SMA(data.volume.astype(float), timeperiod=10)
-    )
+    try:
+        indicator = pybroker.indicator
+    except AttributeError:
+        from pybroker.indicator import indicator
 
-# 新增：KDJ指标 - 用于过滤超买状态
-try:
-    kdj_k_indicator = pybroker.indicator(
-        "kdj_k",
-        lambda data: talib.STOCH(
+    def stoch(data):
+        return talib.STOCH(
             data.high.astype(float),
             data.low.astype(float),
             data.close.astype(float),
@@ -445,63 +303,59 @@ try:
             slowk_matype=0,
             slowd_period=3,
             slowd_matype=0,
-        )[
-            0
-        ],  # K值
-    )
-    kdj_d_indicator = pybroker.indicator(
-        "kdj_d",
-        lambda data: talib.STOCH(
-            data.high.astype(float),
-            data.low.astype(float),
-            data.close.astype(float),
-            fastk_period=9,
-            slowk_period=3,
-            slowk_matype=0,
-            slowd_period=3,
-            slowd_matype=0,
-        )[
-            1
-        ],  # D值
-    )
-except AttributeError:
-    kdj_k_indicator = indicator(
-        "kdj_k",
-        lambda data: talib.STOCH(
-            data.high.astype(float),
-            data.low.astype(float),
-            data.close.astype(float),
-            fastk_period=9,
-            slowk_period=3,
-            slowk_matype=0,
-            slowd_period=3,
-            slowd_matype=0,
-        )[
-            0
-        ],  # K值
-    )
-    kdj_d_indicator = indicator(
-        "kdj_d",
-        lambda data: talib.STOCH(
-            data.high.astype(float),
-            data.low.astype(float),
-            data.close.astype(float),
-            fastk_period=9,
-            slowk_period=3,
-            slowk_matype=0,
-            slowd_period=3,
-            slowd_matype=0,
-        )[
-            1
-        ],  # D值
-    )
+        )
+
+    def macd(data):
+        return talib.MACD(
+            data.close.astype(float), fastperiod=12, slowperiod=26, signalperiod=9
+        )
 
-# 定义全局参数存储选股结果 (如果支持)
-try:
-    pybroker.param("selected_stocks", [])
-except AttributeError:
-    # 如果不支持，我们使用全局变量
-    SELECTED_STOCKS = []
+    _INDICATORS = {
+        # 5日均线 (用于选股)
+        "ma5": indicator(
+            "ma5", lambda data: talib.SMA(data.close.astype(float), timeperiod=5)
+        ),
+        # 13日均线 (用于卖出)
+        "ma13": indicator(
+            "ma13", lambda data: talib.SMA(data.close.astype(float), timeperiod=13)
+        ),
+        # 20日均线 - 用于趋势判断
+        "ma20": indicator(
+            "ma20", lambda data: talib.SMA(data.close.astype(float), timeperiod=20)
+        ),
+        # 30日均线 - 降低周期要求，加速启动
+        "ma30": indicator(
+            "ma30", lambda data: talib.SMA(data.close.astype(float), timeperiod=30)
+        ),
+        # RSI - 用于强势判断
+        "rsi": indicator(
+            "rsi", lambda data: talib.RSI(data.close.astype(float), timeperiod=14)
+        ),
+        # MACD线 - 用于动量判断（[0] 是MACD线）
+        "macd_line": indicator("macd_line", lambda data: macd(data)[0]),
+        # DEA线 - 用于动量判断（[1] 是DEA线，即信号线）
+        "dea_line": indicator("dea_line", lambda data: macd(data)[1]),
+        # 20日成交量均线 - 用于量能判断
+        "volume_ma": indicator(
+            "volume_ma", lambda data: talib.SMA(data.volume.astype(float), timeperiod=20)
+        ),
+        # 10日成交量均线 - 用于买入时的成交量过滤
+        "volume_ma10": indicator(
+            "volume_ma10",
+            lambda data: talib.SMA(data.volume.astype(float), timeperiod=10),
+        ),
+        # KDJ - 用于过滤超买状态
+        "kdj_k": indicator("kdj_k", lambda data: stoch(data)[0]),  # K值
+        "kdj_d": indicator("kdj_d", lambda data: stoch(data)[1]),  # D值
+    }
+
+    # 定义全局参数存储选股结果 (如果不支持，使用全局变量 SELECTED_STOCKS)
+    try:
+        pybroker.param("selected_stocks", [])
+    except AttributeError:
+        pass
+
+    return _INDICATORS
 
 
 # 市场情绪判断函数
@@ -639,6 +493,11 @@ def doji_reversal_screening(ctxs):
             if df_length < 22:
                 continue
 
+            # 当日不在时点股票池中（ST、已退市等）
+            eligible = getattr(ctx, "eligible", None)
+            if eligible is not None and not eligible[-1]:
+                continue
+
             # 检查是否有足够的成交量数据
             if len(ctx.volume) < 22:
                 continue
@@ -1015,19 +874,31 @@ def doji_reversal_screening(ctxs):
 
     # 保存选股结果
     try:
+        import pybroker
+
         pybroker.param("selected_stocks", selected_stocks)
-    except (AttributeError, NameError):
+    except (ImportError, AttributeError):
         global SELECTED_STOCKS
         SELECTED_STOCKS = selected_stocks
 
+    # 获取当前日期字符串
+    current_date_str = (
+        current_date[-1]
+        if hasattr(current_date, "__getitem__") and len(current_date) > 0
+        else str(current_date)
+    )
+    SELECTION_HISTORY.extend(
+        {
+            "date": str(current_date_str)[:10],
+            "rank": i + 1,
+            "symbol": stock["symbol"],
+            "score": stock["score"],
+        }
+        for i, stock in enumerate(selected_stocks)
+    )
+
     # 输出选股结果并记录到日志文件
     if selected_stocks:
-        # 获取当前日期字符串
-        current_date_str = (
-            current_date[-1]
-            if hasattr(current_date, "__getitem__") and len(current_date) > 0
-            else str(current_date)
-        )
         print(f"\n{current_date_str} 缩量十字星反转选股结果:")
 
         # 写入日志文件
@@ -1084,11 +955,6 @@ def doji_reversal_screening(ctxs):
         print(f"✅ 选股结果已记录到: {log_filename}")
     else:
         # 当没有选出任何股票时的提示
-        current_date_str = (
-            current_date[-1]
-            if hasattr(current_date, "__getitem__") and len(current_date) > 0
-            else str(current_date)
-        )
         print(f"\n{current_date_str} 选股结果: 今日无十字星反转信号")
 
         # 也记录到日志文件
@@ -1105,7 +971,7 @@ def doji_reversal_screening(ctxs):
 
 
 # 缩量十字星反转执行函数
-def doji_reversal_execution(ctx: ExecContext):
+def doji_reversal_execution(ctx: "ExecContext"):
     """缩量十字星反转策略执行函数
 
     策略逻辑：
@@ -1229,8 +1095,10 @@ def doji_reversal_execution(ctx: ExecContext):
     # === 买入逻辑：十字星反转第三天买入 ===
     # 获取选股结果（十字星反转股票）
     try:
+        import pybroker
+
         selected_stocks = pybroker.param("selected_stocks")
-    except (AttributeError, NameError):
+    except (ImportError, AttributeError):
         global SELECTED_STOCKS
         selected_stocks = SELECTED_STOCKS
 
@@ -1441,13 +1309,30 @@ def initialize_log_files():
         print(f"初始化情绪分析日志失败: {e}")
 
 
-# 准备数据
-print("开始准备回测数据...")
-initialize_log_files()  # 初始化日志文件
-stock_data = prepare_stock_data()
+def combined_before_exec(ctxs):
+    """组合的预执行函数：先进行情绪分析，再进行选股"""
+    # 1. 先进行市场情绪分析
+    market_sentiment_analysis(ctxs)
+    # 2. 再进行十字星反转选股
+    doji_reversal_screening(ctxs)
 
-if stock_data is not None:
-    print("开始回测...")
+
+def build_strategy(stock_data):
+    """用准备好的K线数据创建缩量十字星反转策略"""
+    pybroker, _ = _import_pybroker()
+    try:
+        from pybroker import Strategy, StrategyConfig
+    except ImportError:
+        from pybroker.strategy import Strategy
+        from pybroker.config import StrategyConfig
+
+    # 启用缓存 (如果支持)
+    try:
+        pybroker.enable_data_source_cache("yang_bao_yin_strategy")
+    except AttributeError:
+        print("注意：当前PyBroker版本不支持enable_data_source_cache")
+
+    indicators = build_indicators()
 
     # 获取股票代码列表
     symbols = stock_data["symbol"].unique().tolist()
@@ -1474,13 +1359,6 @@ if stock_data is not None:
     )
 
     # 先设置市场情绪分析函数，再设置选股函数
-    def combined_before_exec(ctxs):
-        """组合的预执行函数：先进行情绪分析，再进行选股"""
-        # 1. 先进行市场情绪分析
-        market_sentiment_analysis(ctxs)
-        # 2. 再进行十字星反转选股
-        doji_reversal_screening(ctxs)
-
     strategy.set_before_exec(combined_before_exec)
 
     # 添加缩量十字星反转执行逻辑 - 使用必要的技术指标
@@ -1488,377 +1366,525 @@ if stock_data is not None:
         doji_reversal_execution,
         symbols,
         indicators=[
-            ma5_indicator,
-            ma20_indicator,
-            ma30_indicator,  # 用于止损
-            volume_ma_indicator,  # 用于缩量判断
-            macd_line_indicator,  # 用于MACD线判断
-            dea_line_indicator,  # 用于DEA线判断
-            kdj_k_indicator,  # 用于KDJ K值判断
-            kdj_d_indicator,  # 用于KDJ D值判断
+            indicators["ma5"],
+            indicators["ma20"],
+            indicators["ma30"],  # 用于止损
+            indicators["volume_ma"],  # 用于缩量判断
+            indicators["macd_line"],  # 用于MACD线判断
+            indicators["dea_line"],  # 用于DEA线判断
+            indicators["kdj_k"],  # 用于KDJ K值判断
+            indicators["kdj_d"],  # 用于KDJ D值判断
         ],
     )
+    return strategy
 
-    # 运行回测
+
+def print_backtest_metrics(result):
+    """打印回测指标汇总"""
+    print("\n" + "=" * 60)
+    print("缩量十字星反转策略回测结果汇总")
+    print("=" * 60)
+
+    # 获取组合统计信息（使用PyBroker标准方式：result.metrics_df）
     try:
-        result = strategy.backtest()
+        if hasattr(result, "metrics_df") and result.metrics_df is not None:
+            metrics = result.metrics_df
+            print("\n💰 投资组合表现:")
+            print(f"初始资金: ¥{INITIAL_CASH:,.2f}")
+
+            # 创建指标字典方便查找
+            metrics_dict = {}
+            for _, row in metrics.iterrows():
+                metrics_dict[row["name"]] = row["value"]
+
+            # 显示关键指标
+            key_metrics = [
+                ("end_market_value", "最终资金", "¥{:,.2f}"),
+                ("total_pnl", "总收益", "¥{:,.2f}"),
+                ("total_return_pct", "总收益率", "{:.2f}%"),
+                ("max_drawdown_pct", "最大回撤", "{:.2f}%"),
+                ("win_rate", "胜率", "{:.2f}%"),
+                ("trade_count", "交易次数", "{:.0f}"),
+                ("sharpe", "夏普比率", "{:.3f}"),
+            ]
+
+            for key, label, fmt in key_metrics:
+                if key in metrics_dict:
+                    value = metrics_dict[key]
+                    print(f"{label}: {fmt.format(value)}")
+
+            # 显示完整的metrics表格
+            print("\n📊 详细指标:")
+            print(metrics.to_string(index=False))
+        else:
+            print("\n⚠️ 无法获取详细的回测指标")
+            print(f"初始资金: ¥{INITIAL_CASH:,.2f}")
 
-        # 显示回测结果
-        print("\n" + "=" * 60)
-        print("缩量十字星反转策略回测结果汇总")
-        print("=" * 60)
+    except Exception as stats_error:
+        print(f"获取统计信息时出错: {stats_error}")
+        print(f"初始资金: ¥{INITIAL_CASH:,.2f}")
 
-        # 获取组合数据和统计信息
-        portfolio = result.portfolio
+    # 获取交易记录
+    if hasattr(result, "orders") and len(result.orders) > 0:
+        orders = result.orders
+        print(f"交易次数: {len(orders)}")
 
-        # 获取组合统计信息（使用PyBroker标准方式：result.metrics_df）
+        # 计算胜率
+        completed_trades = orders[orders["type"] == "sell"]
+        if len(completed_trades) > 0:
+            # 这里需要更复杂的逻辑来计算盈亏，简化处理
+            print(f"卖出交易次数: {len(completed_trades)}")
+
+
+def get_hs300_benchmark():
+    """获取沪深300指数数据作为基准"""
+    import pandas as pd
+
+    from data_provider import akshare as ak
+
+    try:
+        print("正在获取沪深300基准数据...")
+        # 使用akshare获取沪深300指数历史数据
         try:
-            if hasattr(result, "metrics_df") and result.metrics_df is not None:
-                metrics = result.metrics_df
-                print("\n💰 投资组合表现:")
-                print(f"初始资金: ¥{INITIAL_CASH:,.2f}")
-
-                # 创建指标字典方便查找
-                metrics_dict = {}
-                for _, row in metrics.iterrows():
-                    metrics_dict[row["name"]] = row["value"]
-
-                # 显示关键指标
-                key_metrics = [
-                    ("end_market_value", "最终资金", "¥{:,.2f}"),
-                    ("total_pnl", "总收益", "¥{:,.2f}"),
-                    ("total_return_pct", "总收益率", "{:.2f}%"),
-                    ("max_drawdown_pct", "最大回撤", "{:.2f}%"),
-                    ("win_rate", "胜率", "{:.2f}%"),
-                    ("trade_count", "交易次数", "{:.0f}"),
-                    ("sharpe", "夏普比率", "{:.3f}"),
-                ]
+            # 使用akshare的指数日线数据接口
+            hs300_data = ak.index_zh_a_hist(
+                symbol="000300",  # 沪深300指数代码
+                period="daily",
+                start_date=BACKTEST_START.replace("-", ""),
+                end_date=BACKTEST_END.replace("-", ""),
+            )
+
+            if hs300_data is not None and not hs300_data.empty:
+                # 标准化列名
+                hs300_data = hs300_data.reset_index()
+
+                # 重命名列以匹配后续处理
+                column_mapping = {
+                    "日期": "date",
+                    "收盘": "close",
+                    "date": "date",
+                    "close": "close",
+                }
 
-                for key, label, fmt in key_metrics:
-                    if key in metrics_dict:
-                        value = metrics_dict[key]
-                        print(f"{label}: {fmt.format(value)}")
+                for old_col, new_col in column_mapping.items():
+                    if old_col in hs300_data.columns:
+                        hs300_data = hs300_data.rename(
+                            columns={old_col: new_col}
+                        )
 
-                # 显示完整的metrics表格
-                print("\n📊 详细指标:")
-                print(metrics.to_string(index=False))
+                # 确保日期列格式正确
+                if "date" in hs300_data.columns:
+                    hs300_data["date"] = pd.to_datetime(hs300_data["date"])
+                    hs300_data = hs300_data[["date", "close"]].set_index("date")
+                    print("✅ 沪深300基准数据获取成功")
+                    return hs300_data
+                else:
+                    print("⚠️ 沪深300数据格式异常")
             else:
-                print("\n⚠️ 无法获取详细的回测指标")
-                print(f"初始资金: ¥{INITIAL_CASH:,.2f}")
+                print("❌ 沪深300数据获取失败")
 
-        except Exception as stats_error:
-            print(f"获取统计信息时出错: {stats_error}")
-            print(f"初始资金: ¥{INITIAL_CASH:,.2f}")
+        except Exception as e:
+            print(f"❌ 获取沪深300基准数据失败: {e}")
 
-        # 获取交易记录
-        if hasattr(result, "orders") and len(result.orders) > 0:
-            orders = result.orders
-            print(f"交易次数: {len(orders)}")
+        return None
+    except Exception as e:
+        print(f"获取沪深300基准数据失败: {e}")
+        return None
 
-            # 计算胜率
-            completed_trades = orders[orders["type"] == "sell"]
-            if len(completed_trades) > 0:
-                # 这里需要更复杂的逻辑来计算盈亏，简化处理
-                print(f"卖出交易次数: {len(completed_trades)}")
 
-                # 获取沪深300基准数据
+def plot_backtest_results(portfolio, path="yang_bao_yin_backtest_results.png"):
+    """绘制资金曲线和相对沪深300的累计收益率曲线"""
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import FuncFormatter
 
-        def get_hs300_benchmark():
-            """获取沪深300指数数据作为基准"""
-            try:
-                print("正在获取沪深300基准数据...")
-                # 使用akshare获取沪深300指数历史数据
-                try:
-                    # 使用akshare的指数日线数据接口
-                    hs300_data = ak.index_zh_a_hist(
-                        symbol="000300",  # 沪深300指数代码
-                        period="daily",
-                        start_date=BACKTEST_START.replace("-", ""),
-                        end_date=BACKTEST_END.replace("-", ""),
-                    )
+    # 设置matplotlib中文字体
+    plt.rcParams["font.sans-serif"] = [
+        "SimHei",
+        "Microsoft YaHei",
+        "DejaVu Sans",
+        "Arial Unicode MS",
+    ]  # 用来正常显示中文标签
+    plt.rcParams["axes.unicode_minus"] = False  # 用来正常显示负号
 
-                    if hs300_data is not None and not hs300_data.empty:
-                        # 标准化列名
-                        hs300_data = hs300_data.reset_index()
+    # 获取组合价值数据用于绘图（portfolio是DataFrame）
+    try:
+        portfolio_value = portfolio["market_value"]
+    except Exception as plot_error:
+        print(f"获取绘图数据时出错: {plot_error}")
+        portfolio_value = None
 
-                        # 重命名列以匹配后续处理
-                        column_mapping = {
-                            "日期": "date",
-                            "收盘": "close",
-                            "date": "date",
-                            "close": "close",
-                        }
+    if portfolio_value is None:
+        print("⚠️ 无法绘制图表：没有找到组合价值数据")
+        return None
 
-                        for old_col, new_col in column_mapping.items():
-                            if old_col in hs300_data.columns:
-                                hs300_data = hs300_data.rename(
-                                    columns={old_col: new_col}
-                                )
-
-                        # 确保日期列格式正确
-                        if "date" in hs300_data.columns:
-                            hs300_data["date"] = pd.to_datetime(hs300_data["date"])
-                            hs300_data = hs300_data[["date", "close"]].set_index("date")
-                            print("✅ 沪深300基准数据获取成功")
-                            return hs300_data
-                        else:
-                            print("⚠️ 沪深300数据格式异常")
-                    else:
-                        print("❌ 沪深300数据获取失败")
+    # 绘制收益曲线
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
 
-                except Exception as e:
-                    print(f"❌ 获取沪深300基准数据失败: {e}")
+    # 资金曲线
+    ax1.plot(
+        portfolio_value.index, portfolio_value.values, linewidth=2, color="blue"
+    )
+    ax1.set_title(
+        "缩量十字星反转策略 - 资金曲线", fontsize=14, fontweight="bold"
+    )
+    ax1.set_ylabel("资金 (元)", fontsize=12)
+    ax1.grid(True, alpha=0.3)
+    ax1.tick_params(axis="x", labelsize=10)
+    ax1.tick_params(axis="y", labelsize=10)
 
-                return None
-            except Exception as e:
-                print(f"获取沪深300基准数据失败: {e}")
-                return None
+    # 格式化y轴显示
+
+    ax1.yaxis.set_major_formatter(
+        FuncFormatter(lambda x, p: f"¥{x/10000:.1f}万")
+    )
 
-        # 绘制收益曲线
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
+    # 计算累计收益率
+    initial_value = portfolio_value.iloc[0]
+    cumulative_returns = (portfolio_value - initial_value) / initial_value * 100
 
-        # 获取组合价值数据用于绘图（portfolio是DataFrame）
+    # 获取沪深300基准数据并计算基准收益率
+    hs300_data = get_hs300_benchmark()
+    hs300_returns = None
+
+    if hs300_data is not None:
         try:
-            portfolio_value = portfolio["market_value"]
-        except Exception as plot_error:
-            print(f"获取绘图数据时出错: {plot_error}")
-            portfolio_value = None
-
-        if portfolio_value is not None:
-            # 资金曲线
-            ax1.plot(
-                portfolio_value.index, portfolio_value.values, linewidth=2, color="blue"
-            )
-            ax1.set_title(
-                "缩量十字星反转策略 - 资金曲线", fontsize=14, fontweight="bold"
-            )
-            ax1.set_ylabel("资金 (元)", fontsize=12)
-            ax1.grid(True, alpha=0.3)
-            ax1.tick_params(axis="x", labelsize=10)
-            ax1.tick_params(axis="y", labelsize=10)
+            # 对齐日期范围，只取与portfolio相同的日期范围
+            portfolio_start_date = portfolio_value.index[0]
+            portfolio_end_date = portfolio_value.index[-1]
+
+            # 筛选沪深300数据到相同日期范围
+            hs300_aligned = hs300_data[
+                (hs300_data.index >= portfolio_start_date)
+                & (hs300_data.index <= portfolio_end_date)
+            ]
+
+            if not hs300_aligned.empty:
+                # 计算沪深300累计收益率
+                hs300_initial = hs300_aligned["close"].iloc[0]
+                hs300_returns = (
+                    (hs300_aligned["close"] - hs300_initial)
+                    / hs300_initial
+                    * 100
+                )
+                hs300_points = len(hs300_returns)
+                print(f"沪深300基准收益率计算完成，数据点数: {hs300_points}")
+            else:
+                print("沪深300数据与组合数据日期范围不匹配")
 
-            # 格式化y轴显示
+        except Exception as e:
+            print(f"处理沪深300基准数据时出错: {e}")
+            hs300_returns = None
 
-            ax1.yaxis.set_major_formatter(
-                FuncFormatter(lambda x, p: f"¥{x/10000:.1f}万")
-            )
+    # 收益率曲线
+    ax2.fill_between(
+        cumulative_returns.index,
+        cumulative_returns.values,
+        0,
+        alpha=0.3,
+        color="green",
+        where=(cumulative_returns >= 0),
+        label="策略正收益",
+        interpolate=True,
+    )
+    ax2.fill_between(
+        cumulative_returns.index,
+        cumulative_returns.values,
+        0,
+        alpha=0.3,
+        color="red",
+        where=(cumulative_returns < 0),
+        label="策略负收益",
+        interpolate=True,
+    )
 
-            # 计算累计收益率
-            initial_value = portfolio_value.iloc[0]
-            cumulative_returns = (portfolio_value - initial_value) / initial_value * 100
+    # 绘制策略收益率曲线
+    ax2.plot(
+        cumulative_returns.index,
+        cumulative_returns.values,
+        linewidth=2,
+        color="darkgreen",
+        label="缩量十字星反转策略",
+        zorder=3,
+    )
 
-            # 获取沪深300基准数据并计算基准收益率
-            hs300_data = get_hs300_benchmark()
-            hs300_returns = None
+    # 绘制沪深300基准收益率曲线
+    if hs300_returns is not None:
+        ax2.plot(
+            hs300_returns.index,
+            hs300_returns.values,
+            linewidth=2,
+            color="red",
+            label="沪深300基准",
+            alpha=0.8,
+            zorder=2,
+        )
 
-            if hs300_data is not None:
-                try:
-                    # 对齐日期范围，只取与portfolio相同的日期范围
-                    portfolio_start_date = portfolio_value.index[0]
-                    portfolio_end_date = portfolio_value.index[-1]
-
-                    # 筛选沪深300数据到相同日期范围
-                    hs300_aligned = hs300_data[
-                        (hs300_data.index >= portfolio_start_date)
-                        & (hs300_data.index <= portfolio_end_date)
-                    ]
-
-                    if not hs300_aligned.empty:
-                        # 计算沪深300累计收益率
-                        hs300_initial = hs300_aligned["close"].iloc[0]
-                        hs300_returns = (
-                            (hs300_aligned["close"] - hs300_initial)
-                            / hs300_initial
-                            * 100
-                        )
-                        hs300_points = len(hs300_returns)
-                        print(f"沪深300基准收益率计算完成，数据点数: {hs300_points}")
-                    else:
-                        print("沪深300数据与组合数据日期范围不匹配")
+        # 计算并显示相对基准的超额收益
+        try:
+            final_strategy_return = cumulative_returns.iloc[-1]
+            final_benchmark_return = hs300_returns.iloc[-1]
+            excess_return = final_strategy_return - final_benchmark_return
 
-                except Exception as e:
-                    print(f"处理沪深300基准数据时出错: {e}")
-                    hs300_returns = None
-
-            # 收益率曲线
-            ax2.fill_between(
-                cumulative_returns.index,
-                cumulative_returns.values,
-                0,
-                alpha=0.3,
-                color="green",
-                where=(cumulative_returns >= 0),
-                label="策略正收益",
-                interpolate=True,
-            )
-            ax2.fill_between(
-                cumulative_returns.index,
-                cumulative_returns.values,
-                0,
-                alpha=0.3,
-                color="red",
-                where=(cumulative_returns < 0),
-                label="策略负收益",
-                interpolate=True,
-            )
+            print(f"\n📈 收益率对比:")
+            print(f"策略总收益率: {final_strategy_return:.2f}%")
+            print(f"沪深300基准: {final_benchmark_return:.2f}%")
+            print(f"超额收益: {excess_return:+.2f}%")
 
-            # 绘制策略收益率曲线
-            ax2.plot(
-                cumulative_returns.index,
-                cumulative_returns.values,
-                linewidth=2,
-                color="darkgreen",
-                label="缩量十字星反转策略",
-                zorder=3,
-            )
+        except Exception as e:
+            print(f"计算超额收益时出错: {e}")
+
+    ax2.axhline(y=0, color="black", linestyle="-", alpha=0.3)  # 添加零线
+    ax2.set_title("累计收益率曲线对比", fontsize=14, fontweight="bold")
+    ax2.set_ylabel("收益率 (%)", fontsize=12)
+    ax2.set_xlabel("日期", fontsize=12)
+    ax2.grid(True, alpha=0.3)
+    ax2.tick_params(axis="x", labelsize=10)
+    ax2.tick_params(axis="y", labelsize=10)
+    ax2.legend(fontsize=10, loc="upper left")
+
+    # 调整布局
+    plt.tight_layout()
+    plt.savefig(
+        path,
+        dpi=300,
+        bbox_inches="tight",
+        facecolor="white",
+        edgecolor="none",
+    )
+    plt.close()  # 关闭图形，释放内存
+    return path
 
-            # 绘制沪深300基准收益率曲线
-            if hs300_returns is not None:
-                ax2.plot(
-                    hs300_returns.index,
-                    hs300_returns.values,
-                    linewidth=2,
-                    color="red",
-                    label="沪深300基准",
-                    alpha=0.8,
-                    zorder=2,
-                )
 
-                # 计算并显示相对基准的超额收益
-                try:
-                    final_strategy_return = cumulative_returns.iloc[-1]
-                    final_benchmark_return = hs300_returns.iloc[-1]
-                    excess_return = final_strategy_return - final_benchmark_return
+def save_trade_records(result, path="yang_bao_yin_trade_records.csv"):
+    """保存交易记录"""
+    # 保存交易记录
+    if hasattr(result, "orders") and len(result.orders) > 0:
+        result.orders.to_csv(
+            path, index=False, encoding="utf-8-sig"
+        )
+        print(f"\n交易记录已保存到 {path}")
+    else:
+        print("\n没有生成交易记录")
 
-                    print(f"\n📈 收益率对比:")
-                    print(f"策略总收益率: {final_strategy_return:.2f}%")
-                    print(f"沪深300基准: {final_benchmark_return:.2f}%")
-                    print(f"超额收益: {excess_return:+.2f}%")
 
-                except Exception as e:
-                    print(f"计算超额收益时出错: {e}")
-
-            ax2.axhline(y=0, color="black", linestyle="-", alpha=0.3)  # 添加零线
-            ax2.set_title("累计收益率曲线对比", fontsize=14, fontweight="bold")
-            ax2.set_ylabel("收益率 (%)", fontsize=12)
-            ax2.set_xlabel("日期", fontsize=12)
-            ax2.grid(True, alpha=0.3)
-            ax2.tick_params(axis="x", labelsize=10)
-            ax2.tick_params(axis="y", labelsize=10)
-            ax2.legend(fontsize=10, loc="upper left")
-
-            # 调整布局
-            plt.tight_layout()
-            plt.savefig(
-                "yang_bao_yin_backtest_results.png",
-                dpi=300,
-                bbox_inches="tight",
-                facecolor="white",
-                edgecolor="none",
-            )
-            plt.close()  # 关闭图形，释放内存
-        else:
-            print("⚠️ 无法绘制图表：没有找到组合价值数据")
+def strategy_source_hash():
+    """STRATEGY_SOURCES 的内容哈希"""
+    digest = hashlib.sha1()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in STRATEGY_SOURCES:
+        digest.update(name.encode("utf-8"))
+        with open(os.path.join(base_dir, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
 
-        # 保存交易记录
-        if hasattr(result, "orders") and len(result.orders) > 0:
-            result.orders.to_csv(
-                "yang_bao_yin_trade_records.csv", index=False, encoding="utf-8-sig"
-            )
-            print("\n交易记录已保存到 yang_bao_yin_trade_records.csv")
-        else:
-            print("\n没有生成交易记录")
+
+def backtest_config():
+    """本次回测的参数（写入运行登记并计算参数哈希）
+
+    除命令行参数外还包含策略源码哈希：修改选股/交易阈值后不会复用旧结果。
+    """
+    return {
+        "start": BACKTEST_START,
+        "end": BACKTEST_END,
+        "max_positions": MAX_POSITIONS,
+        "initial_cash": INITIAL_CASH,
+        "source_hash": strategy_source_hash(),
+    }
+
+
+def register_backtest_run(result, note=""):
+    """把指标、成交、资金曲线和每日选股写入运行登记，失败只打印，不影响回测"""
+    try:
+        from run_registry import RunRegistry
+
+        try:
+            equity = result.portfolio["market_value"]
+        except Exception:
+            equity = None
+        run_id = RunRegistry().record_run(
+            backtest_config(),
+            metrics=getattr(result, "metrics_df", None),
+            orders=getattr(result, "orders", None),
+            equity=equity,
+            selections=SELECTION_HISTORY,
+            note=note,
+        )
+        print(f"🗂️  回测结果已登记: {run_id} (python run_registry.py show {run_id})")
+        return run_id
+    except Exception as e:
+        print(f"⚠️  登记回测结果失败: {e}")
+        return None
+
+
+def run_backtest(stock_data=None, plot=True, register=True, note=""):
+    """运行完整回测：准备数据（未传入时下载）、回测、汇总指标、绘图并保存交易记录
+
+    register=True 时结果写入运行登记（run_registry.py），note 为登记备注。
+    返回 PyBroker 的回测结果，数据准备或回测失败时返回 None。
+    """
+    initialize_log_files()  # 初始化日志文件
+    SELECTION_HISTORY.clear()
+    if stock_data is None:
+        print("开始准备回测数据...")
+        stock_data = prepare_stock_data()
+        if stock_data is None:
+            print("数据准备失败，无法进行回测")
+            return None
+
+    print("开始回测...")
+    strategy = build_strategy(stock_data)
+
+    # 运行回测
+    try:
+        result = strategy.backtest()
+        print_backtest_metrics(result)
+        if plot:
+            plot_backtest_results(result.portfolio)
+        save_trade_records(result)
+        if register:
+            register_backtest_run(result, note)
 
         print("\n🎯 缩量十字星反转策略回测完成！")
-        print("📊 图表已保存为 yang_bao_yin_backtest_results.png")
+        if plot:
+            print("📊 图表已保存为 yang_bao_yin_backtest_results.png")
         print("📋 交易记录已保存为 yang_bao_yin_trade_records.csv")
         print("📝 每日选股记录已保存为 daily_stock_selection.log")
         print("📈 交易日志已保存为 trading_log.log")
+        return result
 
     except Exception as e:
         print(f"回测运行失败: {e}")
         import traceback
 
         traceback.print_exc()
+        return None
+
+
+def print_strategy_description():
+    """显示缩量十字星反转策略说明"""
+    print("\n📋 缩量十字星反转策略说明:")
+    print("🎯 1. 十字星形态识别:")
+    print("   ✓ 核心条件: 标准十字星")
+    print("     - 实体大小 < 1%（开盘价与收盘价差距小）")
+    print("     - 有明显上下影线")
+    print("     - 如果收盘≥开盘：最高>收盘，最低<开盘")
+    print("     - 如果收盘<开盘：最高>开盘，最低<收盘")
+    print("   📉 缩量条件:")
+    print("     - 十字星当日成交量 < 20日平均成交量")
+    print("     - 表示市场犹豫，多空平衡")
+    print("   📊 DEA条件:")
+    print("     - 今日DEA > 昨日DEA 且 DEA < 0 且 MACD > DEA")
+    print("     - 表示下跌动能减弱，可能反转")
+    print("   🎯 KDJ条件:")
+    print("     - J值 < 90 (J = 3K - 2D)")
+    print("     - 避免在超买状态买入")
+    print("   📈 确认日成交量:")
+    print("     - 要求温和放量，确认反转有效性")
+    print("     - 若确认日成交量 > 十字星日成交量 * 2.5，则总评分-100分 (避免过度放量)")
+    print("\n🔄 2. 反转确认:")
+    print("   - 确认日收盘价 > 十字星日最高价")
+    print("   - 确认日必须为阳线（收盘价 > 开盘价）")
+    print("   - 确认向上反转，信号有效")
+    print("   - 次日开盘买入，避免追高")
+    print("\n📈 3. 评分体系:")
+    print("   - 十字星质量: 实体越小、影线越长得分越高")
+    print("   - 缩量程度: 成交量越小得分越高")
+    print("   - 反转强度: 反转幅度越大得分越高")
+    print("   - 技术面评分:")
+    print("     * 开盘价低于30日线: +20分（低位启动）")
+    print("     * 开盘价低于20日线: +10分")
+    print("     * 收盘价高于30日线: +10分（突破确认）")
+    print("     * 收盘价高于20日线: +20分")
+    print("     * 30日均线超越程度评分:")
+    print("       - 超越30日线10%以上: +25分（大幅超越）")
+    print("       - 超越30日线5%-10%: +20分（明显超越）")
+    print("       - 超越30日线2%-5%: +15分（有效超越）")
+    print("       - 超越30日线0%-2%: +10分（刚好突破）")
+    print("     * 均线多头排列(5>20>30): +20分")
+    print("     * DEA增大: +10分（改善幅度大+15分）")
+    print("     * 确认日涨幅>5%: +10分（确认日上涨）")
+    print("     * 确认日涨幅>9%: +20分（确认日大涨）")
+    print("     * 确认日放量>6倍: +10分（大幅放量确认）")
+    print("   🎯 最终筛选: 仅选择总评分 > 100 分的股票")
+    print("\n🛡️ 4. 止损机制:")
+    print("   - 跌破30日均线时卖出")
+    print("   - 放量大跌时卖出（成交量超过前一天1.6倍且当天下跌5个点以上）")
+    print("   - 放量下跌时卖出（成交量超过前一天3倍且当天下跌）")
+
+    print("\n⚙️ 5. 技术指标体系:")
+    print("   - 均线系统: 5/20/30日均线")
+    print("   - 均线多头排列: 5日线>20日线>30日线（上升趋势信号更强）")
+    print("   - 开盘价位置: 低于30日线+20分，低于20日线+10分（低位启动）")
+    print("   - 收盘价位置: 高于30日线+10分，高于20日线+20分（突破确认）")
+    print("   - 成交量: 20日成交量均线")
+    print("   - K线形态: 十字星识别算法")
+    print("   - DEA: 12/26/9参数，识别增大")
+    print("   - KDJ: 9/3/3参数，J值过滤超买")
+    print("\n📊 6. 资金管理:")
+    print(f"   - 最大持仓{MAX_POSITIONS}只股票")
+    print("   - 等权重分配：每次买入目标金额 = 总资产 / 最大持仓数")
+    print("   - 严格执行止损，保护资金安全")
+    print("   - 捕捉反转机会，追求稳健收益")
+
+    print("\n📊 7. 情绪共振机制:")
+    print("   - 市场情绪判断: 检测7日涨幅超过60%的热门股票")
+    print("   - 情绪活跃标准: 至少存在1只7日涨幅>60%的标的")
+    print("   - 共振买入逻辑: 情绪活跃 + 十字星反转信号 = 执行买入")
+    print("   - 情绪平淡时: 暂停所有买入操作，避免逆势交易")
+    print("   - 情绪过热保护: 识别市场极端情绪，提高成功率")
+
+    print("\n📊 8. 基准对比:")
+    print("   - 沪深300指数作为基准对照")
+    print("   - 图表中红色曲线显示沪深300收益率")
+    print("   - 绿色曲线显示策略收益率")
+    print("   - 自动计算并显示超额收益")
+    print("   - 评估策略相对市场的表现")
+
+
+def parse_arguments(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="缩量十字星反转策略回测")
+    parser.add_argument("--start", type=str, default=BACKTEST_START, help="回测开始日期 (YYYY-MM-DD)")
+    parser.add_argument("--end", type=str, default=BACKTEST_END, help="回测结束日期 (YYYY-MM-DD，默认今天)")
+    parser.add_argument("--max-positions", type=int, default=MAX_POSITIONS, help="最大持仓股票数")
+    parser.add_argument("--initial-cash", type=float, default=INITIAL_CASH, help="初始资金")
+    parser.add_argument("--no-plot", action="store_true", help="不绘制收益曲线（不导入 matplotlib）")
+    parser.add_argument("--no-register", action="store_true", help="不把结果写入运行登记")
+    parser.add_argument("--note", type=str, default="", help="运行登记备注（如参数变体说明）")
+    parser.add_argument(
+        "--reuse", action="store_true", help="已有相同参数的登记时直接显示该结果，不重新回测"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global BACKTEST_START, BACKTEST_END, MAX_POSITIONS, INITIAL_CASH
+
+    args = parse_arguments(argv)
+    BACKTEST_START = args.start
+    BACKTEST_END = args.end
+    MAX_POSITIONS = args.max_positions
+    INITIAL_CASH = args.initial_cash
+
+    warnings.filterwarnings("ignore")
+    print(f"回测期间: {BACKTEST_START} 到 {BACKTEST_END}")
+
+    if args.reuse:
+        from run_registry import RunRegistry
+        from run_registry import main as show_run
+
+        run_ids = RunRegistry().find_runs(backtest_config())
+        if run_ids:
+            print(f"♻️  已有相同参数的回测 ({len(run_ids)} 次)，显示最近一次")
+            show_run(["show", run_ids[0]])
+            return None
+
+    result = run_backtest(
+        plot=not args.no_plot, register=not args.no_register, note=args.note
+    )
+    print_strategy_description()
+    return result
+
 
-else:
-    print("数据准备失败，无法进行回测")
-
-# 显示缩量十字星反转策略说明
-print("\n📋 缩量十字星反转策略说明:")
-print("🎯 1. 十字星形态识别:")
-print("   ✓ 核心条件: 标准十字星")
-print("     - 实体大小 < 1%（开盘价与收盘价差距小）")
-print("     - 有明显上下影线")
-print("     - 如果收盘≥开盘：最高>收盘，最低<开盘")
-print("     - 如果收盘<开盘：最高>开盘，最低<收盘")
-print("   📉 缩量条件:")
-print("     - 十字星当日成交量 < 20日平均成交量")
-print("     - 表示市场犹豫，多空平衡")
-print("   📊 DEA条件:")
-print("     - 今日DEA > 昨日DEA 且 DEA < 0 且 MACD > DEA")
-print("     - 表示下跌动能减弱，可能反转")
-print("   🎯 KDJ条件:")
-print("     - J值 < 90 (J = 3K - 2D)")
-print("     - 避免在超买状态买入")
-print("   📈 确认日成交量:")
-print("     - 要求温和放量，确认反转有效性")
-print("     - 若确认日成交量 > 十字星日成交量 * 2.5，则总评分-100分 (避免过度放量)")
-print("\n🔄 2. 反转确认:")
-print("   - 确认日收盘价 > 十字星日最高价")
-print("   - 确认日必须为阳线（收盘价 > 开盘价）")
-print("   - 确认向上反转，信号有效")
-print("   - 次日开盘买入，避免追高")
-print("\n📈 3. 评分体系:")
-print("   - 十字星质量: 实体越小、影线越长得分越高")
-print("   - 缩量程度: 成交量越小得分越高")
-print("   - 反转强度: 反转幅度越大得分越高")
-print("   - 技术面评分:")
-print("     * 开盘价低于30日线: +20分（低位启动）")
-print("     * 开盘价低于20日线: +10分")
-print("     * 收盘价高于30日线: +10分（突破确认）")
-print("     * 收盘价高于20日线: +20分")
-print("     * 30日均线超越程度评分:")
-print("       - 超越30日线10%以上: +25分（大幅超越）")
-print("       - 超越30日线5%-10%: +20分（明显超越）")
-print("       - 超越30日线2%-5%: +15分（有效超越）")
-print("       - 超越30日线0%-2%: +10分（刚好突破）")
-print("     * 均线多头排列(5>20>30): +20分")
-print("     * DEA增大: +10分（改善幅度大+15分）")
-print("     * 确认日涨幅>5%: +10分（确认日上涨）")
-print("     * 确认日涨幅>9%: +20分（确认日大涨）")
-print("     * 确认日放量>6倍: +10分（大幅放量确认）")
-print("   🎯 最终筛选: 仅选择总评分 > 100 分的股票")
-print("\n🛡️ 4. 止损机制:")
-print("   - 跌破30日均线时卖出")
-print("   - 放量大跌时卖出（成交量超过前一天1.6倍且当天下跌5个点以上）")
-print("   - 放量下跌时卖出（成交量超过前一天3倍且当天下跌）")
-
-print("\n⚙️ 5. 技术指标体系:")
-print("   - 均线系统: 5/20/30日均线")
-print("   - 均线多头排列: 5日线>20日线>30日线（上升趋势信号更强）")
-print("   - 开盘价位置: 低于30日线+20分，低于20日线+10分（低位启动）")
-print("   - 收盘价位置: 高于30日线+10分，高于20日线+20分（突破确认）")
-print("   - 成交量: 20日成交量均线")
-print("   - K线形态: 十字星识别算法")
-print("   - DEA: 12/26/9参数，识别增大")
-print("   - KDJ: 9/3/3参数，J值过滤超买")
-print("\n📊 6. 资金管理:")
-print(f"   - 最大持仓{MAX_POSITIONS}只股票")
-print("   - 等权重分配：每次买入目标金额 = 总资产 / 最大持仓数")
-print("   - 严格执行止损，保护资金安全")
-print("   - 捕捉反转机会，追求稳健收益")
-
-print("\n📊 7. 情绪共振机制:")
-print("   - 市场情绪判断: 检测7日涨幅超过60%的热门股票")
-print("   - 情绪活跃标准: 至少存在1只7日涨幅>60%的标的")
-print("   - 共振买入逻辑: 情绪活跃 + 十字星反转信号 = 执行买入")
-print("   - 情绪平淡时: 暂停所有买入操作，避免逆势交易")
-print("   - 情绪过热保护: 识别市场极端情绪，提高成功率")
-
-print("\n📊 8. 基准对比:")
-print("   - 沪深300指数作为基准对照")
-print("   - 图表中红色曲线显示沪深300收益率")
-print("   - 绿色曲线显示策略收益率")
-print("   - 自动计算并显示超额收益")
-print("   - 评估策略相对市场的表现")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按代码合并区间的日K线缓存
+
+HybridDataStrategy 原先以 data_cache/{code}_{start}_{end}.csv 缓存历史数据，
+日期窗口随 datetime.now() 每天变化，缓存几乎从不命中，每次全量重新下载，
+目录里还不断堆积过期的 CSV。本模块改为：
+- 每个代码只保存一段连续的K线及其已覆盖的请求区间（{code}.npz，按列存储的二进制数组）
+- 请求区间在覆盖范围内时直接切片返回
+- 只下载缺失的两端，并与已缓存的相邻一根K线重叠，用于校验复权基准；
+  前复权价格因除权变化时整段重新下载
+
+AdjustedBarStore 在此基础上只缓存不复权K线，另存每只股票的累计后复权因子表，
+读取时一次向量化乘法得到前/后复权价格；分红送转后只需刷新因子表。
+回测、每日选股、评分查询等脚本的前复权K线都经由 adjusted_bars() 读取同一份缓存
+（DEFAULT_CACHE_DIR），不再各自请求 adjust="qfq" 并把复权价格落盘。
+
+用法:
+    store = BarStore("data_cache")
+    data = store.get("600611", "2024-01-01", "2024-06-30", fetch)  # fetch(code, start, end) -> DataFrame
+
+    store = AdjustedBarStore("data_cache", fetch_raw)
+    data = store.get("600611", "2024-01-01", "2024-06-30", adjust="qfq")
+
+    data = adjusted_bars("600611", "2024-01-01", "2024-06-30")  # 共用缓存，列名为英文
+"""
+
+import glob
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cache")
+RECHECK_SECONDS = 300  # 当天K线盘中未定稿，超过该时间后重新下载
+LEGACY_PATTERN = re.compile(r"^(\d{6})_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})\.csv$")
+ONE_DAY = pd.Timedelta(days=1)
+LEGACY_MARKER = ".legacy_removed"  # 旧前复权缓存已清理的标记文件
+
+
+def _tmp_path(path):
+    """写入用的临时文件名（按进程、线程区分，并发写同一代码时互不覆盖）"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _consistent(bars, edge):
+    """重叠日期的收盘价一致（复权基准未变化）"""
+    if edge.empty:
+        return True
+    common = bars.merge(edge[["date", "close"]], on="date", suffixes=("", "_new"))
+    if common.empty:
+        return True
+    return np.allclose(common["close"], common["close_new"], rtol=1e-6, equal_nan=True)
+
+
+class BarStore:
+    """每个代码一段连续K线的本地缓存"""
+
+    def __init__(self, cache_dir="data_cache", verbose=True):
+        self.cache_dir = cache_dir
+        self.verbose = verbose  # 是否打印缓存命中/合并信息
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, code):
+        return os.path.join(self.cache_dir, f"{code}.npz")
+
+    def codes(self):
+        """已缓存的股票代码"""
+        return sorted(
+            os.path.basename(path)[: -len(".npz")]
+            for path in glob.glob(os.path.join(self.cache_dir, "*.npz"))
+        )
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+    def load(self, code):
+        """返回 (K线, 覆盖起点, 覆盖终点, 下载时间)，无缓存时返回 None"""
+        path = self._path(code)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                columns = f["__columns__"].tolist()
+                bars = pd.DataFrame({col: f[f"col_{i}"] for i, col in enumerate(columns)})
+                cov_start, cov_end = (pd.Timestamp(d) for d in f["__coverage__"])
+                fetched_at = float(f["__fetched_at__"])
+        except Exception as e:
+            print(f"⚠️  缓存 {path} 读取失败: {e}")
+            return None
+        return bars, cov_start, cov_end, fetched_at
+
+    def save(self, code, bars, cov_start, cov_end, fetched_at=None):
+        """原子写入：先写临时文件再替换"""
+        arrays = {
+            "__columns__": np.array([str(col) for col in bars.columns]),
+            "__coverage__": np.array([cov_start, cov_end], dtype="datetime64[D]"),
+            "__fetched_at__": np.array(fetched_at if fetched_at is not None else time.time()),
+        }
+        for i, col in enumerate(bars.columns):
+            values = bars[col].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[f"col_{i}"] = values
+
+        path = self._path(code)
+        tmp_path = _tmp_path(path)
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def get(self, code, start_date, end_date, fetch):
+        """返回 [start_date, end_date] 的K线，缺失部分调用 fetch(code, start, end) 补齐
+
+        fetch 的日期参数为 YYYY-MM-DD 字符串，返回含 date 列的 DataFrame，失败时返回 None。
+        区间内没有K线（停牌、未上市）时返回空 DataFrame，请求失败且无缓存可用时返回 None。
+        """
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date).normalize()
+        today = pd.Timestamp.now().normalize()
+        end = min(end, today)
+
+        def fetch_range(s, e):
+            data = fetch(code, s.strftime("%Y-%m-%d"), e.strftime("%Y-%m-%d"))
+            if data is None or data.empty:
+                return data
+            data = data.copy()
+            data["date"] = pd.to_datetime(data["date"])
+            return data
+
+        cached = self.load(code)
+        if cached is None:
+            bars = fetch_range(start, end)
+            if bars is None or bars.empty:
+                return bars
+            self.save(code, bars, start, end)
+            return bars.reset_index(drop=True)
+
+        bars, cov_start, cov_end, fetched_at = cached
+        if cov_end >= today and time.time() - fetched_at > RECHECK_SECONDS:
+            cov_end = today - ONE_DAY  # 当天K线需要刷新
+
+        if start >= cov_start and end <= cov_end:
+            if self.verbose:
+                print(f"📂 从缓存加载 {code} 历史数据")
+            return self._slice(bars, start, end)
+
+        edges = []
+        # 两端各与一根已缓存的K线重叠，成功时结果必不为空，可据此校验复权基准
+        if start < cov_start:
+            anchor = bars["date"].iloc[0] if len(bars) else cov_start
+            edges.append(("start", fetch_range(start, max(anchor, cov_start))))
+        if end > cov_end:
+            anchor = bars["date"].iloc[-1] if len(bars) else cov_end
+            edges.append(("end", fetch_range(min(anchor, cov_end + ONE_DAY), end)))
+
+        new_start, new_end = cov_start, cov_end
+        pieces = [bars]
+        for side, edge in edges:
+            if edge is None:
+                continue  # 下载失败，保持原覆盖范围
+            if not _consistent(bars, edge):
+                print(f"🔄 {code} 复权基准已变化，重新下载全部K线")
+                full_start, full_end = min(start, cov_start), max(end, cov_end)
+                full = fetch_range(full_start, full_end)
+                if full is None or full.empty:
+                    return self._slice(bars, start, end)
+                self.save(code, full, full_start, full_end)
+                return self._slice(full, start, end)
+            if len(edge):  # 该段没有K线时只扩展覆盖范围
+                pieces.append(edge)
+            if side == "start":
+                new_start = start
+            else:
+                new_end = end
+
+        if len(pieces) > 1 or (new_start, new_end) != (cov_start, cov_end):
+            bars = (
+                pd.concat(pieces, ignore_index=True)
+                .drop_duplicates("date", keep="last")
+                .sort_values("date", ignore_index=True)
+            )
+            self.save(code, bars, new_start, new_end)
+            if self.verbose:
+                print(f"💾 已合并 {code} 缓存: {new_start:%Y-%m-%d} ~ {new_end:%Y-%m-%d}")
+        return self._slice(bars, start, end)
+
+    @staticmethod
+    def _slice(bars, start, end):
+        dates = bars["date"].to_numpy()
+        lo = np.searchsorted(dates, np.datetime64(start), side="left")
+        hi = np.searchsorted(dates, np.datetime64(end + ONE_DAY), side="left")
+        return bars.iloc[lo:hi].reset_index(drop=True)
+
+
+# ----------------------------------------------------------------------
+# 不复权K线 + 复权因子
+# ----------------------------------------------------------------------
+PRICE_FIELDS = ["open", "high", "low", "close"]
+FACTOR_TTL = 12 * 3600  # 复权因子表的刷新间隔（秒），除权除息在盘前生效，每天刷新一次即可
+
+
+def exchange_symbol(code):
+    """600611 -> sh600611（新浪复权因子接口的代码格式）"""
+    return f"{'sh' if code.startswith(('5', '6', '9')) else 'sz'}{code}"
+
+
+def fetch_hfq_factor(code):
+    """下载后复权因子表（date, hfq_factor），失败返回 None"""
+    try:
+        from data_provider import akshare as ak
+
+        return ak.stock_zh_a_daily(symbol=exchange_symbol(code), adjust="hfq-factor")
+    except Exception as e:
+        print(f"❌ 获取 {code} 复权因子失败: {e}")
+        return None
+
+
+def apply_adjustment(bars, factors, adjust="qfq"):
+    """按累计后复权因子调整价格列
+
+    hfq = 原始价格 × 当日因子；qfq = 原始价格 × 当日因子 / 最新因子。
+    每根K线取不晚于当日的最近一条因子（因子表只在除权除息日有记录）。
+    """
+    if not adjust or factors is None or factors.empty or bars.empty:
+        return bars
+    factor_dates = factors["date"].to_numpy()
+    factor_values = factors["hfq_factor"].to_numpy(dtype=float)
+
+    pos = np.searchsorted(factor_dates, bars["date"].to_numpy(), side="right") - 1
+    multiplier = factor_values[np.clip(pos, 0, None)]
+    if adjust == "qfq":
+        multiplier = multiplier / factor_values[-1]
+    elif adjust != "hfq":
+        raise ValueError(f"不支持的复权方式: {adjust}")
+
+    bars = bars.copy()
+    for col in PRICE_FIELDS:
+        if col in bars.columns:
+            bars[col] = bars[col].to_numpy(dtype=float) * multiplier
+    return bars
+
+
+class AdjustedBarStore:
+    """保存不复权K线和复权因子，读取时计算前/后复权价格
+
+    除权除息只改变因子表（每只股票几十行），已缓存的不复权K线永远有效，
+    不再因为前复权价格整体变化而重新下载全部历史。
+
+        store = AdjustedBarStore("data_cache", fetch_raw)   # fetch_raw(code, start, end) 返回不复权K线
+        data = store.get("600611", "2024-01-01", "2024-06-30", adjust="qfq")
+    """
+
+    def __init__(
+        self, cache_dir="data_cache", fetch_raw=None, fetch_factors=fetch_hfq_factor, verbose=True
+    ):
+        self.raw = BarStore(os.path.join(cache_dir, "raw"), verbose=verbose)
+        self.factor_dir = os.path.join(cache_dir, "factors")
+        os.makedirs(self.factor_dir, exist_ok=True)
+        self.fetch_raw = fetch_raw
+        self.fetch_factors = fetch_factors
+
+    def _factor_path(self, code):
+        return os.path.join(self.factor_dir, f"{code}.npz")
+
+    def load_factors(self, code):
+        """返回 (因子表, 下载时间)，无缓存时返回 None"""
+        path = self._factor_path(code)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as f:
+            factors = pd.DataFrame({"date": f["date"], "hfq_factor": f["hfq_factor"]})
+            return factors, float(f["fetched_at"])
+
+    def save_factors(self, code, factors):
+        path = self._factor_path(code)
+        tmp_path = _tmp_path(path)
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                date=factors["date"].to_numpy(dtype="datetime64[ns]"),
+                hfq_factor=factors["hfq_factor"].to_numpy(dtype=float),
+                fetched_at=np.array(time.time()),
+            )
+        os.replace(tmp_path, path)
+
+    def factors(self, code, max_age=FACTOR_TTL):
+        """复权因子表（日期升序），过期时只重新下载因子；下载失败时沿用旧表"""
+        cached = self.load_factors(code)
+        if cached is not None and time.time() - cached[1] <= max_age:
+            return cached[0]
+
+        data = self.fetch_factors(code) if self.fetch_factors else None
+        if data is None:
+            return cached[0] if cached is not None else None
+
+        factors = pd.DataFrame(
+            {
+                "date": pd.to_datetime(data["date"]),
+                "hfq_factor": pd.to_numeric(data["hfq_factor"], errors="coerce"),
+            }
+        ).dropna()
+        factors = factors.sort_values("date", ignore_index=True)
+        if cached is not None and len(factors) != len(cached[0]):
+            print(f"🔄 {code} 复权因子已更新 ({len(cached[0])} -> {len(factors)} 条)")
+        self.save_factors(code, factors)
+        return factors
+
+    def get(self, code, start_date, end_date, adjust="qfq"):
+        """返回 [start_date, end_date] 的复权K线，adjust 为 qfq/hfq/None"""
+        bars = self.raw.get(code, start_date, end_date, self.fetch_raw)
+        if bars is None or bars.empty or not adjust:
+            return bars
+        factors = self.factors(code)
+        if factors is None:
+            print(f"⚠️  {code} 无可用复权因子，无法计算{adjust}价格")
+            return None
+        return apply_adjustment(bars, factors, adjust)
+
+    def load(self, code, adjust="qfq"):
+        """只读本地缓存的全部K线（不请求网络），供面板构建等离线场景使用"""
+        cached = self.raw.load(code)
+        if cached is None:
+            return None
+        bars = cached[0]
+        if not adjust:
+            return bars
+        factors = self.load_factors(code)
+        if factors is None:
+            return None
+        return apply_adjustment(bars, factors[0], adjust)
+
+    def codes(self):
+        return self.raw.codes()
+
+    def remove_legacy(self):
+        """删除旧的前复权缓存（根目录下的 CSV 与 npz），它们无法还原为不复权K线
+
+        每个缓存目录只清理一次，完成后写入标记文件，之后直接返回 0。
+        """
+        root = os.path.dirname(self.raw.cache_dir)
+        marker = os.path.join(root, LEGACY_MARKER)
+        if os.path.exists(marker):
+            return 0
+        paths = [
+            path
+            for pattern in ("*.csv", "*.npz")
+            for path in glob.glob(os.path.join(root, pattern))
+            if LEGACY_PATTERN.match(os.path.basename(path))
+            or re.match(r"^\d{6}\.npz$", os.path.basename(path))
+        ]
+        for path in paths:
+            os.remove(path)
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(f"{pd.Timestamp.now():%Y-%m-%d %H:%M:%S}\n")
+        if paths:
+            print(f"🧹 已删除 {len(paths)} 个旧的前复权缓存文件")
+        return len(paths)
+
+
+# ----------------------------------------------------------------------
+# 脚本共用的前复权K线
+# ----------------------------------------------------------------------
+HIST_COLUMNS = {
+    "日期": "date",
+    "开盘": "open",
+    "收盘": "close",
+    "最高": "high",
+    "最低": "low",
+    "成交量": "volume",
+    "成交额": "amount",
+    "振幅": "amplitude",
+    "涨跌幅": "pct_change",
+    "涨跌额": "change",
+    "换手率": "turnover",
+}
+
+_DEFAULT_STORE = None
+
+
+def fetch_raw_hist(code, start_date, end_date):
+    """下载不复权日K线（英文列名）；请求异常直接抛出，由调用方的重试逻辑处理"""
+    from data_provider import akshare as ak
+
+    data = ak.stock_zh_a_hist(
+        symbol=code,
+        period="daily",
+        start_date=start_date.replace("-", ""),
+        end_date=end_date.replace("-", ""),
+        adjust="",
+    )
+    if data is None or data.empty:
+        return data
+    return data.rename(columns=HIST_COLUMNS)
+
+
+def adjusted_bars(code, start_date, end_date, adjust="qfq"):
+    """从共用缓存（DEFAULT_CACHE_DIR）读取复权K线，缺失部分自动下载
+
+    返回含 date/open/high/low/close/volume/pct_change 等英文列的 DataFrame；
+    区间内无K线时返回空 DataFrame，下载或复权因子获取失败时返回 None。
+    """
+    global _DEFAULT_STORE
+    if _DEFAULT_STORE is None:
+        _DEFAULT_STORE = AdjustedBarStore(DEFAULT_CACHE_DIR, fetch_raw_hist, verbose=False)
+    return _DEFAULT_STORE.get(code, start_date, end_date, adjust=adjust)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成行情上的性能基准
+
+在 synthetic_market 生成的确定性行情上，按不同股票池规模计时：
+- generate        生成合成行情本身
+- indicators      daily_stock_screener.calculate_technical_indicators，逐只股票全历史
+- doji_screening  daily_stock_screener.check_doji_reversal_signal，重放最近 N 个交易日的每日选股
+- momentum_rank   job.get_rank_daily 的动量评分并排序，qstock 行情换成合成行情
+- rsrs            job.get_ols/get_zscore 逐日计算 RSRS 分数，基于全市场等权指数
+- backtest        backetest.build_strategy(...).backtest()，合成行情全部标记为可选（eligible=1）
+
+缺少 TA-Lib/akshare/PyBroker 或 job.py 的依赖（matplotlib、seaborn）时，
+对应基准记为 skipped 并写明原因。
+
+结果写入 JSON（含 git 版本、Python/numpy/pandas 版本、机器信息）。用 --compare 与历史结果对比，
+耗时超过基线 (1 + tolerance) 倍的项记为性能回退，命令以非零状态退出。
+
+用法:
+    python benchmark.py                               # 500/2000/5000 只股票，3年
+    python benchmark.py --sizes 200 1000 --years 1 --repeat 1
+    python benchmark.py --only indicators rsrs --compare benchmark_results/bench_20250101_120000.json
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from synthetic_market import generate_market
+
+DEFAULT_SIZES = [500, 2000, 5000]
+DEFAULT_YEARS = 3
+SYNTHETIC_END = "2024-12-31"  # 固定结束日期，保证不同时间运行生成相同行情
+DEFAULT_OUT_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_results"
+)
+REPEAT = 3
+TOLERANCE = 0.2
+
+SCREEN_DAYS = 5  # 重放最近几个交易日的每日选股
+SCREEN_LOOKBACK_DAYS = 60  # 与 get_stock_data 的 days 参数相同（自然日）
+MOMENTUM_LOOKBACK_DAYS = 100  # 与 job.data_start_date 的 days 相同（自然日）
+JOB_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "quantitative", "lesson2")
+)
+
+
+class BenchmarkSkipped(Exception):
+    """依赖缺失，跳过该项基准"""
+
+
+# ----------------------------------------------------------------------
+# 各项基准：返回一个无参函数，计时的就是它；依赖缺失时抛 BenchmarkSkipped
+# ----------------------------------------------------------------------
+def _import_screener():
+    try:
+        import daily_stock_screener
+    except ImportError as e:
+        raise BenchmarkSkipped(f"无法导入 daily_stock_screener: {e}")
+    return daily_stock_screener
+
+
+def _import_job():
+    if JOB_DIR not in sys.path:
+        sys.path.append(JOB_DIR)
+    try:
+        import job
+    except ImportError as e:
+        raise BenchmarkSkipped(f"无法导入 job.py: {e}")
+    return job
+
+
+def _import_backtest():
+    import backetest
+
+    try:
+        with _quiet():
+            backetest.build_indicators()  # 注册指标（只执行一次，不计入耗时）
+    except ImportError as e:
+        raise BenchmarkSkipped(f"无法导入 PyBroker/TA-Lib: {e}")
+    return backetest
+
+
+class _SyntheticQstock:
+    """代替 job.qs：get_data 返回合成行情最近一段，起始日期参数忽略（合成行情的日期是固定的）"""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def get_data(self, code, start=None, freq="d"):
+        return self.frames[code]
+
+
+@contextlib.contextmanager
+def _quiet():
+    """屏蔽被测函数的逐只股票打印，避免终端输出计入耗时"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_indicators(market, **_):
+    screener = _import_screener()
+    groups = list(market.by_symbol())
+
+    def run():
+        computed = 0
+        for _, data in groups:
+            if screener.calculate_technical_indicators(data.copy()) is not None:
+                computed += 1
+        return {"computed": computed}
+
+    return run
+
+
+def bench_doji_screening(market, screen_days=SCREEN_DAYS, **_):
+    screener = _import_screener()
+    groups = [(code, data, data["date"].to_numpy()) for code, data in market.by_symbol()]
+    targets = market.dates[-screen_days:]
+    injected = set(
+        zip(market.doji_events["symbol"], market.doji_events["confirm_date"])
+    )
+    lookback = np.timedelta64(SCREEN_LOOKBACK_DAYS, "D")
+
+    def run():
+        signals = hits = 0
+        for target in targets.values:
+            for code, data, dates in groups:
+                lo = dates.searchsorted(target - lookback, "left")
+                hi = dates.searchsorted(target, "right")
+                window = data.iloc[lo:hi].reset_index(drop=True)
+                signal = screener.check_doji_reversal_signal(window, code)
+                if signal is not None:
+                    signals += 1
+                    hits += (code, pd.Timestamp(target)) in injected
+        return {"screen_days": len(targets), "signals": signals, "injected_hits": hits}
+
+    return run
+
+
+def bench_momentum_rank(market, **_):
+    job = _import_job()
+    names = dict(zip(market.stocks["代码"], market.stocks["名称"]))
+    cutoff = market.dates[-1] - pd.Timedelta(days=MOMENTUM_LOOKBACK_DAYS)
+    frames = {}
+    for code, data in market.by_symbol():
+        recent = data[data["date"] >= cutoff].set_index("date")
+        if len(recent):
+            frames[code] = recent.assign(name=names[code])
+    source = _SyntheticQstock(frames)
+
+    def run():
+        original, job.qs = job.qs, source
+        try:
+            with _quiet():
+                _, stock_df, _ = job.get_rank_daily(list(frames))
+        finally:
+            job.qs = original
+        return {"ranked": len(stock_df)}
+
+    return run
+
+
+def bench_rsrs(market, **_):
+    job = _import_job()
+
+    def run():
+        # 全市场等权指数：当日平均涨跌幅连乘，最高/最低价按相对前收盘的平均幅度推算
+        prev_close = market.panel("close").ffill().shift(1)
+        ret = (market.panel("close") / prev_close - 1).mean(axis=1).fillna(0)
+        up = (market.panel("high") / prev_close - 1).mean(axis=1).fillna(0)
+        down = (market.panel("low") / prev_close - 1).mean(axis=1).fillna(0)
+        index_close = 1000 * (1 + ret).cumprod()
+        index_prev = index_close.shift(1).fillna(1000)
+        high = (index_prev * (1 + up)).to_numpy()
+        low = (index_prev * (1 + down)).to_numpy()
+
+        # 与 job.get_timing_signal 相同：最近 N 天回归斜率，取最近 M 个斜率的标准分 × R²
+        slopes = []
+        days = 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for t in range(job.N, len(high) + 1):
+                _, slope, r2 = job.get_ols(low[t - job.N : t], high[t - job.N : t])
+                slopes.append(slope)
+                days += np.isfinite(job.get_zscore(slopes[-job.M :]) * r2)
+        return {"days": int(days)}
+
+    return run
+
+
+def bench_backtest(market, **_):
+    backetest = _import_backtest()
+    frame = market.bars.copy()
+    frame["symbol"] = frame["symbol"].astype(str)
+    frame["eligible"] = np.float32(1.0)
+
+    def run():
+        backetest.BACKTEST_START = market.dates[0].strftime("%Y-%m-%d")
+        backetest.BACKTEST_END = market.dates[-1].strftime("%Y-%m-%d")
+        backetest.SELECTION_HISTORY.clear()
+        cwd = os.getcwd()
+        # 策略回调把选股、交易日志追加写入当前目录，放到临时目录里
+        with tempfile.TemporaryDirectory() as tmp, _quiet():
+            os.chdir(tmp)
+            try:
+                result = backetest.build_strategy(frame).backtest()
+            finally:
+                os.chdir(cwd)
+        return {"orders": len(result.orders)}
+
+    return run
+
+
+BENCHMARKS = {
+    "indicators": bench_indicators,
+    "doji_screening": bench_doji_screening,
+    "momentum_rank": bench_momentum_rank,
+    "rsrs": bench_rsrs,
+    "backtest": bench_backtest,
+}
+
+
+# ----------------------------------------------------------------------
+# 计时与结果
+# ----------------------------------------------------------------------
+def _timeit(run, repeat):
+    times = []
+    extra = None
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        extra = run()
+        times.append(time.perf_counter() - t0)
+    return times, extra
+
+
+def _record(name, market, times, extra):
+    n_bars = len(market.bars)
+    best = min(times)
+    return {
+        "name": name,
+        "n_symbols": len(market.symbols),
+        "n_days": len(market.dates),
+        "n_bars": n_bars,
+        "status": "ok",
+        "repeat": len(times),
+        "times_s": [round(t, 6) for t in times],
+        "best_s": round(best, 6),
+        "median_s": round(float(np.median(times)), 6),
+        "us_per_bar": round(best / max(n_bars, 1) * 1e6, 4),
+        "extra": extra or {},
+    }
+
+
+def _environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmarks(
+    sizes=DEFAULT_SIZES,
+    years=DEFAULT_YEARS,
+    seed=42,
+    repeat=REPEAT,
+    only=None,
+    screen_days=SCREEN_DAYS,
+):
+    """在每个股票池规模上生成行情并运行各项基准，返回结果列表"""
+    end = pd.Timestamp(SYNTHETIC_END)
+    start = end - pd.Timedelta(days=int(years * 365))
+    names = only or list(BENCHMARKS)
+    results = []
+
+    for size in sizes:
+        print(f"\n📊 股票池 {size} 只，{start:%Y-%m-%d} ~ {end:%Y-%m-%d}")
+        t0 = time.perf_counter()
+        market = generate_market(size, start, end, seed=seed)
+        elapsed = time.perf_counter() - t0
+        results.append(
+            _record("generate", market, [elapsed], {"doji_events": len(market.doji_events)})
+        )
+        print(f"   generate        {elapsed:8.3f}s  ({len(market.bars)} 根K线)")
+
+        for name in names:
+            try:
+                run = BENCHMARKS[name](market, screen_days=screen_days)
+            except BenchmarkSkipped as e:
+                print(f"   {name:<15} 跳过: {e}")
+                results.append(
+                    {"name": name, "n_symbols": size, "status": "skipped", "reason": str(e)}
+                )
+                continue
+            times, extra = _timeit(run, repeat)
+            record = _record(name, market, times, extra)
+            results.append(record)
+            print(
+                f"   {name:<15} {record['best_s']:8.3f}s  (中位数 {record['median_s']:.3f}s, "
+                f"{record['us_per_bar']:.2f}µs/K线) {extra or ''}"
+            )
+    return results
+
+
+def save_results(results, config, out_dir=DEFAULT_OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    report = {"environment": _environment(), "config": config, "results": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 基准结果已保存: {path}")
+    return path
+
+
+def compare_results(results, baseline_path, tolerance=TOLERANCE):
+    """与基线结果对比 best_s，返回性能回退的条目"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    base = {
+        (r["name"], r["n_symbols"], r["n_days"]): r
+        for r in baseline["results"]
+        if r["status"] == "ok"
+    }
+
+    print(f"\n📈 与基线对比: {baseline_path}（容忍 {tolerance:.0%}）")
+    regressions = []
+    for r in results:
+        if r["status"] != "ok":
+            continue
+        old = base.get((r["name"], r["n_symbols"], r["n_days"]))
+        if old is None:
+            continue
+        ratio = r["best_s"] / max(old["best_s"], 1e-9)
+        if ratio > 1 + tolerance:
+            mark = "🐢 回退"
+            regressions.append({**r, "baseline_s": old["best_s"], "ratio": round(ratio, 3)})
+        elif ratio < 1 / (1 + tolerance):
+            mark = "🚀 提升"
+        else:
+            mark = "  持平"
+        print(
+            f"   {mark} {r['name']:<15} {r['n_symbols']:>6}只  "
+            f"{old['best_s']:.3f}s → {r['best_s']:.3f}s  (×{ratio:.2f})"
+        )
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="在合成行情上运行性能基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="股票池规模")
+    parser.add_argument("--years", type=float, default=DEFAULT_YEARS, help="行情年数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="每项重复次数（取最快一次）")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="只运行这些基准")
+    parser.add_argument("--screen-days", type=int, default=SCREEN_DAYS, help="重放选股的交易日数")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="结果输出目录")
+    parser.add_argument("--compare", help="基线结果 JSON，对比后有回退则以状态 1 退出")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="允许的变慢比例")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    config = {
+        "sizes": args.sizes,
+        "years": args.years,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "only": args.only,
+        "screen_days": args.screen_days,
+    }
+    results = run_benchmarks(
+        args.sizes, args.years, args.seed, args.repeat, args.only, args.screen_days
+    )
+    save_results(results, config, args.out)
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} 项基准性能回退")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
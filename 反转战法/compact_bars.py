@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的全市场日K线内存表示
+
+backetest.prepare_stock_data 原先把约3000只股票各自的 DataFrame 放进列表，
+最后 pd.concat 成一张 int64/float64 大表，symbol 为 Python 对象列；
+拼接时列表和结果同时驻留内存，之后 PyBroker 还会再复制一次。
+
+CompactBarBuffer 在下载过程中把每只股票的K线立即写入预分配的列数组：
+- 只保留回测需要的字段，价格/涨跌幅为 float32，成交量为 float64（float32 只有24位尾数，
+  大成交量会被舍入）
+- 日期存为相对回测起点的 int32 天数，代码存为整数编号
+- to_frame() 一次性生成 DataFrame：symbol 为 category，date 为 PyBroker 需要的 datetime64
+
+用法:
+    buffer = CompactBarBuffer(stock_codes, "2023-01-01", "2024-12-31")
+    buffer.append("600611", data)   # data 含 date/open/high/low/close/volume[/pct_change]
+    stock_data = buffer.to_frame()
+"""
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ["open", "high", "low", "close", "volume", "pct_change"]
+VALUE_DTYPE = np.float32
+# 成交量可达 1e9 以上，float32 会丢失精度；用 float64 以保留缺失值 NaN
+FIELD_DTYPES = {field: VALUE_DTYPE for field in FIELDS}
+FIELD_DTYPES["volume"] = np.float64
+SHRINK_RATIO = 0.8  # 实际行数低于容量的该比例时，生成 DataFrame 前先裁掉空余部分
+
+
+class CompactBarBuffer:
+    """按股票追加K线的预分配列缓冲区"""
+
+    def __init__(self, symbols, start_date, end_date):
+        self.symbols = [str(symbol) for symbol in symbols]
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.origin = np.datetime64(pd.Timestamp(start_date).date(), "D")
+        end = np.datetime64(pd.Timestamp(end_date).date(), "D") + 1
+
+        # 交易日数不超过工作日数，按 股票数 × 工作日数 一次分配
+        days = max(int(np.busday_count(self.origin, end)), 1)
+        capacity = max(len(self.symbols), 1) * days
+        self.symbol_code = np.empty(capacity, dtype=np.int32)
+        self.day = np.empty(capacity, dtype=np.int32)
+        self.values = {
+            field: np.empty(capacity, dtype=FIELD_DTYPES[field]) for field in FIELDS
+        }
+        self.size = 0
+
+    @property
+    def capacity(self):
+        return len(self.day)
+
+    def _grow(self, needed):
+        capacity = max(self.capacity * 2, needed)
+        self.symbol_code = np.resize(self.symbol_code, capacity)
+        self.day = np.resize(self.day, capacity)
+        self.values = {field: np.resize(arr, capacity) for field, arr in self.values.items()}
+
+    def append(self, symbol, data):
+        """写入一只股票的K线，返回写入行数"""
+        n = len(data)
+        if n == 0:
+            return 0
+        symbol = str(symbol)
+        if symbol not in self.symbol_ids:
+            self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        if self.size + n > self.capacity:
+            self._grow(self.size + n)
+
+        rows = slice(self.size, self.size + n)
+        dates = pd.to_datetime(data["date"]).to_numpy().astype("datetime64[D]")
+        self.day[rows] = (dates - self.origin).astype(np.int32)
+        self.symbol_code[rows] = self.symbol_ids[symbol]
+        for field, arr in self.values.items():
+            if field in data.columns:
+                arr[rows] = pd.to_numeric(data[field], errors="coerce").to_numpy(arr.dtype)
+            else:
+                arr[rows] = np.nan
+        self.size += n
+        return n
+
+    def to_frame(self):
+        """生成 PyBroker 可用的 DataFrame（symbol, date, open, high, low, close, volume, pct_change）"""
+        n = self.size
+        frame = {
+            "symbol": pd.Categorical.from_codes(
+                self.symbol_code[:n], categories=self.symbols
+            ).remove_unused_categories(),
+            "date": (self.origin + self.day[:n]).astype("datetime64[ns]"),
+        }
+        # 已用行数接近容量时直接引用缓冲区（不再复制一份），否则复制以释放多余容量
+        shrink = n < self.capacity * SHRINK_RATIO
+        frame.update(
+            {field: arr[:n].copy() if shrink else arr[:n] for field, arr in self.values.items()}
+        )
+        return pd.DataFrame(frame, copy=False)
+
+    @property
+    def nbytes(self):
+        return (
+            self.symbol_code.nbytes
+            + self.day.nbytes
+            + sum(arr.nbytes for arr in self.values.values())
+        )
@@ -7,15 +7,19 @@
 """
 
 import pandas as pd
-import akshare as ak
 import talib
 from datetime import datetime, timedelta
-import time
 import warnings
 import numpy as np
 import sys
+import os
 import argparse
 
+from bar_store import adjusted_bars  # 不复权K线+复权因子缓存（QUANT_DATA_MODE 录制/回放同样生效）
+from download_job import DEFAULT_JOB_ROOT, DownloadJob, purge_old_jobs
+from instrumentation import Instrumentation
+from universe import UniverseHistory, code_name_map, load_universe
+
 warnings.filterwarnings("ignore")
 
 # 全局变量存储股票代码到名称的映射
@@ -29,49 +33,46 @@ MARKET_SENTIMENT = {
     "max_7day_gain": 0.0,
 }
 
+# 分阶段计时与接口延迟统计，run_daily_screening(profile=True) 时启用
+INSTRUMENTATION = Instrumentation(enabled=False)
+
 print("🚀 缩量十字星反转策略 - 每日选股脚本")
 print("=" * 60)
 
 
-def get_main_board_stocks():
-    """获取主板股票列表"""
-    global STOCK_NAME_MAP
+def get_main_board_stocks(target_date=None):
+    """获取主板股票列表（当日快照已存在时不再下载）
+
+    target_date 为过去的日期时，使用时点股票池：当时已上市、未退市且非ST的股票。
+    """
     print("📊 正在获取主板股票列表...")
     
-    try:
-        all_stocks = ak.stock_zh_a_spot_em()
-        
-        def is_main_board_stock(code, name):
-            # 排除创业板和科创板
-            if any(code.startswith(prefix) for prefix in ["300", "688"]):
-                return False
-            # 排除ST股票和退市股票
-            if any(keyword in name for keyword in ["ST", "st", "退"]):
-                return False
-            # 主板股票代码
-            main_board_prefixes = ["600", "601", "603", "605", "000", "001", "002"]
-            return any(code.startswith(prefix) for prefix in main_board_prefixes)
-
-        main_board_stocks = all_stocks[
-            all_stocks.apply(
-                lambda row: is_main_board_stock(row["代码"], row["名称"]), axis=1
-            )
-        ]
-
-        # 创建股票代码到名称的映射
-        for _, row in main_board_stocks.iterrows():
-            STOCK_NAME_MAP[row["代码"]] = row["名称"]
-
-        print(f"✅ 成功获取 {len(main_board_stocks)} 只主板股票")
-        return main_board_stocks["代码"].tolist()
-        
-    except Exception as e:
-        print(f"❌ 获取股票列表失败: {e}")
+    universe = load_universe()
+    if universe is None:
+        print("❌ 获取股票列表失败")
         return []
+    
+    # 创建股票代码到名称的映射
+    STOCK_NAME_MAP.update(code_name_map(universe))
+    
+    if target_date and target_date < datetime.now().strftime("%Y-%m-%d"):
+        history = UniverseHistory.load_or_build()
+        if history is not None:
+            for code, name in history.name_map().items():
+                STOCK_NAME_MAP.setdefault(code, name)
+            codes = history.members(target_date)
+            print(f"✅ {target_date} 时点股票池: {len(codes)} 只主板股票")
+            return codes
+    
+    print(f"✅ 成功获取 {len(universe)} 只主板股票")
+    return universe["代码"].tolist()
 
 
 def get_stock_data(stock_code, target_date, days=60, debug=False, max_retries=3):
-    """获取单只股票的历史数据，基于指定的目标日期"""
+    """获取单只股票的历史数据，基于指定的目标日期
+
+    无数据时返回空 DataFrame，请求失败（重试后）返回 None。
+    """
     for retry in range(max_retries):
         try:
             # 解析目标日期
@@ -86,14 +87,14 @@ def get_stock_data(stock_code, target_date, days=60, debug=False, max_retries=3)
                 print(f"        开始日期: {start_date.strftime('%Y-%m-%d')}")
                 print(f"        结束日期: {target_date.strftime('%Y-%m-%d')}")
             
-            # 获取数据（到目标日期为止）
-            data = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period="daily",
-                start_date=start_date.strftime("%Y%m%d"),
-                end_date=target_date.strftime("%Y%m%d"),
-                adjust="qfq",
-            )
+            # 获取前复权数据（到目标日期为止）：本地缓存不复权K线+复权因子，读取时计算前复权价格
+            with INSTRUMENTATION.span("api.adjusted_bars"):
+                data = adjusted_bars(
+                    stock_code,
+                    start_date.strftime("%Y-%m-%d"),
+                    target_date.strftime("%Y-%m-%d"),
+                    adjust="qfq",
+                )
             
             if debug:
                 print(f"        API返回数据: {len(data) if data is not None else 'None'} 行")
@@ -102,39 +103,41 @@ def get_stock_data(stock_code, target_date, days=60, debug=False, max_retries=3)
                 if debug:
                     print(f"        ❌ API返回None")
                 if retry < max_retries - 1:
-                    time.sleep(0.5 * (retry + 1))  # 递增延时
+                    INSTRUMENTATION.count("api.retry")
+                    INSTRUMENTATION.sleep(0.5 * (retry + 1), "retry_backoff")  # 递增延时
                     continue
                 return None
                 
             if data.empty:
                 if debug:
                     print(f"        ❌ API返回空DataFrame")
-                return None
+                return data  # 无数据（停牌/未上市）与请求失败区分开，调用方记为 EMPTY
                 
-            # 重命名列
-            try:
-                data = data.rename(
-                    columns={
-                        "日期": "date",
-                        "开盘": "open",
-                        "最高": "high",
-                        "最低": "low",
-                        "收盘": "close",
-                        "成交量": "volume",
-                        "涨跌幅": "pct_change",
-                    }
-                )
-            except Exception as e:
-                if debug:
-                    print(f"        ❌ 列重命名失败: {e}")
-                    print(f"        原始列名: {data.columns.tolist()}")
-                return None
+            with INSTRUMENTATION.span("stage.normalize"):
+                # 重命名列
+                try:
+                    data = data.rename(
+                        columns={
+                            "日期": "date",
+                            "开盘": "open",
+                            "最高": "high",
+                            "最低": "low",
+                            "收盘": "close",
+                            "成交量": "volume",
+                            "涨跌幅": "pct_change",
+                        }
+                    )
+                except Exception as e:
+                    if debug:
+                        print(f"        ❌ 列重命名失败: {e}")
+                        print(f"        原始列名: {data.columns.tolist()}")
+                    return None
             
-            data["date"] = pd.to_datetime(data["date"])
-            data = data.sort_values("date").reset_index(drop=True)
+                data["date"] = pd.to_datetime(data["date"])
+                data = data.sort_values("date").reset_index(drop=True)
             
-            # 确保最后一天的数据是目标日期或之前
-            data = data[data["date"] <= target_date]
+                # 确保最后一天的数据是目标日期或之前
+                data = data[data["date"] <= target_date]
             
             if debug:
                 print(f"        ✅ 成功获取数据: {len(data)} 行")
@@ -154,7 +157,8 @@ def get_stock_data(stock_code, target_date, days=60, debug=False, max_retries=3)
                     wait_time = 1.0 * (retry + 1)  # 1秒、2秒、3秒递增等待
                     if debug:
                         print(f"        🔄 网络错误，等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
+                    INSTRUMENTATION.count("api.retry")
+                    INSTRUMENTATION.sleep(wait_time, "retry_backoff")
                     continue
             
             # 其他错误直接返回
@@ -219,7 +223,8 @@ def check_doji_reversal_signal(data, symbol):
             return None
             
         # 计算技术指标
-        data = calculate_technical_indicators(data)
+        with INSTRUMENTATION.span("stage.indicators"):
+            data = calculate_technical_indicators(data)
         if data is None:
             return None
             
@@ -233,18 +238,58 @@ def check_doji_reversal_signal(data, symbol):
         confirm_idx = -1  # 确认日（当天）
         doji_idx = -2     # 十字星日（前一日）
         
+        doji_bar = data.iloc[doji_idx]
+        confirm_bar = data.iloc[confirm_idx]
+        indicators = {
+            "volume_ma20": doji_bar["volume_ma20"],
+            "dea_doji": doji_bar["dea_line"],
+            "dea_confirm": confirm_bar["dea_line"],
+            "macd_confirm": confirm_bar["macd_line"],
+            "kdj_k": confirm_bar["kdj_k"],
+            "kdj_d": confirm_bar["kdj_d"],
+            "ma5": confirm_bar["ma5"],
+            "ma20": confirm_bar["ma20"],
+            "ma30": confirm_bar["ma30"],
+        }
+        with INSTRUMENTATION.span("stage.signal"):
+            signal = evaluate_doji_reversal(doji_bar, confirm_bar, indicators)
+        if signal is None:
+            return None
+
+        return {
+            "symbol": symbol,
+            "score": signal.pop("score"),
+            "doji_date": data["date"].iloc[doji_idx].strftime("%Y-%m-%d"),
+            "confirm_date": data["date"].iloc[confirm_idx].strftime("%Y-%m-%d"),
+            **signal,
+            "current_price": data["close"].iloc[-1],  # 最新价格
+        }
+        
+    except Exception:
+        return None
+
+
+def evaluate_doji_reversal(doji_bar, confirm_bar, indicators):
+    """根据十字星日、确认日K线及指标判断反转信号并评分
+
+    doji_bar / confirm_bar 需包含 open/high/low/close/volume；indicators 包含
+    十字星日的 volume_ma20、dea_doji 与确认日的 dea_confirm、macd_confirm、
+    kdj_k、kdj_d、ma5、ma20、ma30。盘中检测（intraday_doji.py）传入按实时价格推算的确认日。
+    评分大于100时返回评分明细，否则返回 None。
+    """
+    try:
         # 获取确认日数据
-        confirm_close = data["close"].iloc[confirm_idx]
-        confirm_open = data["open"].iloc[confirm_idx]
-        confirm_high = data["high"].iloc[confirm_idx]
-        confirm_volume = data["volume"].iloc[confirm_idx]
+        confirm_close = confirm_bar["close"]
+        confirm_open = confirm_bar["open"]
+        confirm_high = confirm_bar["high"]
+        confirm_volume = confirm_bar["volume"]
         
         # 获取十字星日数据
-        doji_close = data["close"].iloc[doji_idx]
-        doji_open = data["open"].iloc[doji_idx]
-        doji_high = data["high"].iloc[doji_idx]
-        doji_low = data["low"].iloc[doji_idx]
-        doji_volume = data["volume"].iloc[doji_idx]
+        doji_close = doji_bar["close"]
+        doji_open = doji_bar["open"]
+        doji_high = doji_bar["high"]
+        doji_low = doji_bar["low"]
+        doji_volume = doji_bar["volume"]
         
         # 避免除零错误
         if doji_open <= 0 or doji_close <= 0:
@@ -268,7 +313,7 @@ def check_doji_reversal_signal(data, symbol):
             is_valid_doji = upper_shadow and lower_shadow
             
         # 3. 缩量条件：十字星当天成交量低于20日平均成交量
-        volume_ma20_value = data["volume_ma20"].iloc[doji_idx]
+        volume_ma20_value = indicators["volume_ma20"]
         if pd.isna(volume_ma20_value) or volume_ma20_value <= 0:
             return None
         is_low_volume = doji_volume < volume_ma20_value
@@ -282,9 +327,9 @@ def check_doji_reversal_signal(data, symbol):
         
         # === 第三步：DEA 增大且相关条件 ===
         is_dea_conditions_met = False
-        dea_doji_day = data["dea_line"].iloc[doji_idx]
-        dea_confirm_day = data["dea_line"].iloc[confirm_idx]
-        macd_confirm_day = data["macd_line"].iloc[confirm_idx]
+        dea_doji_day = indicators["dea_doji"]
+        dea_confirm_day = indicators["dea_confirm"]
+        macd_confirm_day = indicators["macd_confirm"]
         
         if not (pd.isna(dea_doji_day) or pd.isna(dea_confirm_day) or pd.isna(macd_confirm_day)):
             # 条件1：DEA增大
@@ -298,8 +343,8 @@ def check_doji_reversal_signal(data, symbol):
         
         # === 第四步：KDJ指标条件 ===
         is_kdj_conditions_met = False
-        k_value = data["kdj_k"].iloc[confirm_idx]
-        d_value = data["kdj_d"].iloc[confirm_idx]
+        k_value = indicators["kdj_k"]
+        d_value = indicators["kdj_d"]
         
         if not (pd.isna(k_value) or pd.isna(d_value)):
             j_value = 3 * k_value - 2 * d_value
@@ -367,9 +412,9 @@ def check_doji_reversal_signal(data, symbol):
             tech_bonus = 0
             
             # 均线数据
-            ma20_value = data["ma20"].iloc[confirm_idx]
-            ma30_value = data["ma30"].iloc[confirm_idx]
-            ma5_value = data["ma5"].iloc[confirm_idx]
+            ma20_value = indicators["ma20"]
+            ma30_value = indicators["ma30"]
+            ma5_value = indicators["ma5"]
             
             # 开盘价位置评分
             if not pd.isna(ma30_value) and confirm_open < ma30_value:
@@ -442,10 +487,7 @@ def check_doji_reversal_signal(data, symbol):
             # 只返回评分大于100的股票
             if score > 100:
                 return {
-                    "symbol": symbol,
                     "score": score,
-                    "doji_date": data["date"].iloc[doji_idx].strftime("%Y-%m-%d"),
-                    "confirm_date": data["date"].iloc[confirm_idx].strftime("%Y-%m-%d"),
                     "doji_body_size": body_size,
                     "volume_ratio": volume_ratio,
                     "reversal_pct": reversal_pct,
@@ -465,7 +507,6 @@ def check_doji_reversal_signal(data, symbol):
                     "j_value": j_value,
                     "confirmation_to_doji_volume_ratio": confirmation_to_doji_volume_ratio,
                     "exceed_ma30_pct": exceed_ma30_pct,
-                    "current_price": data["close"].iloc[-1],  # 最新价格
                 }
                 
         return None
@@ -474,12 +515,36 @@ def check_doji_reversal_signal(data, symbol):
         return None
 
 
-def run_daily_screening(target_date=None, debug_mode=False):
-    """运行每日选股"""
-    # 处理日期参数
+def run_daily_screening(target_date=None, debug_mode=False, profile=False):
+    """运行每日选股
+
+    profile=True 时统计各阶段耗时、接口延迟分布与重试/休眠，结束时打印汇总并保存 JSON 报告
+    （预检查失败等提前结束时同样输出）
+    """
+    global INSTRUMENTATION
+    INSTRUMENTATION = Instrumentation(enabled=profile)
+
     if target_date is None:
         target_date = datetime.now().strftime("%Y-%m-%d")
-    elif isinstance(target_date, str):
+    selected_stocks = []
+    try:
+        selected_stocks = _screen_stocks(target_date, debug_mode)
+        return selected_stocks
+    finally:
+        INSTRUMENTATION.summary()
+        # 提前结束（日期格式错误、预检查失败……）时同样输出报告
+        date_digits = "".join(filter(str.isdigit, str(target_date)))
+        INSTRUMENTATION.save(
+            f"daily_screening_profile_{date_digits}.json",
+            target_date=target_date,
+            selected=len(selected_stocks),
+        )
+
+
+def _screen_stocks(target_date, debug_mode=False):
+    """选股主流程，返回入选股票列表"""
+    # 处理日期参数
+    if isinstance(target_date, str):
         # 验证日期格式
         try:
             datetime.strptime(target_date, "%Y-%m-%d")
@@ -497,7 +562,8 @@ def run_daily_screening(target_date=None, debug_mode=False):
     
     for test_code in test_stocks:
         print(f"   测试股票 {test_code}...")
-        test_data = get_stock_data(test_code, target_date, days=30, debug=True)
+        with INSTRUMENTATION.span("stage.precheck"):
+            test_data = get_stock_data(test_code, target_date, days=30, debug=True)
         if test_data is not None and len(test_data) > 0:
             print(f"   ✅ 测试成功: {test_code} 获取到 {len(test_data)} 天数据")
             test_success = True
@@ -524,7 +590,8 @@ def run_daily_screening(target_date=None, debug_mode=False):
     print(f"✅ 预检查通过，开始正式分析...")
     
     # 1. 获取股票列表
-    stock_codes = get_main_board_stocks()
+    with INSTRUMENTATION.span("stage.universe"):
+        stock_codes = get_main_board_stocks(target_date)
     if not stock_codes:
         print("❌ 无法获取股票列表")
         return []
@@ -554,30 +621,35 @@ def run_daily_screening(target_date=None, debug_mode=False):
     api_empty_count = 0
     exception_count = 0
     
-    for i, stock_code in enumerate(stock_codes):
+    # 下载任务逐只落盘并记录完成状态，中断后重新运行从断点继续；
+    # 防风控休眠由任务在实际请求网络时执行，失败的股票放到最后重试
+    debug_codes = set(stock_codes[:5]) if debug_mode else set()  # 只对前5只股票开启调试
+    # 任务里存的是前复权价格，以当天的复权因子为基准，因此任务名带上运行日期
+    job_name = f"screening_{target_date}_qfq{datetime.now():%Y%m%d}"
+    if target_date == datetime.now().strftime("%Y-%m-%d") and datetime.now().hour < 15:
+        job_name += f"_{datetime.now():%H}"  # 盘中K线未定稿，只在同一小时内续传
+    job = DownloadJob(
+        os.path.join(DEFAULT_JOB_ROOT, job_name),
+        # 重试统一交给任务的退避轮次，单次请求不再内部重试
+        fetch=lambda code: get_stock_data(
+            code, target_date, days=60, debug=code in debug_codes, max_retries=1
+        ),
+        instrumentation=INSTRUMENTATION,
+    )
+    purge_old_jobs(prefix="screening_")
+    
+    downloads = INSTRUMENTATION.iterate("stage.fetch", job.run(stock_codes, progress_every=0))
+    for i, (stock_code, data) in enumerate(downloads):
         if i % 100 == 0:  # 更频繁的进度显示
             progress = (i + 1) / len(stock_codes) * 100
             print(f"   进度: {i+1}/{len(stock_codes)} ({progress:.1f}%) | "
                   f"成功: {checked_count} | 失败: {data_fetch_failed} | "
                   f"情绪: {emotion_checked} | 十字星: {doji_checked}")
             
-            # 防风控机制：每100个股票休眠10秒
-            if i > 0:  # 第一批不休眠
-                print(f"   🛡️ 防风控休眠中...", end="", flush=True)
-                for countdown in range(10, 0, -1):
-                    print(f" {countdown}", end="", flush=True)
-                    time.sleep(1)
-                print(" ✅")  # 换行并显示完成
-            
         try:
-            # 获取股票数据（只获取一次）
-            use_debug = debug_mode and i < 5  # 只对前5只股票开启调试
-            data = get_stock_data(stock_code, target_date, days=60, debug=use_debug)
-            
             if data is None:
                 data_fetch_failed += 1
                 api_none_count += 1
-                time.sleep(0.05)  # 失败时稍微延时
                 continue
                 
             if len(data) == 0:
@@ -625,7 +697,8 @@ def run_daily_screening(target_date=None, debug_mode=False):
             if len(data) >= 22:
                 try:
                     doji_checked += 1
-                    signal = check_doji_reversal_signal(data, stock_code)
+                    with INSTRUMENTATION.span("stage.doji"):
+                        signal = check_doji_reversal_signal(data, stock_code)
                     if signal:
                         selected_stocks.append(signal)
                 except Exception as e:
@@ -636,13 +709,9 @@ def run_daily_screening(target_date=None, debug_mode=False):
         except Exception as e:
             data_fetch_failed += 1
             exception_count += 1
-            if debug_mode and i < 5:
+            if stock_code in debug_codes:
                 print(f"   异常 {stock_code}: {e}")
-            time.sleep(0.1)
             continue
-            
-        # 控制请求频率，防止被限制
-        time.sleep(0.1)  # 调整为100ms间隔
     
     # === 3. 处理情绪分析结果 ===
     sentiment_active = len(hot_stocks) > 0
@@ -747,6 +816,11 @@ def run_daily_screening(target_date=None, debug_mode=False):
         print(f"   - akshare API 服务异常")
         print(f"   建议选择有效的交易日期")
         
+    INSTRUMENTATION.count("stocks.total", len(stock_codes))
+    INSTRUMENTATION.count("stocks.checked", checked_count)
+    INSTRUMENTATION.count("stocks.fetch_failed", data_fetch_failed)
+    INSTRUMENTATION.count("stocks.exception", exception_count)
+
     print("🎯 选股完成！")
     return selected_stocks
 
@@ -798,6 +872,7 @@ def parse_arguments():
     parser.add_argument('-d', '--date', type=str, help='指定分析日期 (格式: YYYY-MM-DD)', default=None)
     parser.add_argument('-i', '--interactive', action='store_true', help='交互式输入日期')
     parser.add_argument('--debug', action='store_true', help='开启调试模式，显示详细错误信息')
+    parser.add_argument('--profile', action='store_true', help='统计各阶段耗时与接口延迟，输出JSON报告')
     return parser.parse_args()
 
 
@@ -868,7 +943,7 @@ if __name__ == "__main__":
         print(f"      python {sys.argv[0]}  (使用今日)")
         
         # 运行选股分析
-        results = run_daily_screening(target_date, debug_mode=args.debug)
+        results = run_daily_screening(target_date, debug_mode=args.debug, profile=args.profile)
         
         print(f"\n📋 选股统计:")
         print(f"   分析日期: {target_date}")
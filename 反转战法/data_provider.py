@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据接口的 实盘 / 录制 / 回放 替身
+
+各脚本直接调用 ak.* / qs.*，离线时整条流程都跑不起来，耗时也被网络抖动淹没。
+本模块提供与 akshare/qstock 用法相同的代理对象，由环境变量选择数据来源：
+
+    QUANT_DATA_MODE=live      直接请求上游（默认）
+    QUANT_DATA_MODE=record    请求上游，并把每次调用的参数和返回值写入本地存档
+    QUANT_DATA_MODE=replay    只读存档：不导入 akshare/qstock，不访问网络
+
+    QUANT_DATA_ARCHIVE        存档目录（默认 反转战法/data_archive）
+    QUANT_REPLAY_LATENCY      回放时每次调用的平均延迟（秒，指数分布），模拟网络耗时
+    QUANT_REPLAY_ERROR_RATE   回放时随机抛出 ConnectionError 的概率，检验重试逻辑
+    QUANT_REPLAY_SEED         延迟与错误注入的随机种子（默认 0，保证每次回放相同）
+    QUANT_REPLAY_DATE_FALLBACK=1  历史日期未录制时也回退到最近一次录制（默认关闭）
+
+存档: {archive}/{模块}.{函数}/{宽松键}/{精确键}.pkl
+- 精确键由全部参数计算；宽松键忽略形如日期的参数（YYYYMMDD、YYYY-MM-DD、datetime）
+- 回放时先找精确键，找不到时只有日期参数含今天（或之后）的调用才回退到同一宽松键下
+  最近录制的一次，所以按"今天"推算起止日期的脚本（如 job.py）换一天也能回放；
+  历史日期（如 stock_zt_pool_em(date="20250301")）未录制时抛 ReplayMissError，
+  不会拿别的交易日数据顶替
+- 上游抛出的异常同样录制，回放时以 RecordedError 重新抛出
+
+每次调用的耗时与异常都记入 metrics_exporter.METRICS（按接口统计，设置 QUANT_METRICS_EXPORT 后进程退出时导出）。
+
+用法（替换原来的 import akshare as ak / import qstock as qs）:
+    from data_provider import akshare as ak
+    from data_provider import qstock as qs
+
+    QUANT_DATA_MODE=record python daily_stock_screener.py --date 2025-03-03
+    QUANT_DATA_MODE=replay QUANT_REPLAY_LATENCY=0.05 python daily_stock_screener.py --date 2025-03-03
+"""
+
+import glob
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import random
+import re
+import threading
+import time
+from datetime import date, datetime
+
+from metrics_exporter import METRICS
+
+MODES = ("live", "record", "replay")
+DEFAULT_ARCHIVE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data_archive"
+)
+DATE_PATTERN = re.compile(r"^\d{4}-?\d{2}-?\d{2}$")
+PROXIED_MODULES = ("akshare", "qstock")
+
+
+class ReplayMissError(LookupError):
+    """存档中没有这次调用"""
+
+
+class RecordedError(RuntimeError):
+    """录制时上游抛出的异常"""
+
+
+# ----------------------------------------------------------------------
+# 存档键
+# ----------------------------------------------------------------------
+def _is_date(value):
+    if isinstance(value, (datetime, date)):
+        return True
+    return isinstance(value, str) and bool(DATE_PATTERN.match(value))
+
+
+def _to_date(value):
+    """日期参数 -> date，不是日期时返回 None"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and DATE_PATTERN.match(value):
+        try:
+            return datetime.strptime(value.replace("-", ""), "%Y%m%d").date()
+        except ValueError:
+            return None
+    return None
+
+
+def _latest_date(values):
+    """参数（可嵌套 list/tuple/dict）中最晚的日期，没有日期参数时返回 None"""
+    latest = None
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            found = _latest_date(value)
+        elif isinstance(value, dict):
+            found = _latest_date(value.values())
+        else:
+            found = _to_date(value)
+        if found is not None and (latest is None or found > latest):
+            latest = found
+    return latest
+
+
+def _canonical(value, loose=False):
+    if loose and _is_date(value):
+        return "<date>"
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v, loose) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _canonical(v, loose) for k, v in sorted(value.items())}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def call_key(func_name, args, kwargs, loose=False):
+    payload = json.dumps(
+        [func_name, _canonical(list(args), loose), _canonical(kwargs, loose)],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _entry_path(archive_dir, module, func, args, kwargs):
+    name = f"{module}.{func}"
+    return os.path.join(
+        archive_dir,
+        name,
+        call_key(name, args, kwargs, loose=True),
+        f"{call_key(name, args, kwargs)}.pkl",
+    )
+
+
+# ----------------------------------------------------------------------
+# 数据来源
+# ----------------------------------------------------------------------
+class LiveProvider:
+    """直接调用上游模块"""
+
+    mode = "live"
+
+    def __init__(self):
+        self._modules = {}
+
+    def module(self, name):
+        if name not in self._modules:
+            self._modules[name] = importlib.import_module(name)
+        return self._modules[name]
+
+    def call(self, module, func, args, kwargs):
+        return getattr(self.module(module), func)(*args, **kwargs)
+
+
+class RecordingProvider(LiveProvider):
+    """调用上游，并把参数、返回值或异常写入存档（同一调用以最近一次为准）"""
+
+    mode = "record"
+
+    def __init__(self, archive_dir=DEFAULT_ARCHIVE_DIR):
+        super().__init__()
+        self.archive_dir = archive_dir
+
+    def _write(self, path, entry):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def call(self, module, func, args, kwargs):
+        path = _entry_path(self.archive_dir, module, func, args, kwargs)
+        entry = {
+            "call": f"{module}.{func}",
+            "args": _canonical(list(args)),
+            "kwargs": _canonical(kwargs),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        try:
+            result = super().call(module, func, args, kwargs)
+        except Exception as e:
+            self._write(path, {**entry, "error": f"{type(e).__name__}: {e}"})
+            raise
+        self._write(path, {**entry, "result": result})
+        return result
+
+
+class ReplayProvider:
+    """只读存档的数据来源，可注入延迟和网络错误"""
+
+    mode = "replay"
+
+    def __init__(
+        self,
+        archive_dir=DEFAULT_ARCHIVE_DIR,
+        latency=0.0,
+        error_rate=0.0,
+        seed=0,
+        date_fallback=False,
+    ):
+        self.archive_dir = archive_dir
+        self.latency = latency
+        self.error_rate = error_rate
+        self.date_fallback = date_fallback  # 历史日期未录制时也回退到最近一次录制
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._warned = set()
+        self.stats = {"calls": 0, "exact": 0, "fallback": 0, "injected_errors": 0}
+
+    def _inject(self, name):
+        with self._lock:
+            delay = self._rng.expovariate(1 / self.latency) if self.latency > 0 else 0.0
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self.stats["injected_errors"] += 1
+            raise ConnectionError(f"回放注入的网络错误: {name}")
+
+    def _lookup(self, module, func, args, kwargs):
+        path = _entry_path(self.archive_dir, module, func, args, kwargs)
+        if os.path.exists(path):
+            self.stats["exact"] += 1
+            return path
+
+        candidates = glob.glob(os.path.join(os.path.dirname(path), "*.pkl"))
+        if not candidates:
+            raise ReplayMissError(
+                f"存档中没有 {module}.{func} 的录制 (args={args}, kwargs={kwargs})，"
+                f"请先用 QUANT_DATA_MODE=record 运行一次"
+            )
+        latest = _latest_date([*args, *kwargs.values()])
+        if not self.date_fallback and (latest is None or latest < date.today()):
+            raise ReplayMissError(
+                f"存档中没有 {module}.{func} 在 {latest} 的录制 (args={args}, kwargs={kwargs})，"
+                f"历史日期不回退到其他日期的录制（可设 QUANT_REPLAY_DATE_FALLBACK=1）"
+            )
+        self.stats["fallback"] += 1
+        name = f"{module}.{func}"
+        if name not in self._warned:
+            self._warned.add(name)
+            print(f"⚠️  回放: {name} 的日期参数未录制，使用最近一次录制的结果")
+        return max(candidates, key=os.path.getmtime)
+
+    def module(self, name):
+        raise ImportError(f"回放模式下不导入 {name}")
+
+    def call(self, module, func, args, kwargs):
+        name = f"{module}.{func}"
+        self.stats["calls"] += 1
+        self._inject(name)
+        with open(self._lookup(module, func, args, kwargs), "rb") as f:
+            entry = pickle.load(f)  # 每次读出新对象，调用方修改结果不影响后续回放
+        if "error" in entry:
+            raise RecordedError(entry["error"])
+        return entry["result"]
+
+
+def make_provider(mode=None):
+    """按 QUANT_DATA_* 环境变量创建数据来源"""
+    mode = (mode or os.environ.get("QUANT_DATA_MODE") or "live").lower()
+    archive_dir = os.environ.get("QUANT_DATA_ARCHIVE", DEFAULT_ARCHIVE_DIR)
+    if mode == "live":
+        return LiveProvider()
+    if mode == "record":
+        return RecordingProvider(archive_dir)
+    if mode == "replay":
+        return ReplayProvider(
+            archive_dir,
+            latency=float(os.environ.get("QUANT_REPLAY_LATENCY", 0)),
+            error_rate=float(os.environ.get("QUANT_REPLAY_ERROR_RATE", 0)),
+            seed=int(os.environ.get("QUANT_REPLAY_SEED", 0)),
+            date_fallback=os.environ.get("QUANT_REPLAY_DATE_FALLBACK", "0") == "1",
+        )
+    raise ValueError(f"QUANT_DATA_MODE 只能是 {'/'.join(MODES)}，当前为 {mode}")
+
+
+# ----------------------------------------------------------------------
+# 模块代理
+# ----------------------------------------------------------------------
+class ModuleProxy:
+    """用法与原模块相同：ak.stock_zh_a_hist(...) 经由当前数据来源调用，并记入接口健康度指标"""
+
+    def __init__(self, name, provider):
+        self._name = name
+        self._provider = provider
+        if provider.mode != "replay":
+            provider.module(name)  # 与原来的 import 一样，未安装时抛 ImportError
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        if self._provider.mode != "replay":
+            target = getattr(self._provider.module(self._name), attr)
+            if not callable(target):
+                return target
+
+        endpoint = f"{self._name}.{attr}"
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = self._provider.call(self._name, attr, args, kwargs)
+            except Exception as e:
+                METRICS.observe(endpoint, time.perf_counter() - start, e)
+                raise
+            METRICS.observe(endpoint, time.perf_counter() - start)
+            return result
+
+        call.__name__ = attr
+        return call
+
+    def __repr__(self):
+        return f"<{self._provider.mode} {self._name}>"
+
+
+PROVIDER = make_provider()
+MODE = PROVIDER.mode
+OFFLINE = MODE == "replay"  # 回放时不应有任何对外副作用（如推送通知）
+
+_proxies = {}
+
+
+def __getattr__(name):
+    # from data_provider import akshare 时才创建代理，只用 qstock 的脚本不要求安装 akshare
+    if name in PROXIED_MODULES:
+        if name not in _proxies:
+            _proxies[name] = ModuleProxy(name, PROVIDER)
+        return _proxies[name]
+    raise AttributeError(f"module 'data_provider' has no attribute {name!r}")
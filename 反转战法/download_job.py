@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可断点续传的全市场K线下载任务
+
+prepare_stock_data / run_daily_screening 逐只下载约3000只股票，数据只保存在内存里，
+中途网络错误、被限流或 Ctrl+C 时已下载的数据全部丢失。DownloadJob 改为：
+- 每只股票下载成功后立即原子写入 {job_dir}/bars/{code}.pkl
+- 每只股票的结果追加写入清单 {job_dir}/manifest.jsonl（逐行 fsync，崩溃后可重放）
+- 重新运行同一任务时，已完成的股票直接读本地文件，从中断处继续下载
+- 本轮失败的股票放到最后按指数退避单独重试
+
+用法:
+    job = DownloadJob("download_jobs/backtest_2023-01-01_2024-12-31", fetch)
+    for code, data in job.run(stock_codes):   # data 为 None 表示重试后仍失败
+        ...
+"""
+
+import glob
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from instrumentation import NULL_INSTRUMENTATION
+
+DEFAULT_JOB_ROOT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "download_jobs"
+)
+REQUEST_PAUSE = 0.1  # 每次请求后的间隔（秒）
+BATCH_SIZE = 100  # 每请求这么多只股票后休眠一次，防止被风控
+BATCH_PAUSE = 10
+RETRY_ROUNDS = 3  # 失败股票的重试轮数
+RETRY_BACKOFF = 5  # 第 n 轮重试前等待 RETRY_BACKOFF * 2**(n-1) 秒
+
+DONE, EMPTY, FAILED = "done", "empty", "failed"
+
+
+class DownloadJob:
+    """按股票记录完成状态的下载任务"""
+
+    def __init__(
+        self,
+        job_dir,
+        fetch,
+        request_pause=REQUEST_PAUSE,
+        batch_size=BATCH_SIZE,
+        batch_pause=BATCH_PAUSE,
+        instrumentation=None,
+    ):
+        self.job_dir = job_dir
+        self.fetch = fetch  # fetch(code) -> DataFrame，失败返回 None
+        self.request_pause = request_pause
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        self.bars_dir = os.path.join(job_dir, "bars")
+        self.manifest_path = os.path.join(job_dir, "manifest.jsonl")
+        os.makedirs(self.bars_dir, exist_ok=True)
+
+        self.status = {}  # 代码 -> {"status", "attempts", "error"}
+        self._requests = 0
+        self._load_manifest()
+
+    # ------------------------------------------------------------------
+    # 清单
+    # ------------------------------------------------------------------
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 崩溃时写了一半的最后一行
+                self.status[entry["code"]] = entry
+        done = sum(entry["status"] in (DONE, EMPTY) for entry in self.status.values())
+        if done:
+            print(f"📂 恢复下载任务 {os.path.basename(self.job_dir)}: 已完成 {done} 只")
+
+    def _record(self, code, status, error=None):
+        attempts = self.status.get(code, {}).get("attempts", 0) + 1
+        entry = {"code": code, "status": status, "attempts": attempts, "error": error}
+        self.status[code] = entry
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def is_complete(self, code):
+        return self.status.get(code, {}).get("status") in (DONE, EMPTY)
+
+    # ------------------------------------------------------------------
+    # 单只股票
+    # ------------------------------------------------------------------
+    def _bars_path(self, code):
+        return os.path.join(self.bars_dir, f"{code}.pkl")
+
+    def load(self, code):
+        """读取已完成股票的K线（无数据的股票返回空 DataFrame）"""
+        if self.status.get(code, {}).get("status") == EMPTY:
+            return pd.DataFrame()
+        return pd.read_pickle(self._bars_path(code))
+
+    def _save(self, code, data):
+        path = self._bars_path(code)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            data.to_pickle(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _throttle(self):
+        self._requests += 1
+        self.instrumentation.sleep(self.request_pause, "request_pause")
+        if self.batch_size and self._requests % self.batch_size == 0:
+            print(f"   🛡️ 已请求 {self._requests} 只，防风控休眠 {self.batch_pause} 秒...")
+            self.instrumentation.sleep(self.batch_pause, "batch_pause")
+
+    def fetch_one(self, code):
+        """已完成的直接读本地，否则下载并记录结果；失败返回 None"""
+        if self.is_complete(code):
+            try:
+                with self.instrumentation.span("job.load_cached"):
+                    return self.load(code)
+            except Exception as e:
+                print(f"⚠️  {code} 本地数据损坏，重新下载: {e}")
+
+        try:
+            data = self.fetch(code)
+        except Exception as e:
+            self.instrumentation.count("job.failed")
+            self._record(code, FAILED, str(e))
+            return None
+        finally:
+            self._throttle()
+
+        if data is None:
+            self.instrumentation.count("job.failed")
+            self._record(code, FAILED)
+            return None
+        if data.empty:
+            self.instrumentation.count("job.empty")
+            self._record(code, EMPTY)
+            return data
+        with self.instrumentation.span("job.save"):
+            self._save(code, data)
+        self.instrumentation.count("job.fetched")
+        self._record(code, DONE)
+        return data
+
+    # ------------------------------------------------------------------
+    # 整体任务
+    # ------------------------------------------------------------------
+    def run(self, codes, retry_rounds=RETRY_ROUNDS, progress_every=100):
+        """按顺序产出 (代码, K线)；失败的股票在最后重试，仍失败时产出 (代码, None)
+
+        每只股票恰好产出一次。中断后重新运行，已完成的股票不再请求网络。
+        """
+        codes = list(codes)
+        resumed = sum(self.is_complete(code) for code in codes)
+        print(
+            f"📥 下载任务: 共 {len(codes)} 只，已完成 {resumed} 只，待下载 {len(codes) - resumed} 只"
+        )
+
+        failed = []
+        for i, code in enumerate(codes):
+            if progress_every and i % progress_every == 0:
+                print(f"   进度: {i+1}/{len(codes)} ({(i + 1) / len(codes) * 100:.1f}%) | 失败: {len(failed)}")
+            data = self.fetch_one(code)
+            if data is None:
+                failed.append(code)
+            else:
+                yield code, data
+
+        for round_no in range(1, retry_rounds + 1):
+            if not failed:
+                break
+            wait = RETRY_BACKOFF * 2 ** (round_no - 1)
+            print(f"🔁 第{round_no}轮重试 {len(failed)} 只失败股票（等待 {wait} 秒）...")
+            self.instrumentation.sleep(wait, "retry_round")
+            still_failed = []
+            for code in failed:
+                data = self.fetch_one(code)
+                if data is None:
+                    still_failed.append(code)
+                else:
+                    yield code, data
+            failed = still_failed
+
+        if failed:
+            print(f"❌ 重试后仍有 {len(failed)} 只股票下载失败，下次运行时将再次尝试")
+        for code in failed:
+            yield code, None
+
+
+def purge_old_jobs(root=DEFAULT_JOB_ROOT, prefix="", keep=3):
+    """只保留以 prefix 开头、最近修改的 keep 个任务目录"""
+    job_dirs = sorted(
+        (path for path in glob.glob(os.path.join(root, f"{prefix}*")) if os.path.isdir(path)),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in job_dirs[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
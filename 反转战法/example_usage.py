@@ -3,11 +3,45 @@
 """
 股票评分查询工具使用示例
 
-本脚本展示如何使用 stock_score_query.py 工具查询特定股票在特定日期的评分
+本脚本是评分服务 score_server.py 的轻量客户端，展示如何查询特定股票在特定日期的评分。
+请先启动服务（常驻内存，后续查询无需重复导入依赖和下载数据）:
+    python score_server.py
 """
 
-import subprocess
-import sys
+import json
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+SERVER_URL = "http://127.0.0.1:8765"
+
+
+def request_server(path, **params):
+    """请求评分服务，返回解析后的 JSON；服务未启动时返回 None"""
+    url = f"{SERVER_URL}{path}?{urlencode(params)}"
+    try:
+        with urlopen(url, timeout=60) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+    except HTTPError as e:
+        return json.loads(e.read().decode("utf-8"))
+    except URLError:
+        print(f"无法连接评分服务 {SERVER_URL}，请先运行: python score_server.py")
+        return None
+
+
+def print_report(result):
+    """打印评分服务返回的评分报告"""
+    print(f"🎯 {result['stock_name']}({result['stock_code']}) - {result['date']}")
+    print(f"📊 【总评分】: {result['total_score']:.0f}分")
+    print(f"├─ 十字星质量: {result['doji_quality']:.0f}分")
+    print(f"├─ 缩量程度: {result['volume_score']:.0f}分")
+    print(f"├─ 反转强度: {result['reversal_score']:.0f}分")
+    print(f"├─ 技术面加分: {result['tech_bonus']:.0f}分")
+    print(f"└─ 成交量加分: {result['volume_bonus']:.0f}分")
+    if result.get("reasons"):
+        print(f"✅ 【得分原因】: {', '.join(result['reasons'])}")
+    if result.get("conditions_failed"):
+        print(f"❌ 【未满足条件】: {', '.join(result['conditions_failed'])}")
 
 
 def run_query(stock_input, date_input, use_code=False):
@@ -15,37 +49,39 @@ def run_query(stock_input, date_input, use_code=False):
     print(f"\n{'='*60}")
     if use_code:
         print(f"查询股票代码: {stock_input} 在 {date_input} 的评分")
-        cmd = [
-            sys.executable,
-            "stock_score_query.py",
-            "--code",
-            stock_input,
-            "--date",
-            date_input,
-        ]
     else:
         print(f"查询股票名称: {stock_input} 在 {date_input} 的评分")
-        cmd = [
-            sys.executable,
-            "stock_score_query.py",
-            "--stock",
-            stock_input,
-            "--date",
-            date_input,
-        ]
 
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+    result = request_server("/score", stock=stock_input, date=date_input)
+    if result is None:
+        return
+    if "error" in result:
+        print("查询失败！")
+        print("错误信息:", result["error"])
+        return
 
-        if result.returncode == 0:
-            print("查询成功！")
-            print(result.stdout)
-        else:
-            print("查询失败！")
-            print("错误信息:", result.stderr)
+    print("查询成功！")
+    print_report(result)
 
-    except Exception as e:
-        print(f"执行查询时出错: {e}")
+
+def run_batch(stock_inputs, dates):
+    """批量评分：一次请求完成多只股票 × 多个日期"""
+    print(f"\n{'='*60}")
+    print(f"批量查询 {len(stock_inputs)} 只股票 × {len(dates)} 个日期")
+
+    results = request_server(
+        "/batch", stocks=",".join(stock_inputs), dates=",".join(dates)
+    )
+    if results is None:
+        return
+    for result in results:
+        if "error" in result:
+            print(f"❌ {result['error']}")
+        else:
+            print(
+                f"{result['stock_name']}({result['stock_code']}) {result['date']}: "
+                f"{result['total_score']:.0f}分"
+            )
 
 
 def main():
@@ -76,20 +112,31 @@ def main():
     print("\n示例4: 查询平安银行")
     run_query("000001", "2023-08-20", use_code=True)
 
+    input("\n按回车键继续下一个示例...")
+
+    # 示例5: 批量评分（一个进程完成多只股票 × 多个日期）
+    print("\n示例5: 批量评分")
+    run_batch(["大众交通", "000001"], ["2024-07-08", "2024-07-09"])
+
     print("\n✅ 所有示例查询完成！")
 
     # 使用说明
     print("\n" + "=" * 60)
     print("💡 使用说明:")
     print("=" * 60)
-    print("1. 命令行直接使用:")
+    print("1. 命令行直接使用（单次运行，无需启动服务）:")
     print("   python stock_score_query.py --stock '大众交通' --date '2023-07-08'")
     print("   python stock_score_query.py --code '600611' --date '2023-07-08'")
+    print(
+        "   python stock_score_query.py --stocks '大众交通,600611' --dates '2023-07-07,2023-07-10'"
+    )
+    print("   python stock_score_query.py --batch requests.csv --output scores.csv")
     print("")
     print("2. 参数说明:")
     print("   --stock: 股票名称（支持模糊匹配）")
     print("   --code:  股票代码（6位数字）")
     print("   --date:  查询日期（YYYY-MM-DD格式）")
+    print("   --stocks/--dates/--batch: 批量评分，每只股票只获取一次数据")
     print("")
     print("3. 评分说明:")
     print("   - 总评分 > 100: 符合买入条件")
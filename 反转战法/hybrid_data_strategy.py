@@ -21,11 +21,12 @@ from datetime import datetime, timedelta
 import warnings
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 warnings.filterwarnings("ignore")
 
 try:
-    import qstock as qs
+    from data_provider import qstock as qs  # 经由数据代理，记入接口健康度指标
     QSTOCK_AVAILABLE = True
     print("✅ qstock 已导入")
 except ImportError:
@@ -33,13 +34,20 @@ except ImportError:
     print("❌ qstock 未安装，部分功能将受限")
 
 try:
-    import akshare as ak
+    from data_provider import akshare as ak
     AKSHARE_AVAILABLE = True
     print("✅ akshare 已导入")
 except ImportError:
     AKSHARE_AVAILABLE = False
     print("❌ akshare 未安装，历史数据功能将受限")
 
+from snapshot_ring import read_realtime_data
+from market_breadth import BreadthEngine
+from bar_store import AdjustedBarStore
+
+MAX_VALIDATE = 20  # 进入历史验证的候选股数量
+VALIDATION_WORKERS = 8  # 历史验证并发数（同时进行的 akshare 请求）
+
 print("🚀 混合数据源量化策略系统")
 print("=" * 60)
 
@@ -48,7 +56,14 @@ class HybridDataStrategy:
     def __init__(self, cache_dir="data_cache"):
         self.cache_dir = cache_dir
         self.stock_name_map = {}
+        self.breadth = BreadthEngine(pct_col="pct_change")  # 跨次调用的增量市场宽度
         self.create_cache_dir()
+        # 按代码合并区间的不复权K线 + 复权因子缓存，读取时计算前复权价格
+        self.bar_store = AdjustedBarStore(
+            self.cache_dir,
+            fetch_raw=lambda code, start, end: self._get_akshare_hist(code, start, end, adjust=""),
+        )
+        self.bar_store.remove_legacy()  # 只在首次使用该缓存目录时清理
         
     def create_cache_dir(self):
         """创建缓存目录"""
@@ -57,15 +72,20 @@ class HybridDataStrategy:
             print(f"📁 创建缓存目录: {self.cache_dir}")
 
     def get_realtime_data(self, market='沪深A', codes=None):
-        """获取实时数据 - 优先使用qstock"""
-        if not QSTOCK_AVAILABLE:
+        """获取实时数据 - 优先使用共享内存快照，其次qstock"""
+        # 全市场快照优先读共享内存（snapshot_ring.py 生产者运行时），不重复请求上游
+        snapshot = read_realtime_data() if codes is None and market == '沪深A' else None
+
+        if snapshot is None and not QSTOCK_AVAILABLE:
             print("⚠️  qstock不可用，无法获取实时数据")
             return None
             
         try:
             print(f"📡 正在获取实时数据...")
             
-            if codes is None:
+            if snapshot is not None:
+                data = snapshot
+            elif codes is None:
                 # 获取整个市场的实时数据
                 data = qs.realtime_data(market=market)
             else:
@@ -92,8 +112,7 @@ class HybridDataStrategy:
                 
                 # 创建代码名称映射
                 if 'code' in data.columns and 'name' in data.columns:
-                    for _, row in data.iterrows():
-                        self.stock_name_map[row['code']] = row['name']
+                    self.stock_name_map.update(zip(data['code'], data['name']))
                 
                 return data
             else:
@@ -106,45 +125,28 @@ class HybridDataStrategy:
 
     def get_historical_data(self, stock_code, start_date, end_date, source='akshare'):
         """获取历史数据 - 支持多数据源"""
-        cache_file = f"{self.cache_dir}/{stock_code}_{start_date}_{end_date}.csv"
-        
-        # 检查缓存
-        if os.path.exists(cache_file):
-            try:
-                data = pd.read_csv(cache_file, parse_dates=['date'])
-                print(f"📂 从缓存加载 {stock_code} 历史数据")
-                return data
-            except:
-                pass
-        
-        # 获取新数据
         if source == 'akshare' and AKSHARE_AVAILABLE:
-            data = self._get_akshare_hist(stock_code, start_date, end_date)
+            # 缓存覆盖的区间直接切片，只下载缺失的两端；前复权价格由复权因子计算
+            try:
+                return self.bar_store.get(stock_code, start_date, end_date, adjust="qfq")
+            except Exception as e:
+                print(f"⚠️  缓存读取失败: {e}")
+                return self._get_akshare_hist(stock_code, start_date, end_date)
         elif source == 'qstock' and QSTOCK_AVAILABLE:
-            data = self._get_qstock_hist(stock_code, start_date, end_date)
+            return self._get_qstock_hist(stock_code, start_date, end_date)
         else:
             print(f"⚠️  数据源 {source} 不可用")
             return None
-        
-        # 保存到缓存
-        if data is not None and not data.empty:
-            try:
-                data.to_csv(cache_file, index=False)
-                print(f"💾 已缓存 {stock_code} 历史数据")
-            except Exception as e:
-                print(f"⚠️  缓存保存失败: {e}")
-        
-        return data
 
-    def _get_akshare_hist(self, stock_code, start_date, end_date):
-        """使用akshare获取历史数据"""
+    def _get_akshare_hist(self, stock_code, start_date, end_date, adjust="qfq"):
+        """使用akshare获取历史数据，adjust="" 为不复权"""
         try:
             data = ak.stock_zh_a_hist(
                 symbol=stock_code,
                 period="daily",
                 start_date=start_date.replace("-", ""),
                 end_date=end_date.replace("-", ""),
-                adjust="qfq",
+                adjust=adjust,
             )
             
             if not data.empty:
@@ -188,15 +190,17 @@ class HybridDataStrategy:
             if market_data is None:
                 return False
             
-            # 情绪指标计算
-            total_stocks = len(market_data)
-            
             if 'pct_change' in market_data.columns:
-                up_stocks = len(market_data[market_data['pct_change'] > 0])
-                down_stocks = len(market_data[market_data['pct_change'] < 0])
-                limit_up = len(market_data[market_data['pct_change'] >= 9.5])
-                limit_down = len(market_data[market_data['pct_change'] <= -9.5])
-                strong_stocks = len(market_data[market_data['pct_change'] > 6])
+                # 情绪指标计算：只有涨跌幅变化的股票才更新计数
+                snapshot = market_data.drop_duplicates('code', keep='last').set_index('code')
+                self.breadth.apply_snapshot(snapshot, timestamp=datetime.now())
+                counts = self.breadth.counts
+                total_stocks = counts['total']
+                up_stocks = counts['up']
+                down_stocks = counts['down']
+                limit_up = counts['limit_up']
+                limit_down = counts['limit_down']
+                strong_stocks = counts['strong']
                 
                 up_ratio = up_stocks / total_stocks if total_stocks > 0 else 0
                 
@@ -225,7 +229,13 @@ class HybridDataStrategy:
             print(f"❌ 情绪分析失败: {e}")
             return False
 
-    def hybrid_stock_screening(self, use_realtime=True, use_historical=True):
+    def hybrid_stock_screening(
+        self,
+        use_realtime=True,
+        use_historical=True,
+        max_validate=MAX_VALIDATE,
+        max_workers=VALIDATION_WORKERS,
+    ):
         """混合数据源选股"""
         print("\n🎯 开始混合数据源选股...")
         
@@ -241,16 +251,36 @@ class HybridDataStrategy:
         
         # 2. 历史数据验证
         if use_historical and AKSHARE_AVAILABLE and realtime_candidates:
-            print("📊 第二阶段: 历史数据验证")
-            for candidate in realtime_candidates[:20]:  # 只验证前20只
-                if self._historical_validation(candidate):
-                    selected_stocks.append(candidate)
+            print(f"📊 第二阶段: 历史数据验证 (前{max_validate}只，并发{max_workers})")
+            candidates = realtime_candidates[:max_validate]
+            for candidate in self.iter_validated(candidates, max_workers):
+                print(f"   ✅ 验证通过: {candidate['name']}({candidate['code']})")
+                selected_stocks.append(candidate)
+            # 按实时评分排名输出，与完成顺序无关
+            rank = {id(candidate): i for i, candidate in enumerate(candidates)}
+            selected_stocks.sort(key=lambda candidate: rank[id(candidate)])
         else:
             selected_stocks = realtime_candidates[:10]
             print("⚠️  跳过历史数据验证")
         
         return selected_stocks
 
+    def iter_validated(self, candidates, max_workers=VALIDATION_WORKERS):
+        """并发下载历史数据并验证，按完成顺序逐个产出通过验证的候选股"""
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._historical_validation, candidate): candidate
+                for candidate in candidates
+            }
+            for future in as_completed(futures):
+                try:
+                    passed = future.result()
+                except Exception as e:
+                    print(f"⚠️  {futures[future]['code']} 历史验证失败: {e}")
+                    continue
+                if passed:
+                    yield futures[future]
+
     def _realtime_screening(self):
         """实时数据筛选"""
         market_data = self.get_realtime_data(market='沪深A')
@@ -267,44 +297,45 @@ class HybridDataStrategy:
             
             print(f"📈 筛选主板股票: {len(main_board_data)} 只")
             
-            # 基本筛选条件
-            for _, stock in main_board_data.iterrows():
-                try:
-                    code = stock.get('code', '')
-                    name = stock.get('name', '')
-                    price = stock.get('price', 0)
-                    pct_change = stock.get('pct_change', 0)
-                    volume = stock.get('volume', 0)
-                    
-                    # 过滤条件
-                    if (
-                        5 < price < 100 and  # 价格范围
-                        -3 < pct_change < 8 and  # 涨跌幅范围
-                        volume > 0 and  # 有成交量
-                        'ST' not in name  # 非ST股票
-                    ):
-                        # 简单评分
-                        score = 50
-                        if 0 < pct_change <= 3:
-                            score += 10  # 温和上涨
-                        if 10 <= price <= 50:
-                            score += 5   # 合理价位
-                        
-                        candidates.append({
-                            'code': code,
-                            'name': name,
-                            'price': price,
-                            'pct_change': pct_change,
-                            'volume': volume,
-                            'score': score,
-                            'source': 'realtime'
-                        })
-                        
-                except Exception as e:
-                    continue
-        
-        # 按评分排序
-        candidates = sorted(candidates, key=lambda x: x['score'], reverse=True)
+            def column(name, default):
+                if name in main_board_data.columns:
+                    return main_board_data[name]
+                return pd.Series(default, index=main_board_data.index)
+            
+            name = column('name', '').astype(str)
+            price = pd.to_numeric(column('price', 0), errors='coerce')
+            pct_change = pd.to_numeric(column('pct_change', 0), errors='coerce')
+            volume = pd.to_numeric(column('volume', 0), errors='coerce')
+            
+            # 过滤条件
+            passed = (
+                (price > 5) & (price < 100) &  # 价格范围
+                (pct_change > -3) & (pct_change < 8) &  # 涨跌幅范围
+                (volume > 0) &  # 有成交量
+                ~name.str.contains('ST', regex=False)  # 非ST股票
+            )
+            
+            # 简单评分
+            score = (
+                50
+                + 10 * ((pct_change > 0) & (pct_change <= 3))  # 温和上涨
+                + 5 * ((price >= 10) & (price <= 50))  # 合理价位
+            )
+            
+            candidates = pd.DataFrame({
+                'code': main_board_data['code'],
+                'name': name,
+                'price': price,
+                'pct_change': pct_change,
+                'volume': volume,
+                'score': score,
+                'source': 'realtime',
+            })[passed.to_numpy()]
+            
+            # 按评分排序（稳定排序，同分保持行情顺序）
+            candidates = candidates.sort_values(
+                'score', ascending=False, kind='stable'
+            ).to_dict('records')
         
         print(f"✅ 实时筛选结果: {len(candidates)} 只候选股票")
         return candidates
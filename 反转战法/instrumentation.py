@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+轻量的分阶段计时与接口延迟统计
+
+run_daily_screening 只有成功/失败计数，跑了40分钟也分不清时间花在网络、重试、
+休眠、指标计算还是信号判断上。Instrumentation 提供：
+- span(name)：with 块计时，同名区间累积为耗时分布（抛异常时另计 {name}.error）
+- iterate(name, iterable)：统计迭代器每取一项的耗时（如下载任务逐只产出K线）
+- sleep(seconds, reason)：代替 time.sleep，休眠时间记入 sleep.{reason}
+- count(name)：计数器（重试次数、失败次数等）
+- summary() 打印按总耗时排序的汇总表，save() 写出 JSON 报告（含分位数和对数分桶直方图）
+
+关闭时（enabled=False）span 返回共享的空上下文、其余方法直接返回，不产生计时开销。
+
+命名约定: stage.* 流程阶段，api.* 数据接口调用，sleep.* 休眠，其余为计数器。
+
+用法:
+    inst = Instrumentation(enabled=True)
+    with inst.span("api.stock_zh_a_hist"):
+        data = ak.stock_zh_a_hist(...)
+    inst.summary()
+    inst.save("daily_screening_profile_20250303.json", target_date="2025-03-03")
+"""
+
+import json
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import numpy as np
+
+# 直方图分桶上界（秒）
+HISTOGRAM_BOUNDS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("inst", "name", "start")
+
+    def __init__(self, inst, name):
+        self.inst = inst
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.inst.durations[self.name].append(time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.inst.counters[f"{self.name}.error"] += 1
+        return False
+
+
+def _bucket_label(bound):
+    return f"<={bound * 1000:g}ms" if bound < 1 else f"<={bound:g}s"
+
+
+def _distribution(values):
+    arr = np.asarray(values, dtype=float)
+    p50, p90, p99 = np.percentile(arr, [50, 90, 99])
+    counts, _ = np.histogram(arr, bins=(0.0,) + HISTOGRAM_BOUNDS + (np.inf,))
+    labels = [_bucket_label(b) for b in HISTOGRAM_BOUNDS] + [f">{HISTOGRAM_BOUNDS[-1]:g}s"]
+    return {
+        "count": int(arr.size),
+        "total_s": round(float(arr.sum()), 6),
+        "mean_ms": round(float(arr.mean()) * 1000, 3),
+        "p50_ms": round(float(p50) * 1000, 3),
+        "p90_ms": round(float(p90) * 1000, 3),
+        "p99_ms": round(float(p99) * 1000, 3),
+        "max_ms": round(float(arr.max()) * 1000, 3),
+        "histogram": {label: int(n) for label, n in zip(labels, counts) if n},
+    }
+
+
+class Instrumentation:
+    """计时区间、延迟分布与计数器"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.durations = defaultdict(list)  # 名称 -> 每次耗时（秒）
+        self.counters = Counter()
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            self.durations[name].append(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def sleep(self, seconds, reason):
+        """休眠并记入 sleep.{reason}"""
+        if seconds <= 0:
+            return
+        if not self.enabled:
+            time.sleep(seconds)
+            return
+        start = time.perf_counter()
+        time.sleep(seconds)
+        self.durations[f"sleep.{reason}"].append(time.perf_counter() - start)
+
+    def iterate(self, name, iterable):
+        """逐项产出 iterable 的元素，并记录每取一项的耗时"""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        samples = self.durations[name]
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            samples.append(time.perf_counter() - start)
+            yield item
+
+    @property
+    def wall_seconds(self):
+        return time.perf_counter() - self._start
+
+    def report(self, **meta):
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_s": round(self.wall_seconds, 3),
+            "meta": meta,
+            "spans": {
+                name: _distribution(values)
+                for name, values in sorted(self.durations.items())
+                if values
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def summary(self):
+        if not self.enabled:
+            return
+        wall = self.wall_seconds
+        rows = sorted(
+            ((name, _distribution(values)) for name, values in self.durations.items() if values),
+            key=lambda row: row[1]["total_s"],
+            reverse=True,
+        )
+        print(f"\n⏱️  耗时分析 (总耗时 {wall:.1f}s)")
+        print(f"   {'区间':<28}{'次数':>8}{'总计(s)':>10}{'占比':>8}{'均值ms':>10}{'p90ms':>10}{'最大ms':>10}")
+        for name, d in rows:
+            print(
+                f"   {name:<28}{d['count']:>8}{d['total_s']:>10.2f}{d['total_s'] / wall:>8.1%}"
+                f"{d['mean_ms']:>10.1f}{d['p90_ms']:>10.1f}{d['max_ms']:>10.1f}"
+            )
+        if self.counters:
+            print("   计数: " + ", ".join(f"{k}={v}" for k, v in sorted(self.counters.items())))
+
+    def save(self, path, **meta):
+        if not self.enabled:
+            return None
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(**meta), f, ensure_ascii=False, indent=2)
+        print(f"📄 耗时报告已保存到: {path}")
+        return path
+
+
+NULL_INSTRUMENTATION = Instrumentation(enabled=False)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+盘中十字星反转检测
+
+daily_stock_screener.py 只能在收盘后用日线判断“昨天十字星、今天确认”，
+入选名单要到第二天早上才有。本模块在盘中把“今天”当作确认日：
+- 开盘前（或前一晚）用历史日线为每只股票算好指标状态，只保留昨日符合十字星形态
+  （小实体、上下影线、缩量）的候选股，状态按日期保存到本地
+- 每次行情更新只对有变化的候选股，用实时价格增量推算今日的 MA、MACD/DEA、KDJ，
+  成交量按已交易时间折算为全天预估量
+- 推算出的确认日数据交给 evaluate_doji_reversal，与收盘后选股使用同一套条件和评分
+
+用法:
+    detector = IntradayDojiDetector()
+    detector.prepare(codes)                # 每天一次，有当日状态文件时直接加载
+    feed.subscribe(detector.on_update)     # 订阅 realtime_feed.RealtimeFeed
+    detector.ranked()                      # 当前满足条件的股票（评分降序）
+"""
+
+import os
+import pickle
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+import numpy as np
+import talib
+
+from daily_stock_screener import (
+    calculate_technical_indicators,
+    evaluate_doji_reversal,
+    get_stock_data,
+)
+
+DEFAULT_STATE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "intraday_state"
+)
+
+# A股连续竞价时段，共240分钟
+SESSIONS = [(dt_time(9, 30), dt_time(11, 30)), (dt_time(13, 0), dt_time(15, 0))]
+TRADING_MINUTES = 240
+MIN_VOLUME_FRACTION = 5 / TRADING_MINUTES  # 开盘前5分钟按5分钟折算，避免预估量失真
+
+# 实时快照列名
+PRICE_COL, OPEN_COL, HIGH_COL, LOW_COL, VOLUME_COL = "最新价", "今开", "最高", "最低", "成交量"
+
+
+def trading_fraction(timestamp):
+    """已交易时间占全天的比例（0~1）"""
+    now = timestamp.time()
+    elapsed = 0.0
+    for start, end in SESSIONS:
+        if now <= start:
+            break
+        session_end = min(now, end)
+        elapsed += (
+            datetime.combine(timestamp.date(), session_end)
+            - datetime.combine(timestamp.date(), start)
+        ).total_seconds() / 60
+    return min(max(elapsed / TRADING_MINUTES, MIN_VOLUME_FRACTION), 1.0)
+
+
+def build_doji_state(data):
+    """用截至十字星日（最后一行）的日线建立增量计算状态
+
+    昨日不满足十字星形态（实体<1%、上下影线、缩量）时返回 None，
+    这些条件与今日行情无关，盘中无需再检查。
+    """
+    data = calculate_technical_indicators(data)
+    if data is None or len(data) < 30:
+        return None
+
+    doji = data.iloc[-1]
+    if doji["open"] <= 0 or doji["close"] <= 0:
+        return None
+    body_size = abs(doji["close"] - doji["open"]) / doji["open"] * 100
+    body_top = max(doji["open"], doji["close"])
+    body_bottom = min(doji["open"], doji["close"])
+    volume_ma20 = doji["volume_ma20"]
+    if (
+        body_size >= 1.0
+        or not (doji["high"] > body_top and doji["low"] < body_bottom)
+        or np.isnan(volume_ma20)
+        or not doji["volume"] < volume_ma20
+    ):
+        return None
+
+    close = data["close"].astype(float)
+    high = data["high"].astype(float)
+    low = data["low"].astype(float)
+
+    # KDJ 的未成熟 K 值（与 talib.STOCH 的 SMA 平滑一致）
+    hhv = high.rolling(9).max()
+    llv = low.rolling(9).min()
+    fastk = ((close - llv) / (hhv - llv) * 100).where(hhv > llv, 0.0)
+    slowk = fastk.rolling(3).mean()
+
+    return {
+        "doji": {
+            key: float(doji[key]) for key in ["open", "high", "low", "close", "volume"]
+        },
+        "doji_date": doji["date"].strftime("%Y-%m-%d"),
+        "volume_ma20": float(volume_ma20),
+        "dea": float(doji["dea_line"]),
+        "ema12": float(talib.EMA(close.values, timeperiod=12)[-1]),
+        "ema26": float(talib.EMA(close.values, timeperiod=26)[-1]),
+        "closes": close.values[-29:],
+        "highs": high.values[-8:],
+        "lows": low.values[-8:],
+        "fastk": fastk.values[-2:],
+        "slowk": slowk.values[-2:],
+    }
+
+
+def project_confirm_day(state, price, open_price, high, low, volume, fraction):
+    """以实时价格作为今日收盘价，推算确认日K线和指标"""
+    # MACD/DEA：在昨日 EMA 状态上推进一步
+    ema12 = state["ema12"] + 2 / 13 * (price - state["ema12"])
+    ema26 = state["ema26"] + 2 / 27 * (price - state["ema26"])
+    macd = ema12 - ema26
+    dea = state["dea"] + 2 / 10 * (macd - state["dea"])
+
+    # KDJ：今日最高/最低并入9日区间
+    hhv = max(state["highs"].max(), high)
+    llv = min(state["lows"].min(), low)
+    fastk = (price - llv) / (hhv - llv) * 100 if hhv > llv else 0.0
+    slowk = (state["fastk"].sum() + fastk) / 3
+    slowd = (state["slowk"].sum() + slowk) / 3
+
+    closes = state["closes"]
+    indicators = {
+        "volume_ma20": state["volume_ma20"],
+        "dea_doji": state["dea"],
+        "dea_confirm": dea,
+        "macd_confirm": macd,
+        "kdj_k": slowk,
+        "kdj_d": slowd,
+        "ma5": (closes[-4:].sum() + price) / 5,
+        "ma20": (closes[-19:].sum() + price) / 20,
+        "ma30": (closes[-29:].sum() + price) / 30,
+    }
+    confirm = {
+        "open": open_price,
+        "high": high,
+        "low": low,
+        "close": price,
+        "volume": volume / fraction,  # 预估全天成交量
+    }
+    return confirm, indicators
+
+
+class IntradayDojiDetector:
+    """盘中十字星反转检测器"""
+
+    def __init__(self, state_dir=DEFAULT_STATE_DIR):
+        self.state_dir = state_dir
+        self.states = {}  # 代码 -> 增量计算状态（仅昨日十字星候选股）
+        self.signals = {}  # 代码 -> 当前满足条件的信号
+
+    def _state_path(self, as_of):
+        return os.path.join(self.state_dir, f"doji_state_{as_of.strftime('%Y%m%d')}.pkl")
+
+    def prepare(self, codes, as_of=None):
+        """为候选股建立指标状态，as_of 为十字星日（默认昨天），同一天只计算一次"""
+        as_of = as_of or (datetime.now() - timedelta(days=1))
+        path = self._state_path(as_of)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self.states = pickle.load(f)
+            print(f"📂 已加载盘中状态: {len(self.states)} 只十字星候选股")
+            return self.states
+
+        print(f"🔧 正在建立盘中状态 ({len(codes)} 只股票)...")
+        states = {}
+        for i, code in enumerate(codes):
+            if i % 200 == 0:
+                print(f"   进度: {i}/{len(codes)} | 候选: {len(states)}")
+            data = get_stock_data(code, as_of, days=90)
+            if data is not None and len(data) >= 30:
+                state = build_doji_state(data)
+                if state is not None:
+                    states[code] = state
+            time.sleep(0.1)  # 控制请求频率
+
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump(states, f)
+        self.states = states
+        print(f"✅ 盘中状态已保存: {len(states)} 只十字星候选股")
+        return states
+
+    def update(self, rows, timestamp):
+        """用实时快照中变化的行（以代码为索引）更新信号，返回本次新增的信号代码"""
+        fraction = trading_fraction(timestamp)
+        codes = rows.index.intersection(list(self.states))
+        added = []
+        for code in codes:
+            row = rows.loc[code]
+            price, open_price = row[PRICE_COL], row[OPEN_COL]
+            if not (price > 0 and open_price > 0):
+                continue
+            state = self.states[code]
+            confirm, indicators = project_confirm_day(
+                state, price, open_price, row[HIGH_COL], row[LOW_COL], row[VOLUME_COL], fraction
+            )
+            signal = evaluate_doji_reversal(state["doji"], confirm, indicators)
+            if signal is None:
+                self.signals.pop(code, None)
+                continue
+            if code not in self.signals:
+                added.append(code)
+            signal.update(
+                {
+                    "symbol": code,
+                    "doji_date": state["doji_date"],
+                    "confirm_date": timestamp.strftime("%Y-%m-%d"),
+                    "current_price": price,
+                    "updated_at": timestamp.strftime("%H:%M:%S"),
+                }
+            )
+            self.signals[code] = signal
+        return added
+
+    def on_update(self, update):
+        """RealtimeFeed 订阅者"""
+        return self.update(update.changed, update.timestamp)
+
+    def ranked(self):
+        return sorted(self.signals.values(), key=lambda x: x["score"], reverse=True)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量市场宽度（涨跌家数）统计
+
+analyze_market_sentiment 与 HybridDataStrategy.market_sentiment_analysis 每个快照都
+对全市场做多次 len(df[mask]) 过滤来数上涨/下跌/涨停/跌停/强势家数，算完即丢弃。
+本模块维护每只股票最近一次的涨跌幅及各类计数：
+- 每次只处理快照差分中变化的股票：先减去旧分类，再加上新分类
+- 按分钟记录计数序列，盘中情绪图表直接读取，无需从原始快照重算
+
+用法:
+    breadth = BreadthEngine()
+    feed.subscribe(breadth.on_update)     # realtime_feed.RealtimeFeed 订阅者
+    breadth.apply_snapshot(df.set_index("代码"))  # 无行情订阅时，直接传入完整快照
+    breadth.counts                        # 当前计数
+    breadth.history()                     # 分钟级计数序列
+"""
+
+import numpy as np
+import pandas as pd
+
+# 分类及判定条件（与原情绪分析阈值一致）
+CATEGORIES = ["up", "down", "limit_up", "limit_down", "strong"]
+LIMIT_PCT = 9.5
+STRONG_PCT = 6
+
+
+def classify(pct):
+    """涨跌幅数组 -> (n, 5) 的0/1分类矩阵，NaN 不属于任何分类"""
+    pct = np.asarray(pct, dtype=float)
+    return np.column_stack(
+        [
+            pct > 0,
+            pct < 0,
+            pct >= LIMIT_PCT,
+            pct <= -LIMIT_PCT,
+            pct > STRONG_PCT,
+        ]
+    ).astype(np.int64)
+
+
+class BreadthEngine:
+    """按快照差分增量更新的市场宽度统计"""
+
+    def __init__(self, pct_col="涨跌幅", code_filter=None):
+        self.pct_col = pct_col
+        self.code_filter = code_filter  # 可选: 以代码为索引的 DataFrame -> 布尔掩码
+        self._pct = {}  # 代码 -> 最近涨跌幅
+        self.strong = {}  # 强势股 代码 -> 涨跌幅
+        self._counts = np.zeros(len(CATEGORIES), dtype=np.int64)
+        self._history = []  # [(分钟, total, up, down, limit_up, limit_down, strong)]
+
+    @property
+    def counts(self):
+        counts = dict(zip(CATEGORIES, self._counts.tolist()))
+        counts["total"] = len(self._pct)
+        counts["up_ratio"] = counts["up"] / counts["total"] if counts["total"] else 0
+        return counts
+
+    def apply(self, changed, removed=(), timestamp=None):
+        """应用一次差分：changed 为以代码为索引的变化行，removed 为消失的代码"""
+        if self.code_filter is not None and len(changed):
+            changed = changed[self.code_filter(changed)]
+        changed = changed[~changed.index.duplicated(keep="last")]
+
+        if len(changed):
+            codes = changed.index.tolist()
+            new = pd.to_numeric(changed[self.pct_col], errors="coerce").to_numpy(float)
+            old = np.array([self._pct.get(code, np.nan) for code in codes], dtype=float)
+            self._counts += classify(new).sum(axis=0) - classify(old).sum(axis=0)
+            self._pct.update(zip(codes, new))
+
+            is_strong = new > STRONG_PCT
+            for code, pct, strong in zip(codes, new, is_strong):
+                if strong:
+                    self.strong[code] = pct
+                else:
+                    self.strong.pop(code, None)
+
+        gone = [code for code in removed if code in self._pct]
+        if gone:
+            old = np.array([self._pct.pop(code) for code in gone], dtype=float)
+            self._counts -= classify(old).sum(axis=0)
+            for code in gone:
+                self.strong.pop(code, None)
+
+        if timestamp is not None:
+            self._record(timestamp)
+
+    def apply_snapshot(self, snapshot, timestamp=None):
+        """完整快照（以代码为索引）与已记录的涨跌幅比较，只应用有变化的股票"""
+        previous = pd.Series(self._pct, dtype=float)
+        pct = pd.to_numeric(snapshot[self.pct_col], errors="coerce")
+        changed = ~pct.eq(previous.reindex(pct.index))
+        self.apply(
+            snapshot[changed.to_numpy()],
+            removed=previous.index.difference(snapshot.index),
+            timestamp=timestamp,
+        )
+
+    def on_update(self, update):
+        """RealtimeFeed 订阅者"""
+        self.apply(update.changed, update.removed, update.timestamp)
+
+    def _record(self, timestamp):
+        """分钟级序列：同一分钟内只保留最新计数"""
+        minute = pd.Timestamp(timestamp).floor("min")
+        row = (minute, len(self._pct), *self._counts.tolist())
+        if self._history and self._history[-1][0] == minute:
+            self._history[-1] = row
+        else:
+            self._history.append(row)
+
+    def history(self):
+        """分钟级计数序列 DataFrame（索引为分钟）"""
+        df = pd.DataFrame(self._history, columns=["time", "total", *CATEGORIES])
+        df["up_ratio"] = (df["up"] / df["total"]).where(df["total"] > 0, 0.0)
+        return df.set_index("time")
+
+    @classmethod
+    def from_snapshot(cls, snapshot, code_col, pct_col="涨跌幅", timestamp=None):
+        """对单个完整快照计数（单次遍历）"""
+        engine = cls(pct_col=pct_col)
+        engine.apply(snapshot.set_index(code_col), timestamp=timestamp)
+        return engine
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据接口健康度指标
+
+定时任务（Money.py、Money2.py、launchd plist）无人值守运行，akshare/qstock 变慢或限流时
+只能从 stdout 里偏低的"数据获取成功率"看出来。所有经 data_provider 代理的调用都会记入
+本模块的 METRICS：按接口（如 akshare.stock_zh_a_hist）统计调用次数、按异常类型的错误数、
+限流次数与延迟分布。
+
+导出需显式开启（QUANT_METRICS_EXPORT，或像 Money.py/Money2.py 那样调用
+export_metrics(exporters=EXPORTERS)），避免临时运行的脚本到处留下指标文件。
+开启后进程退出时自动导出，长驻进程可在每次任务后调用 export_metrics()：
+- Prometheus 文本文件 {目录}/quant_datasource_{任务}.prom，供 node_exporter textfile collector 采集；
+  计数器为进程启动以来的累计值，延迟分位数取最近 LATENCY_WINDOW 次调用
+- SQLite 时间序列 {目录}/datasource_metrics.sqlite，每次导出每个接口写一行累计值，
+  同一 run_id 内递增，可按 run_id 取差得到区间数据
+
+环境变量:
+    QUANT_METRICS_EXPORT   prometheus、sqlite 的逗号组合，或 off（默认 off）
+    QUANT_METRICS_DIR      导出目录（默认 $XDG_DATA_HOME/quant/metrics，即 ~/.local/share/quant/metrics）
+
+查看最近一周各接口的 p95 延迟:
+    sqlite3 ~/.local/share/quant/metrics/datasource_metrics.sqlite \\
+        "SELECT endpoint, max(p95_ms) FROM datasource_metrics WHERE ts > date('now','-7 day') GROUP BY endpoint"
+"""
+
+import atexit
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+
+import numpy as np
+
+# 放在用户数据目录而不是源码目录，导出文件不会混进代码仓库
+DEFAULT_METRICS_DIR = os.path.join(
+    os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"),
+    "quant",
+    "metrics",
+)
+LATENCY_WINDOW = 10000  # 每个接口保留最近多少次调用的延迟用于计算分位数
+EXPORTERS = ("prometheus", "sqlite")
+
+# 上游限流的典型报错（状态码按整词匹配，避免误中报错里的股票代码）
+THROTTLE_PATTERN = re.compile(r"\b(429|403)\b|too many requests|rate limit|forbidden|频繁|限流", re.I)
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasource_metrics (
+    ts TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    job TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    throttled INTEGER NOT NULL,
+    p50_ms REAL,
+    p95_ms REAL,
+    mean_ms REAL,
+    max_ms REAL,
+    error_classes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_datasource_metrics_endpoint_ts
+    ON datasource_metrics (endpoint, ts);
+"""
+
+
+def is_throttle_error(error):
+    return bool(THROTTLE_PATTERN.search(f"{type(error).__name__} {error}"))
+
+
+def _job_name():
+    script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else ""
+    return os.path.splitext(script)[0] or "interactive"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + "}"
+
+
+class DataSourceMetrics:
+    """按接口累计的调用次数、错误、限流与延迟"""
+
+    def __init__(self, job=None):
+        self.job = job or _job_name()
+        self.started_at = datetime.now()
+        self.run_id = f"{self.started_at:%Y%m%d%H%M%S}-{os.getpid()}"
+        self.requests = Counter()
+        self.errors = defaultdict(Counter)  # 接口 -> 异常类型 -> 次数
+        self.throttled = Counter()
+        self.latency_sum = Counter()
+        self.latency = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, seconds, error=None):
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.latency_sum[endpoint] += seconds
+            self.latency[endpoint].append(seconds)
+            if error is not None:
+                self.errors[endpoint][type(error).__name__] += 1
+                if is_throttle_error(error):
+                    self.throttled[endpoint] += 1
+
+    def snapshot(self):
+        """每个接口一行统计"""
+        with self._lock:
+            rows = []
+            for endpoint in sorted(self.requests):
+                latency = np.asarray(self.latency[endpoint], dtype=float)
+                p50, p95 = np.percentile(latency, [50, 95]) if latency.size else (np.nan, np.nan)
+                rows.append(
+                    {
+                        "endpoint": endpoint,
+                        "requests": self.requests[endpoint],
+                        "errors": sum(self.errors[endpoint].values()),
+                        "error_classes": dict(self.errors[endpoint]),
+                        "throttled": self.throttled[endpoint],
+                        "latency_sum_s": self.latency_sum[endpoint],
+                        "p50_ms": float(p50) * 1000,
+                        "p95_ms": float(p95) * 1000,
+                        "mean_ms": float(latency.mean()) * 1000 if latency.size else np.nan,
+                        "max_ms": float(latency.max()) * 1000 if latency.size else np.nan,
+                    }
+                )
+            return rows
+
+    # ------------------------------------------------------------------
+    # 导出
+    # ------------------------------------------------------------------
+    def to_prometheus(self):
+        rows = self.snapshot()
+        job = self.job
+        lines = [
+            "# HELP quant_datasource_requests_total 数据接口调用次数（进程启动以来）",
+            "# TYPE quant_datasource_requests_total counter",
+        ]
+        lines += [
+            f"quant_datasource_requests_total{_labels(job=job, endpoint=r['endpoint'])} {r['requests']}"
+            for r in rows
+        ]
+        lines += [
+            "# HELP quant_datasource_errors_total 数据接口异常次数，按异常类型",
+            "# TYPE quant_datasource_errors_total counter",
+        ]
+        for r in rows:
+            for error_class, n in sorted(r["error_classes"].items()):
+                labels = _labels(job=job, endpoint=r["endpoint"], error_class=error_class)
+                lines.append(f"quant_datasource_errors_total{labels} {n}")
+        lines += [
+            "# HELP quant_datasource_throttled_total 疑似被上游限流的调用次数",
+            "# TYPE quant_datasource_throttled_total counter",
+        ]
+        lines += [
+            f"quant_datasource_throttled_total{_labels(job=job, endpoint=r['endpoint'])} {r['throttled']}"
+            for r in rows
+        ]
+        lines += [
+            f"# HELP quant_datasource_latency_seconds 数据接口延迟（分位数取最近 {LATENCY_WINDOW} 次）",
+            "# TYPE quant_datasource_latency_seconds summary",
+        ]
+        for r in rows:
+            for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms")):
+                labels = _labels(job=job, endpoint=r["endpoint"], quantile=quantile)
+                lines.append(f"quant_datasource_latency_seconds{labels} {r[key] / 1000:.6f}")
+            labels = _labels(job=job, endpoint=r["endpoint"])
+            lines.append(f"quant_datasource_latency_seconds_sum{labels} {r['latency_sum_s']:.6f}")
+            lines.append(f"quant_datasource_latency_seconds_count{labels} {r['requests']}")
+        lines += [
+            "# HELP quant_job_start_timestamp_seconds 任务进程启动时间",
+            "# TYPE quant_job_start_timestamp_seconds gauge",
+            f"quant_job_start_timestamp_seconds{_labels(job=job)} {self.started_at.timestamp():.0f}",
+            "# HELP quant_job_last_export_timestamp_seconds 最近一次导出指标的时间",
+            "# TYPE quant_job_last_export_timestamp_seconds gauge",
+            f"quant_job_last_export_timestamp_seconds{_labels(job=job)} {time.time():.0f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, metrics_dir=DEFAULT_METRICS_DIR):
+        os.makedirs(metrics_dir, exist_ok=True)
+        path = os.path.join(metrics_dir, f"quant_datasource_{self.job}.prom")
+        tmp_path = f"{path}.{os.getpid()}.tmp"  # textfile collector 不读 .tmp，写完再替换
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+        return path
+
+    def export_sqlite(self, metrics_dir=DEFAULT_METRICS_DIR):
+        os.makedirs(metrics_dir, exist_ok=True)
+        path = os.path.join(metrics_dir, "datasource_metrics.sqlite")
+        ts = datetime.now().isoformat(timespec="seconds")
+        rows = [
+            (
+                ts,
+                self.run_id,
+                self.job,
+                r["endpoint"],
+                r["requests"],
+                r["errors"],
+                r["throttled"],
+                r["p50_ms"],
+                r["p95_ms"],
+                r["mean_ms"],
+                r["max_ms"],
+                json.dumps(r["error_classes"], ensure_ascii=False),
+            )
+            for r in self.snapshot()
+        ]
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            with conn:
+                conn.executescript(SQLITE_SCHEMA)
+                conn.executemany(
+                    "INSERT INTO datasource_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        finally:
+            conn.close()
+        return path
+
+
+METRICS = DataSourceMetrics()
+
+
+def _configured_exporters():
+    setting = os.environ.get("QUANT_METRICS_EXPORT", "off").lower()
+    return [name.strip() for name in setting.split(",") if name.strip() in EXPORTERS]
+
+
+def export_metrics(metrics=METRICS, exporters=None):
+    """导出指标；exporters 为 None 时按 QUANT_METRICS_EXPORT（默认不导出）
+
+    没有任何调用时不导出。导出失败只打印，不影响任务
+    """
+    if not metrics.requests:
+        return []
+    if exporters is None:
+        exporters = _configured_exporters()
+    metrics_dir = os.environ.get("QUANT_METRICS_DIR", DEFAULT_METRICS_DIR)
+    paths = []
+    for name in exporters:
+        try:
+            exporter = metrics.export_prometheus if name == "prometheus" else metrics.export_sqlite
+            paths.append(exporter(metrics_dir))
+        except Exception as e:
+            print(f"⚠️  导出 {name} 指标失败: {e}")
+    return paths
+
+
+atexit.register(export_metrics)
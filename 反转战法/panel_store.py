@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存映射的 字段 × 日期 × 股票 面板
+
+各工具都把K线做成长表 DataFrame 再按 symbol 分组。本模块把全市场日K线保存为
+磁盘上的稠密 float32 三维数组（停牌/未上市为 NaN），用 np.memmap 打开：
+- 形状为 (字段, 日期, 股票)：某一字段在任意日期窗口内的全市场截面是连续内存，
+  横截面排名、区间切片无需读入整个数据集
+- 选取部分股票时只读取对应的列，不经过 pandas groupby
+
+文件:
+    {panel_dir}/panel.npy        三维数组（npy 格式，np.load(mmap_mode="r") 打开）
+    {panel_dir}/panel_meta.json  字段、日期、股票代码
+
+构建（来自 bar_store.AdjustedBarStore 的本地缓存：不复权K线在 {store}/raw，复权因子在
+{store}/factors；默认按因子计算前复权价格，--adjust none 为不复权）:
+    python panel_store.py --store data_cache --out panel --start 2023-01-01
+    python panel_store.py --store data_cache --out panel_raw --adjust none
+
+读取:
+    panel = Panel.open("panel")
+    close = panel.frame("close", "2024-01-01", "2024-06-30")        # 日期 × 股票 DataFrame
+    block = panel.window("2024-01-01", "2024-06-30", symbols=["600611"])  # (字段, 日期, 股票) 数组
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from bar_store import AdjustedBarStore
+
+FIELDS = ["open", "high", "low", "close", "volume", "pct_change"]
+PANEL_FILE = "panel.npy"
+META_FILE = "panel_meta.json"
+
+
+class Panel:
+    """只读的内存映射面板"""
+
+    def __init__(self, data, fields, dates, symbols):
+        self.data = data  # (字段, 日期, 股票)
+        self.fields = list(fields)
+        self.dates = pd.DatetimeIndex(dates)
+        self.symbols = pd.Index(symbols)
+        self._field_pos = {field: i for i, field in enumerate(self.fields)}
+
+    @classmethod
+    def open(cls, panel_dir):
+        with open(os.path.join(panel_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        data = np.load(os.path.join(panel_dir, PANEL_FILE), mmap_mode="r")
+        return cls(data, meta["fields"], pd.to_datetime(meta["dates"]), meta["symbols"])
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def _date_slice(self, start=None, end=None):
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), "left")
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), "right")
+        return slice(lo, hi)
+
+    def _symbol_pos(self, symbols):
+        if symbols is None:
+            return slice(None)
+        pos = self.symbols.get_indexer([str(symbol) for symbol in symbols])
+        missing = [symbol for symbol, p in zip(symbols, pos) if p < 0]
+        if missing:
+            raise KeyError(f"面板中没有这些股票: {missing[:5]}")
+        return pos
+
+    def window(self, start=None, end=None, symbols=None, fields=None):
+        """返回 (字段, 日期, 股票) 数组；不指定股票/字段时为内存映射视图，不读入数据"""
+        dates = self._date_slice(start, end)
+        field_pos = slice(None) if fields is None else [self._field_pos[f] for f in fields]
+        block = self.data[field_pos, dates]
+        symbol_pos = self._symbol_pos(symbols)
+        if isinstance(symbol_pos, slice):
+            return block
+        return block[:, :, symbol_pos]
+
+    def frame(self, field, start=None, end=None, symbols=None):
+        """单个字段的 日期 × 股票 DataFrame"""
+        dates = self._date_slice(start, end)
+        values = self.window(start, end, symbols, fields=[field])[0]
+        columns = self.symbols if symbols is None else pd.Index([str(s) for s in symbols])
+        return pd.DataFrame(np.asarray(values), index=self.dates[dates], columns=columns)
+
+    def bars(self, symbol, start=None, end=None):
+        """单只股票的长表K线（date + 各字段），去掉停牌日"""
+        values = self.window(start, end, symbols=[symbol])[:, :, 0]
+        df = pd.DataFrame(np.asarray(values).T, columns=self.fields)
+        df.insert(0, "date", self.dates[self._date_slice(start, end)])
+        return df.dropna(subset=["close"]).reset_index(drop=True)
+
+
+def build_panel(
+    store_dir, panel_dir, start=None, end=None, fields=FIELDS, symbols=None, adjust="qfq"
+):
+    """从 AdjustedBarStore 本地缓存构建面板，日期轴为所有股票交易日的并集
+
+    adjust 为 qfq/hfq 时按复权因子计算价格，为 None 时使用不复权K线。
+    """
+    store = AdjustedBarStore(store_dir)
+    symbols = sorted(symbols or store.codes())
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    def load(code):
+        bars = store.load(code, adjust=adjust)
+        if bars is None:
+            return None
+        mask = np.ones(len(bars), dtype=bool)
+        if start is not None:
+            mask &= (bars["date"] >= start).to_numpy()
+        if end is not None:
+            mask &= (bars["date"] <= end).to_numpy()
+        return bars[mask]
+
+    # 第一遍：确定日期轴
+    print(f"🔧 正在扫描 {len(symbols)} 只股票的缓存...")
+    date_sets = []
+    kept = []
+    for code in symbols:
+        bars = load(code)
+        if bars is not None and len(bars):
+            date_sets.append(bars["date"].to_numpy())
+            kept.append(code)
+    if not kept:
+        print("❌ 缓存中没有可用的K线")
+        return None
+    dates = pd.DatetimeIndex(np.unique(np.concatenate(date_sets)))
+
+    # 第二遍：逐只股票写入磁盘数组
+    os.makedirs(panel_dir, exist_ok=True)
+    path = os.path.join(panel_dir, PANEL_FILE)
+    tmp_path = f"{path}.tmp"
+    data = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=np.float32, shape=(len(fields), len(dates), len(kept))
+    )
+    data[:] = np.nan
+    for j, code in enumerate(kept):
+        bars = load(code)
+        rows = dates.get_indexer(bars["date"])
+        for i, field in enumerate(fields):
+            if field in bars.columns:
+                data[i, rows, j] = pd.to_numeric(bars[field], errors="coerce").to_numpy(
+                    np.float32
+                )
+    data.flush()
+    del data
+    os.replace(tmp_path, path)
+
+    meta = {
+        "fields": list(fields),
+        "dates": dates.strftime("%Y-%m-%d").tolist(),
+        "symbols": kept,
+    }
+    meta_path = os.path.join(panel_dir, META_FILE)
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+    size_mb = len(fields) * len(dates) * len(kept) * 4 / 1024**2
+    print(
+        f"✅ 面板已生成: {len(kept)} 只股票 × {len(dates)} 个交易日 × {len(fields)} 个字段"
+        f" ({size_mb:.1f} MB)"
+    )
+    return Panel.open(panel_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从本地K线缓存构建内存映射面板")
+    parser.add_argument("--store", default="data_cache", help="AdjustedBarStore 缓存目录")
+    parser.add_argument("--out", default="panel", help="面板输出目录")
+    parser.add_argument("--start", help="开始日期 YYYY-MM-DD")
+    parser.add_argument("--end", help="结束日期 YYYY-MM-DD")
+    parser.add_argument(
+        "--adjust",
+        choices=["qfq", "hfq", "none"],
+        default="qfq",
+        help="复权方式（由不复权缓存+复权因子计算），none 为不复权",
+    )
+    args = parser.parse_args()
+    adjust = None if args.adjust == "none" else args.adjust
+    build_panel(args.store, args.out, args.start, args.end, adjust=adjust)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,15 +11,28 @@
 4. 盘中监控功能
 """
 
+import argparse
+
 import pandas as pd
-import qstock as qs
 import numpy as np
 from datetime import datetime, timedelta
-import time
 import warnings
 
+from data_provider import qstock as qs  # 经由数据代理，记入接口健康度指标
+from realtime_feed import LiveSource, RealtimeFeed, ReplaySource, SnapshotRecorder
+from snapshot_ring import read_realtime_data
+from intraday_doji import IntradayDojiDetector
+from market_breadth import BreadthEngine
+from universe import main_board_mask
+
 warnings.filterwarnings("ignore")
 
+# 各数据源可能使用的列名
+PRICE_COLUMNS = ["最新价", "current_price", "price", "收盘"]
+VOLUME_COLUMNS = ["成交量", "volume", "vol"]
+PCT_COLUMNS = ["涨跌幅", "pct_change", "change_pct", "涨幅"]
+NAME_COLUMNS = ["名称", "name"]
+
 print("🚀 qstock实时选股系统 - 十字星反转策略")
 print("=" * 60)
 
@@ -27,6 +40,7 @@ print("=" * 60)
 class QstockRealtimeScreener:
     def __init__(self):
         self.stock_name_map = {}
+        self.breadth = None  # 盘中增量市场宽度（run_realtime 时创建）
         self.market_sentiment = {
             "date": None,
             "hot_stocks": [],
@@ -43,74 +57,87 @@ class QstockRealtimeScreener:
         print("📊 正在获取实时股票数据...")
         
         try:
-            # 使用qstock获取沪深A股实时数据
-            all_stocks = qs.realtime_data()
+            # 优先读取共享内存快照（snapshot_ring.py 生产者运行时），否则请求qstock
+            all_stocks = read_realtime_data()
+            if all_stocks is None:
+                all_stocks = qs.realtime_data()
             print(f"✅ 成功获取 {len(all_stocks)} 只股票的实时数据")
             
-            # 适配列名
-            if "代码" in all_stocks.columns:
-                code_col, name_col = "代码", "名称"
-            elif "code" in all_stocks.columns:
-                code_col, name_col = "code", "name"
-            else:
-                code_col, name_col = all_stocks.columns[0], all_stocks.columns[1]
+            return self.filter_main_board(all_stocks)
             
-            # 筛选主板股票
-            def is_main_board_stock(code, name):
-                # 排除创业板和科创板
-                if any(code.startswith(prefix) for prefix in ["300", "688"]):
-                    return False
-                # 排除ST股票和退市股票
-                if any(keyword in name for keyword in ["ST", "st", "退"]):
-                    return False
-                # 主板股票代码
-                main_board_prefixes = ["600", "601", "603", "605", "000", "001", "002"]
-                return any(code.startswith(prefix) for prefix in main_board_prefixes)
+        except Exception as e:
+            print(f"❌ 获取股票数据失败: {e}")
+            return None, None, None
 
-            main_board_stocks = all_stocks[
-                all_stocks.apply(
-                    lambda row: is_main_board_stock(row[code_col], row[name_col]), axis=1
-                )
-            ]
+    @staticmethod
+    def _find_column(df, candidates):
+        """返回 df 中第一个存在的候选列名"""
+        for col in candidates:
+            if col in df.columns:
+                return col
+        return None
+
+    def filter_main_board(self, all_stocks, verbose=True):
+        """筛选主板股票并更新代码-名称映射，返回 (主板股票, 代码列, 名称列)"""
+        # 适配列名
+        if "代码" in all_stocks.columns:
+            code_col, name_col = "代码", "名称"
+        elif "code" in all_stocks.columns:
+            code_col, name_col = "code", "name"
+        else:
+            code_col, name_col = all_stocks.columns[0], all_stocks.columns[1]
+
+        # 筛选主板股票（排除创业板、科创板、ST及退市股票）
+        main_board_stocks = all_stocks[
+            main_board_mask(all_stocks[code_col], all_stocks[name_col])
+        ]
 
-            # 创建股票代码到名称的映射
-            for _, row in main_board_stocks.iterrows():
-                self.stock_name_map[row[code_col]] = row[name_col]
+        # 创建股票代码到名称的映射
+        self.stock_name_map.update(
+            zip(main_board_stocks[code_col], main_board_stocks[name_col])
+        )
 
+        if verbose:
             print(f"📈 筛选出 {len(main_board_stocks)} 只主板股票")
-            return main_board_stocks, code_col, name_col
-            
-        except Exception as e:
-            print(f"❌ 获取股票数据失败: {e}")
-            return None, None, None
+        return main_board_stocks, code_col, name_col
 
-    def analyze_market_sentiment(self, stocks_data, code_col):
-        """分析市场情绪"""
+    def analyze_market_sentiment(self, stocks_data, code_col, breadth=None):
+        """分析市场情绪
+
+        breadth 为已随行情增量更新的 BreadthEngine，不传时对 stocks_data 单次遍历计数。
+        """
         print("\n🔍 正在分析市场情绪...")
         
         try:
             current_date = datetime.now().strftime("%Y-%m-%d")
             
-            # 适配涨跌幅列名
-            pct_col = None
-            for col in ["涨跌幅", "pct_change", "change_pct", "涨幅"]:
-                if col in stocks_data.columns:
-                    pct_col = col
-                    break
-            
-            if pct_col is None:
-                print("⚠️  未找到涨跌幅数据列，跳过情绪分析")
-                return False
+            if breadth is None:
+                # 适配涨跌幅列名
+                pct_col = self._find_column(stocks_data, PCT_COLUMNS)
+                
+                if pct_col is None:
+                    print("⚠️  未找到涨跌幅数据列，跳过情绪分析")
+                    return False
+                breadth = BreadthEngine.from_snapshot(stocks_data, code_col, pct_col)
             
             # 市场统计
-            total_stocks = len(stocks_data)
-            up_stocks = len(stocks_data[stocks_data[pct_col] > 0])
-            down_stocks = len(stocks_data[stocks_data[pct_col] < 0])
-            limit_up = len(stocks_data[stocks_data[pct_col] >= 9.5])  # 涨停
-            limit_down = len(stocks_data[stocks_data[pct_col] <= -9.5])  # 跌停
+            counts = breadth.counts
+            total_stocks = counts["total"]
+            up_stocks = counts["up"]
+            down_stocks = counts["down"]
+            limit_up = counts["limit_up"]  # 涨停
+            limit_down = counts["limit_down"]  # 跌停
+            strong_count = counts["strong"]  # 强势股票（涨幅超过6%）
             
-            # 强势股票（涨幅超过6%）
-            strong_stocks = stocks_data[stocks_data[pct_col] > 6]
+            # 记录强势股票
+            hot_stocks = [
+                {
+                    "symbol": code,
+                    "name": self.stock_name_map.get(code, code),
+                    "gain_today": gain,
+                }
+                for code, gain in breadth.strong.items()
+            ]
             
             # 更新市场情绪状态
             self.market_sentiment.update({
@@ -120,28 +147,16 @@ class QstockRealtimeScreener:
                 "down_stocks": down_stocks,
                 "limit_up": limit_up,
                 "limit_down": limit_down,
-                "hot_stocks": [],
+                "hot_stocks": hot_stocks,
                 "sentiment_active": False,
             })
             
-            # 记录强势股票
-            hot_stocks = []
-            for _, stock in strong_stocks.iterrows():
-                stock_name = self.stock_name_map.get(stock[code_col], stock[code_col])
-                hot_stocks.append({
-                    "symbol": stock[code_col],
-                    "name": stock_name,
-                    "gain_today": stock[pct_col],
-                })
-            
-            self.market_sentiment["hot_stocks"] = hot_stocks
-            
             # 判断市场情绪是否活跃
             up_ratio = up_stocks / total_stocks if total_stocks > 0 else 0
             sentiment_active = (
                 up_ratio > 0.6 or  # 超过60%的股票上涨
                 limit_up > 10 or   # 涨停股票超过10只
-                len(strong_stocks) > 50  # 强势股票超过50只
+                strong_count > 50  # 强势股票超过50只
             )
             
             self.market_sentiment["sentiment_active"] = sentiment_active
@@ -153,7 +168,7 @@ class QstockRealtimeScreener:
             print(f"   下跌股票: {down_stocks} ({(down_stocks/total_stocks):.1%})")
             print(f"   涨停股票: {limit_up}")
             print(f"   跌停股票: {limit_down}")
-            print(f"   强势股票: {len(strong_stocks)} (涨幅>6%)")
+            print(f"   强势股票: {strong_count} (涨幅>6%)")
             
             if sentiment_active:
                 print(f"🔥 市场情绪: 活跃 ✅")
@@ -170,6 +185,67 @@ class QstockRealtimeScreener:
             print(f"❌ 市场情绪分析失败: {e}")
             return False
 
+    def screen_snapshot(
+        self, stocks_data, code_col, price_col, volume_col, pct_col, top_n=10
+    ):
+        """对实时快照做列式筛选与评分
+
+        全部条件以数组掩码计算，成交量中位数只算一次，前 top_n 用 argpartition 选出，
+        可在每个行情 tick 上调用。返回 (入选股票数, 前 top_n 只股票列表)。
+        """
+        price = pd.to_numeric(stocks_data[price_col], errors="coerce").to_numpy(float)
+        volume = pd.to_numeric(stocks_data[volume_col], errors="coerce").to_numpy(float)
+        pct_change = pd.to_numeric(stocks_data[pct_col], errors="coerce").to_numpy(float)
+
+        # 过滤条件：价格5~100元、有成交量、涨跌幅在合理范围内
+        passed = (
+            (price > 5) & (price < 100) & (volume > 0) & (pct_change > -2) & (pct_change < 8)
+        )
+
+        # 简单评分：基础分 + 价格位置 + 涨跌幅 + 成交量（相对全市场中位数）
+        score = (
+            50
+            + np.where((price >= 10) & (price <= 50), 10, 0)
+            + np.select(
+                [
+                    (pct_change > 0) & (pct_change <= 3),  # 温和上涨
+                    (pct_change > 3) & (pct_change <= 6),  # 适度上涨
+                ],
+                [15, 10],
+                0,
+            )
+            + np.where(volume > np.nanmedian(volume), 10, 0)
+        )
+
+        # 只选择评分较高的股票
+        candidates = np.flatnonzero(passed & (score > 60))
+        if len(candidates) == 0:
+            return 0, []
+
+        # 评分降序、同分保持原顺序，取前 top_n
+        n = len(stocks_data)
+        rank_key = score[candidates] * n - candidates
+        if len(candidates) > top_n:
+            top = np.argpartition(-rank_key, top_n - 1)[:top_n]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-rank_key[top])]
+        rows = candidates[top]
+
+        codes = stocks_data[code_col].to_numpy()[rows]
+        selected_stocks = [
+            {
+                "symbol": code,
+                "name": self.stock_name_map.get(code, code),
+                "price": price[row],
+                "pct_change": pct_change[row],
+                "volume": volume[row],
+                "score": int(score[row]),
+            }
+            for code, row in zip(codes, rows)
+        ]
+        return len(candidates), selected_stocks
+
     def realtime_screening(self):
         """实时选股筛选"""
         print("\n🎯 开始实时选股筛选...")
@@ -182,90 +258,26 @@ class QstockRealtimeScreener:
         # 市场情绪分析
         sentiment_active = self.analyze_market_sentiment(stocks_data, code_col)
         
-        # 基于实时数据的简化选股条件
-        selected_stocks = []
-        
         try:
             # 适配数据列名
-            price_col = None
-            for col in ["最新价", "current_price", "price", "收盘"]:
-                if col in stocks_data.columns:
-                    price_col = col
-                    break
-            
-            volume_col = None
-            for col in ["成交量", "volume", "vol"]:
-                if col in stocks_data.columns:
-                    volume_col = col
-                    break
-            
-            pct_col = None
-            for col in ["涨跌幅", "pct_change", "change_pct", "涨幅"]:
-                if col in stocks_data.columns:
-                    pct_col = col
-                    break
+            price_col = self._find_column(stocks_data, PRICE_COLUMNS)
+            volume_col = self._find_column(stocks_data, VOLUME_COLUMNS)
+            pct_col = self._find_column(stocks_data, PCT_COLUMNS)
             
             if not all([price_col, volume_col, pct_col]):
                 print("⚠️  数据列不完整，无法进行选股")
                 return []
             
             print(f"📈 正在分析 {len(stocks_data)} 只股票...")
-            
-            # 简化的实时选股条件
-            for _, stock in stocks_data.iterrows():
-                try:
-                    # 基本筛选条件
-                    price = stock[price_col]
-                    volume = stock[volume_col]
-                    pct_change = stock[pct_col]
-                    
-                    # 过滤条件
-                    if (
-                        price > 5 and  # 价格大于5元
-                        price < 100 and  # 价格小于100元
-                        volume > 0 and  # 有成交量
-                        -2 < pct_change < 8  # 涨跌幅在合理范围内
-                    ):
-                        
-                        # 计算简单评分
-                        score = 50  # 基础分
-                        
-                        # 价格位置评分
-                        if 10 <= price <= 50:
-                            score += 10
-                        
-                        # 涨跌幅评分
-                        if 0 < pct_change <= 3:
-                            score += 15  # 温和上涨
-                        elif 3 < pct_change <= 6:
-                            score += 10  # 适度上涨
-                        
-                        # 成交量评分（相对评分）
-                        if volume > stocks_data[volume_col].median():
-                            score += 10
-                        
-                        # 只选择评分较高的股票
-                        if score > 60:
-                            stock_name = self.stock_name_map.get(stock[code_col], stock[code_col])
-                            selected_stocks.append({
-                                "symbol": stock[code_col],
-                                "name": stock_name,
-                                "price": price,
-                                "pct_change": pct_change,
-                                "volume": volume,
-                                "score": score,
-                            })
-                
-                except Exception as e:
-                    continue
-            
-            # 按评分排序
-            selected_stocks = sorted(selected_stocks, key=lambda x: x["score"], reverse=True)
-            
+
+            selected_count, selected_stocks = self.screen_snapshot(
+                stocks_data, code_col, price_col, volume_col, pct_col
+            )
+
             # 输出选股结果
             print(f"\n📋 实时选股结果:")
             if selected_stocks:
-                print(f"✅ 共选出 {len(selected_stocks)} 只潜力股票")
+                print(f"✅ 共选出 {selected_count} 只潜力股票")
                 
                 if sentiment_active:
                     print("🔥 市场情绪活跃，可考虑操作")
@@ -273,7 +285,7 @@ class QstockRealtimeScreener:
                     print("😴 市场情绪平淡，建议观望")
                 
                 print(f"\n前10只股票:")
-                for i, stock in enumerate(selected_stocks[:10]):
+                for i, stock in enumerate(selected_stocks):
                     print(f"  {i+1:2d}. {stock['name']}({stock['symbol']}) - "
                           f"价格:¥{stock['price']:.2f} "
                           f"涨幅:{stock['pct_change']:+.2f}% "
@@ -281,56 +293,140 @@ class QstockRealtimeScreener:
             else:
                 print("❌ 未发现符合条件的股票")
             
-            return selected_stocks[:10]  # 返回前10只
+            return selected_stocks  # 返回前10只
             
         except Exception as e:
             print(f"❌ 选股分析失败: {e}")
             return []
 
-    def monitor_selected_stocks(self, selected_stocks, monitor_duration=60):
-        """监控选中的股票"""
+    def monitor_selected_stocks(self, selected_stocks, monitor_duration=60, source=None):
+        """监控选中的股票（行情源只推送有变化的股票）"""
         if not selected_stocks:
             print("📭 没有股票需要监控")
             return
         
         print(f"\n👀 开始监控 {len(selected_stocks)} 只股票 (持续{monitor_duration}秒)...")
         
-        start_time = time.time()
         monitor_symbols = [stock["symbol"] for stock in selected_stocks]
-        
-        try:
-            while time.time() - start_time < monitor_duration:
-                try:
-                    # 获取实时数据
-                    current_data = qs.realtime_data(code=monitor_symbols)
-                    
-                    if current_data is not None and not current_data.empty:
-                        print(f"\n⏰ {datetime.now().strftime('%H:%M:%S')} 实时监控:")
-                        
-                        # 适配列名
-                        code_col = "代码" if "代码" in current_data.columns else current_data.columns[0]
-                        
-                        for _, stock in current_data.iterrows():
-                            symbol = stock[code_col]
-                            stock_name = self.stock_name_map.get(symbol, symbol)
-                            
-                            # 获取价格和涨跌幅信息
-                            try:
-                                price = stock.get("最新价", stock.get("current_price", 0))
-                                pct_change = stock.get("涨跌幅", stock.get("pct_change", 0))
-                                print(f"   {stock_name}({symbol}): ¥{price:.2f} ({pct_change:+.2f}%)")
-                            except:
-                                print(f"   {stock_name}({symbol}): 数据获取异常")
-                    
-                    time.sleep(10)  # 每10秒更新一次
-                    
-                except Exception as e:
-                    print(f"⚠️  监控更新失败: {e}")
-                    time.sleep(5)
-                    continue
-                    
-        except KeyboardInterrupt:
-            print("\n⏹️  监控已停止")
+        feed = RealtimeFeed(source or LiveSource(codes=monitor_symbols), interval=10)
+        feed.subscribe(
+            lambda update: self._print_monitor_update(update, monitor_symbols)
+        )
+        feed.run(duration=monitor_duration)
+
+    def _print_monitor_update(self, update, monitor_symbols):
+        """监控订阅者：只打印行情有变化的监控股票"""
+        changed = update.changed[update.changed.index.isin(monitor_symbols)]
+        if changed.empty:
+            return
+
+        print(f"\n⏰ {update.timestamp.strftime('%H:%M:%S')} 实时监控:")
+        for symbol, stock in changed.iterrows():
+            stock_name = self.stock_name_map.get(symbol, symbol)
+
+            # 获取价格和涨跌幅信息
+            try:
+                price = stock.get("最新价", stock.get("current_price", 0))
+                pct_change = stock.get("涨跌幅", stock.get("pct_change", 0))
+                print(f"   {stock_name}({symbol}): ¥{price:.2f} ({pct_change:+.2f}%)")
+            except:
+                print(f"   {stock_name}({symbol}): 数据获取异常")
+
+    def run_realtime(self, duration=None, source=None, recorder=None, interval=10):
+        """事件驱动的盘中选股：一个全市场行情源，选股与情绪分析共享同一快照
+
+        source 可传入 ReplaySource 回放录制的快照，recorder 用于录制。
+        """
+        feed = RealtimeFeed(source or LiveSource(), interval=interval, recorder=recorder)
+
+        # 先拉取首个快照确定列名（与 from_snapshot 一样按数据源适配），订阅后再补发
+        first = feed.poll()
+        if first is None or first.snapshot is None:
+            raise RuntimeError("未获取到首个行情快照，无法确定涨跌幅/名称列")
+        pct_col = self._find_column(first.snapshot, PCT_COLUMNS)
+        name_col = self._find_column(first.snapshot, NAME_COLUMNS)
+        if pct_col is None or name_col is None:
+            raise ValueError(
+                f"行情快照缺少涨跌幅或名称列: {list(first.snapshot.columns)}"
+            )
+
+        # 市场宽度只按快照差分增量更新（仅统计主板股票）
+        self.breadth = BreadthEngine(
+            pct_col=pct_col,
+            code_filter=lambda df: main_board_mask(df.index, df[name_col]),
+        )
+        feed.subscribe(self.breadth.on_update)
+
+        def screening_subscriber(update):
+            stocks_data, code_col, _ = self.filter_main_board(
+                update.snapshot.reset_index(), verbose=False
+            )
+            price_col = self._find_column(stocks_data, PRICE_COLUMNS)
+            volume_col = self._find_column(stocks_data, VOLUME_COLUMNS)
+            pct_col = self._find_column(stocks_data, PCT_COLUMNS)
+            if not all([price_col, volume_col, pct_col]):
+                return
+
+            self.analyze_market_sentiment(stocks_data, code_col, breadth=self.breadth)
+            selected_count, selected_stocks = self.screen_snapshot(
+                stocks_data, code_col, price_col, volume_col, pct_col
+            )
+            print(
+                f"\n⏰ {update.timestamp.strftime('%H:%M:%S')} "
+                f"变化 {len(update.changed)} 只，入选 {selected_count} 只"
+            )
+            for i, stock in enumerate(selected_stocks):
+                print(
+                    f"  {i+1:2d}. {stock['name']}({stock['symbol']}) "
+                    f"¥{stock['price']:.2f} {stock['pct_change']:+.2f}% 评分:{stock['score']}"
+                )
+
+        feed.subscribe(screening_subscriber)
+        feed.publish(first)
+        feed.run(duration=duration)
+        return feed
+
+    def run_intraday(self, duration=None, source=None, recorder=None, interval=10):
+        """盘中十字星反转检测：把今天当作确认日，收盘前给出入选名单
+
+        先用历史日线为昨日十字星候选股建立指标状态（每天一次），
+        之后每次行情更新只增量推算有变化的候选股。
+        """
+        stocks_data, code_col, _ = self.get_stock_list()
+        if stocks_data is None:
+            return None
+
+        detector = IntradayDojiDetector()
+        detector.prepare(stocks_data[code_col].tolist())
+        if not detector.states:
+            print("📭 昨日没有十字星候选股")
+            return detector
+
+        def signal_subscriber(update):
+            added = detector.on_update(update)
+            for code in added:
+                signal = detector.signals[code]
+                print(
+                    f"🎯 {update.timestamp.strftime('%H:%M:%S')} 新信号: "
+                    f"{self.stock_name_map.get(code, code)}({code}) "
+                    f"评分:{signal['score']:.0f} 现价:¥{signal['current_price']:.2f} "
+                    f"预估量比:{signal['confirmation_to_doji_volume_ratio']:.1f}倍"
+                )
+
+        feed = RealtimeFeed(source or LiveSource(), interval=interval, recorder=recorder)
+        feed.subscribe(signal_subscriber)
+        feed.run(duration=duration)
+
+        ranked = detector.ranked()
+        print(f"\n📋 盘中十字星反转信号: {len(ranked)} 只")
+        for i, signal in enumerate(ranked[:10]):
+            code = signal["symbol"]
+            print(
+                f"  {i+1:2d}. {self.stock_name_map.get(code, code)}({code}) "
+                f"评分:{signal['score']:.0f} 反转幅度:{signal['reversal_pct']:.1f}% "
+                f"({signal['updated_at']})"
+            )
+        return detector
 
     def run_full_analysis(self):
         """运行完整的实时分析"""
@@ -360,10 +456,38 @@ class QstockRealtimeScreener:
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="qstock实时选股 - 十字星反转策略")
+    parser.add_argument(
+        "--realtime", action="store_true", help="事件驱动的盘中持续选股（行情源推送变化）"
+    )
+    parser.add_argument(
+        "--intraday", action="store_true", help="盘中十字星反转检测（今天作为确认日）"
+    )
+    parser.add_argument("--duration", type=int, help="持续选股时长(秒)，默认直到收到Ctrl+C")
+    parser.add_argument("--interval", type=int, default=10, help="快照周期(秒)")
+    parser.add_argument("--record", help="录制快照到文件（用于离线回放）")
+    parser.add_argument("--replay", help="回放录制的快照文件，不访问网络")
+    args = parser.parse_args()
+
     screener = QstockRealtimeScreener()
     
     try:
-        screener.run_full_analysis()
+        if args.intraday:
+            screener.run_intraday(
+                duration=args.duration,
+                source=ReplaySource(args.replay) if args.replay else None,
+                recorder=SnapshotRecorder(args.record) if args.record else None,
+                interval=args.interval,
+            )
+        elif args.realtime or args.replay:
+            screener.run_realtime(
+                duration=args.duration,
+                source=ReplaySource(args.replay) if args.replay else None,
+                recorder=SnapshotRecorder(args.record) if args.record else None,
+                interval=args.interval,
+            )
+        else:
+            screener.run_full_analysis()
     except KeyboardInterrupt:
         print("\n👋 程序已手动停止")
     except Exception as e:
@@ -377,6 +501,7 @@ if __name__ == "__main__":
     print("   - 本脚本基于qstock实时数据进行选股")
     print("   - 适合盘中实时分析和监控")
     print("   - 使用Ctrl+C可随时停止程序")
+    print("   - --realtime 持续选股，--intraday 盘中十字星检测，--record/--replay 录制与回放快照")
     print("   - 确保在交易时间内运行以获得最佳效果")
     print("")
     
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件驱动的实时行情源
+
+原先 monitor_selected_stocks 每10秒轮询一次 qs.realtime_data 并把所有股票重新打印一遍，
+选股、情绪分析各自再拉一次全市场快照。本模块改为：
+- 每个快照周期只有一个轮询器请求行情
+- 与上一快照逐列比较，只把变化的行发布出去
+- 进程内发布/订阅，选股、情绪、监控等作为订阅者接收同一份更新
+- 可把每个快照录制到文件，离线时按录制顺序回放（不需要 qstock 和网络）
+
+用法:
+    feed = RealtimeFeed(LiveSource(codes=["600611"]), interval=10)
+    feed.subscribe(lambda update: print(update.changed))
+    feed.run(duration=60)
+
+    # 回放录制的快照
+    RealtimeFeed(ReplaySource("snapshots.pkl")).run()
+"""
+
+import os
+import pickle
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    from data_provider import qstock as qs  # 经由数据代理，记入接口健康度指标
+
+    QSTOCK_AVAILABLE = True
+except ImportError:
+    QSTOCK_AVAILABLE = False
+
+CODE_COLUMNS = ["代码", "code"]
+
+
+def _code_column(df):
+    for col in CODE_COLUMNS:
+        if col in df.columns:
+            return col
+    return df.columns[0]
+
+
+# ----------------------------------------------------------------------
+# 数据源
+# ----------------------------------------------------------------------
+class LiveSource:
+    """qstock 实时行情源，codes 为空时拉取全市场"""
+
+    def __init__(self, codes=None, market="沪深A"):
+        if not QSTOCK_AVAILABLE:
+            raise ImportError("实时行情需要安装 qstock")
+        self.codes = codes
+        self.market = market
+
+    def __call__(self):
+        if self.codes:
+            df = qs.realtime_data(code=self.codes)
+        else:
+            df = qs.realtime_data(market=self.market)
+        return datetime.now(), df
+
+    @property
+    def realtime(self):
+        return True
+
+
+class ReplaySource:
+    """按录制顺序回放快照文件，回放完毕返回 None"""
+
+    def __init__(self, path):
+        self.path = path
+        self._snapshots = replay_snapshots(path)
+
+    def __call__(self):
+        return next(self._snapshots, None)
+
+    @property
+    def realtime(self):
+        return False
+
+
+class SnapshotRecorder:
+    """把 (时间, 快照) 依次追加到 pickle 流文件"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def write(self, timestamp, snapshot):
+        with open(self.path, "ab") as f:
+            pickle.dump((timestamp, snapshot), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def replay_snapshots(path):
+    """逐个读取录制文件中的 (时间, 快照)"""
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+# ----------------------------------------------------------------------
+# 快照差分与发布
+# ----------------------------------------------------------------------
+class SnapshotUpdate:
+    """一次快照更新：变化的行 + 完整快照"""
+
+    def __init__(self, timestamp, snapshot, changed, removed, code_col):
+        self.timestamp = timestamp
+        self.snapshot = snapshot  # 以代码为索引的完整快照
+        self.changed = changed  # 新出现或数值有变化的行
+        self.removed = removed  # 本次快照中消失的代码
+        self.code_col = code_col
+        self.previous = None  # 上一快照中 changed 对应的行（新出现的代码为 NaN）
+
+    @property
+    def is_first(self):
+        return self.previous is None
+
+
+def diff_snapshots(prev, cur):
+    """比较两次以代码为索引的快照，返回 (变化的行, 消失的代码)"""
+    if prev is None:
+        return cur, pd.Index([])
+
+    common = cur.index.intersection(prev.index)
+    added = cur.index.difference(prev.index)
+    removed = prev.index.difference(cur.index)
+
+    columns = cur.columns.intersection(prev.columns)
+    a = cur.loc[common, columns].to_numpy()
+    b = prev.loc[common, columns].to_numpy()
+    changed_mask = (a != b) & ~(pd.isna(a) & pd.isna(b))
+    changed_codes = common[np.asarray(changed_mask).any(axis=1)]
+
+    return cur.loc[changed_codes.append(added)], removed
+
+
+class RealtimeFeed:
+    """单轮询器 + 快照差分 + 进程内发布/订阅"""
+
+    def __init__(self, source, interval=10, recorder=None):
+        self.source = source
+        self.interval = interval
+        self.recorder = recorder
+        self.subscribers = []
+        self.snapshot = None
+        self.code_col = None
+
+    def subscribe(self, handler, only_changes=True):
+        """注册订阅者 handler(update)；only_changes=True 时无变化的周期不通知"""
+        self.subscribers.append((handler, only_changes))
+        return handler
+
+    def unsubscribe(self, handler):
+        self.subscribers = [(h, o) for h, o in self.subscribers if h is not handler]
+
+    def poll(self):
+        """拉取一次快照并发布，返回 SnapshotUpdate；数据源结束时返回 None"""
+        item = self.source()
+        if item is None:
+            return None
+        timestamp, raw = item
+        if raw is None or raw.empty:
+            return SnapshotUpdate(timestamp, self.snapshot, raw, pd.Index([]), self.code_col)
+
+        if self.recorder is not None:
+            self.recorder.write(timestamp, raw)
+
+        self.code_col = _code_column(raw)
+        cur = raw.drop_duplicates(self.code_col, keep="last").set_index(self.code_col)
+        changed, removed = diff_snapshots(self.snapshot, cur)
+
+        update = SnapshotUpdate(timestamp, cur, changed, removed, self.code_col)
+        if self.snapshot is not None:
+            update.previous = self.snapshot.reindex(changed.index)
+        self.snapshot = cur
+        self.publish(update)
+        return update
+
+    def publish(self, update):
+        has_changes = len(update.changed) > 0 or len(update.removed) > 0
+        for handler, only_changes in list(self.subscribers):
+            if only_changes and not has_changes:
+                continue
+            try:
+                handler(update)
+            except Exception as e:
+                print(f"⚠️  订阅者 {getattr(handler, '__name__', handler)} 处理失败: {e}")
+
+    def run(self, duration=None):
+        """按快照周期持续轮询；duration 为秒数，None 表示直到数据源结束或 Ctrl+C
+
+        回放数据源不等待，按录制顺序尽快发布。
+        """
+        realtime = getattr(self.source, "realtime", True)
+        start_time = time.time()
+        try:
+            while duration is None or time.time() - start_time < duration:
+                tick = time.time()
+                try:
+                    if self.poll() is None:
+                        break
+                except Exception as e:
+                    print(f"⚠️  行情更新失败: {e}")
+                if realtime:
+                    time.sleep(max(0, self.interval - (time.time() - tick)))
+        except KeyboardInterrupt:
+            print("\n⏹️  行情订阅已停止")
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回测运行登记
+
+backetest.py 每次运行都覆盖 yang_bao_yin_trade_records.csv 和收益曲线图，指标只打印在控制台，
+比较参数变体只能重新跑一遍。RunRegistry 把每次回测的结果写入本地 SQLite：
+- runs        运行编号、时间、参数、参数哈希、备注
+- metrics     PyBroker metrics_df（name, value）
+- orders      成交记录
+- equity      资金曲线（date, market_value）
+- selections  每日入选股票（date, rank, symbol, score）
+
+参数哈希相同的运行可直接取回结果而不必重算；compare_runs 把多次运行的指标并排，
+diff_selections 按日期列出两次运行选股的差异。
+
+用法:
+    registry = RunRegistry()
+    run_id = registry.record_run(config, metrics=result.metrics_df, orders=result.orders,
+                                 equity=result.portfolio["market_value"], selections=selections)
+    registry.compare_runs([run_a, run_b])
+
+命令行:
+    python run_registry.py list
+    python run_registry.py show RUN_ID
+    python run_registry.py compare RUN_ID RUN_ID [...]
+    python run_registry.py diff RUN_A RUN_B
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+DEFAULT_REGISTRY_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "backtest_runs.sqlite"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    config TEXT NOT NULL,
+    note TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_config_hash ON runs (config_hash);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    run_id TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS equity (
+    run_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    market_value REAL
+);
+CREATE TABLE IF NOT EXISTS selections (
+    run_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    score REAL
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_run ON metrics (run_id);
+CREATE INDEX IF NOT EXISTS idx_orders_run ON orders (run_id);
+CREATE INDEX IF NOT EXISTS idx_equity_run ON equity (run_id);
+CREATE INDEX IF NOT EXISTS idx_selections_run_date ON selections (run_id, date);
+"""
+
+
+def config_hash(config):
+    """参数字典的稳定哈希（键排序后序列化）"""
+    payload = json.dumps(config, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RunRegistry:
+    """SQLite 中的回测运行记录"""
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH):
+        self.path = path
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def record_run(
+        self,
+        config,
+        metrics=None,
+        orders=None,
+        equity=None,
+        selections=None,
+        strategy="doji_reversal",
+        note="",
+    ):
+        """写入一次运行，返回 run_id
+
+        metrics:    含 name, value 列的 DataFrame（PyBroker metrics_df）或 {name: value}
+        orders:     成交记录 DataFrame，每行按 JSON 保存（不同 PyBroker 版本列不同）
+        equity:     以日期为索引的资金 Series
+        selections: 含 date, rank, symbol, score 的 DataFrame 或字典列表
+        """
+        created_at = datetime.now()
+        digest = config_hash(config)
+        # 毫秒时间戳 + 参数哈希：参数扫描中同一秒内的多次运行也不会重名
+        run_id = f"{created_at:%Y%m%d%H%M%S%f}"[:-3] + f"-{digest[:8]}"
+
+        if isinstance(metrics, dict):
+            metric_rows = [(run_id, k, _as_float(v)) for k, v in metrics.items()]
+        elif metrics is not None:
+            metric_rows = [
+                (run_id, str(name), _as_float(value))
+                for name, value in zip(metrics["name"], metrics["value"])
+            ]
+        else:
+            metric_rows = []
+
+        order_rows = []
+        if orders is not None and len(orders):
+            order_rows = [
+                (run_id, payload)
+                for payload in orders.reset_index().to_json(
+                    orient="records", lines=True, date_format="iso", force_ascii=False
+                ).splitlines()
+            ]
+
+        equity_rows = []
+        if equity is not None and len(equity):
+            equity_rows = [
+                (run_id, str(pd.Timestamp(date).date()), _as_float(value))
+                for date, value in equity.items()
+            ]
+
+        selection_rows = []
+        if selections is not None and len(selections):
+            selections = pd.DataFrame(selections)
+            selection_rows = [
+                (run_id, str(date)[:10], int(rank), str(symbol), _as_float(score))
+                for date, rank, symbol, score in zip(
+                    selections["date"], selections["rank"], selections["symbol"], selections["score"]
+                )
+            ]
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id,
+                        created_at.isoformat(timespec="seconds"),
+                        strategy,
+                        digest,
+                        json.dumps(config, ensure_ascii=False, sort_keys=True, default=str),
+                        note,
+                    ),
+                )
+                conn.executemany("INSERT INTO metrics VALUES (?, ?, ?)", metric_rows)
+                conn.executemany("INSERT INTO orders VALUES (?, ?)", order_rows)
+                conn.executemany("INSERT INTO equity VALUES (?, ?, ?)", equity_rows)
+                conn.executemany("INSERT INTO selections VALUES (?, ?, ?, ?, ?)", selection_rows)
+        finally:
+            conn.close()
+        return run_id
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def list_runs(self, strategy=None):
+        """所有运行（最新在前），附带总收益率、最大回撤和交易次数"""
+        sql = """
+            SELECT r.run_id, r.created_at, r.strategy, r.config_hash, r.note,
+                   max(CASE WHEN m.name = 'total_return_pct' THEN m.value END) AS total_return_pct,
+                   max(CASE WHEN m.name = 'max_drawdown_pct' THEN m.value END) AS max_drawdown_pct,
+                   max(CASE WHEN m.name = 'trade_count' THEN m.value END) AS trade_count
+            FROM runs r LEFT JOIN metrics m ON m.run_id = r.run_id
+            {where}
+            GROUP BY r.run_id ORDER BY r.created_at DESC, r.rowid DESC
+        """
+        if strategy:
+            return self._query(sql.format(where="WHERE r.strategy = ?"), (strategy,))
+        return self._query(sql.format(where=""))
+
+    def find_runs(self, config):
+        """参数相同（哈希一致）的历史运行编号，最新在前"""
+        runs = self._query(
+            "SELECT run_id FROM runs WHERE config_hash = ? ORDER BY created_at DESC, rowid DESC",
+            (config_hash(config),),
+        )
+        return runs["run_id"].tolist()
+
+    def load_run(self, run_id):
+        """取回一次运行的全部结果，不存在时抛 KeyError"""
+        runs = self._query("SELECT * FROM runs WHERE run_id = ?", (run_id,))
+        if runs.empty:
+            raise KeyError(f"没有运行记录: {run_id}")
+        run = runs.iloc[0]
+
+        orders = self._query("SELECT payload FROM orders WHERE run_id = ? ORDER BY rowid", (run_id,))
+        equity = self._query(
+            "SELECT date, market_value FROM equity WHERE run_id = ? ORDER BY date", (run_id,)
+        )
+        equity["date"] = pd.to_datetime(equity["date"])
+        orders = pd.DataFrame([json.loads(p) for p in orders["payload"]])
+        # 成交记录按 ISO 字符串保存，日期列还原为 datetime
+        for col in orders.columns:
+            if col == "date" or str(col).endswith("_date"):
+                orders[col] = pd.to_datetime(orders[col])
+        return {
+            "run_id": run_id,
+            "created_at": run["created_at"],
+            "strategy": run["strategy"],
+            "config_hash": run["config_hash"],
+            "config": json.loads(run["config"]),
+            "note": run["note"],
+            "metrics": self._query(
+                "SELECT name, value FROM metrics WHERE run_id = ? ORDER BY rowid", (run_id,)
+            ),
+            "orders": orders,
+            "equity": equity.set_index("date")["market_value"],
+            "selections": self._query(
+                "SELECT date, rank, symbol, score FROM selections WHERE run_id = ? ORDER BY date, rank",
+                (run_id,),
+            ),
+        }
+
+    def compare_runs(self, run_ids):
+        """指标并排：行为指标名，列为 run_id"""
+        placeholders = ",".join("?" * len(run_ids))
+        metrics = self._query(
+            f"SELECT run_id, name, value FROM metrics WHERE run_id IN ({placeholders})",
+            tuple(run_ids),
+        )
+        table = metrics.pivot_table(index="name", columns="run_id", values="value", aggfunc="first")
+        return table.reindex(columns=[r for r in run_ids if r in table.columns])
+
+    def diff_selections(self, run_a, run_b):
+        """按日期比较两次运行的入选股票，只返回有差异的日期"""
+        a = self._query("SELECT date, symbol FROM selections WHERE run_id = ?", (run_a,))
+        b = self._query("SELECT date, symbol FROM selections WHERE run_id = ?", (run_b,))
+        picks_a = a.groupby("date")["symbol"].agg(set)
+        picks_b = b.groupby("date")["symbol"].agg(set)
+        rows = []
+        for date in sorted(set(picks_a.index) | set(picks_b.index)):
+            sa = picks_a.get(date, set())
+            sb = picks_b.get(date, set())
+            if sa != sb:
+                rows.append(
+                    {
+                        "date": date,
+                        f"only_{run_a}": sorted(sa - sb),
+                        f"only_{run_b}": sorted(sb - sa),
+                        "common": len(sa & sb),
+                    }
+                )
+        return pd.DataFrame(rows, columns=["date", f"only_{run_a}", f"only_{run_b}", "common"])
+
+
+def parse_arguments(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="回测运行登记查询")
+    parser.add_argument("--db", default=DEFAULT_REGISTRY_PATH, help="登记库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出所有运行")
+    show = sub.add_parser("show", help="显示一次运行的参数、指标和资金曲线概况")
+    show.add_argument("run_id")
+    compare = sub.add_parser("compare", help="并排比较多次运行的指标")
+    compare.add_argument("run_ids", nargs="+")
+    diff = sub.add_parser("diff", help="比较两次运行的每日选股")
+    diff.add_argument("run_a")
+    diff.add_argument("run_b")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    registry = RunRegistry(args.db)
+
+    if args.command == "list":
+        runs = registry.list_runs()
+        if runs.empty:
+            print("📭 还没有回测运行记录")
+        else:
+            print(runs.to_string(index=False))
+    elif args.command == "show":
+        run = registry.load_run(args.run_id)
+        print(f"🏷️  {run['run_id']}  {run['created_at']}  {run['strategy']}  {run['note'] or ''}")
+        print(f"⚙️  参数: {json.dumps(run['config'], ensure_ascii=False)}")
+        print("\n📊 指标:")
+        print(run["metrics"].to_string(index=False))
+        equity = run["equity"]
+        if len(equity):
+            print(
+                f"\n💰 资金曲线: {equity.index[0]:%Y-%m-%d} ¥{equity.iloc[0]:,.0f} → "
+                f"{equity.index[-1]:%Y-%m-%d} ¥{equity.iloc[-1]:,.0f}"
+            )
+        print(f"📋 成交 {len(run['orders'])} 笔, 选股 {len(run['selections'])} 条")
+    elif args.command == "compare":
+        print(registry.compare_runs(args.run_ids).to_string())
+    elif args.command == "diff":
+        diff = registry.diff_selections(args.run_a, args.run_b)
+        if diff.empty:
+            print("✅ 两次运行的每日选股完全相同")
+        else:
+            print(diff.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+股票评分查询常驻服务
+
+stock_score_query.py 每次查询都要重新导入依赖、下载股票列表、下载K线、计算指标。
+本服务把 StockScoreQuery 包装成本地 HTTP 守护进程，常驻内存：
+- 股票索引（symbol_index）
+- 每只已查询股票的近期K线、技术指标及向量化评分（score_frame）
+后台线程按固定间隔增量刷新（只补最新几天的K线），查询直接命中内存缓存。
+
+启动:
+    python score_server.py --port 8765
+
+接口（GET，返回 JSON）:
+    /score?stock=大众交通&date=2024-07-09   单只股票单日评分（含得分原因）
+    /batch?stocks=600611,000001&dates=2024-07-08,2024-07-09
+    /search?q=dzjt                         名称/代码/拼音首字母检索
+    /health                                服务状态
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from stock_score_query import StockScoreQuery
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+LOOKBACK_DAYS = 400  # 首次加载的历史长度（自然日）
+WARMUP_DAYS = 100  # 指标预热长度，与 StockScoreQuery.get_stock_data 一致
+REFRESH_INTERVAL = 600  # 后台增量刷新间隔（秒）
+REFRESH_OVERLAP_DAYS = 5  # 增量刷新时重叠的天数，覆盖盘中未定稿的K线
+MIN_EXTEND_GAP = 60  # 同一股票两次按需补数据的最小间隔（秒），避免非交易日反复请求
+
+
+def _to_json_value(value):
+    """numpy/pandas 标量转为可序列化的 Python 值，NaN 转为 None"""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class ScoreService:
+    """带内存缓存的评分服务"""
+
+    def __init__(self, lookback_days=LOOKBACK_DAYS):
+        self.lookback_days = lookback_days
+        self.query_tool = StockScoreQuery()
+        self.lock = threading.RLock()
+        self.bars = {}  # 代码 -> 含指标的K线
+        self.scores = {}  # 代码 -> score_frame 结果
+        self.extended_at = {}  # 代码 -> 最近一次补最新K线的时间
+        self.last_refresh = None
+
+        if not self.query_tool.get_stock_list():
+            raise RuntimeError("股票索引加载失败")
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+    def _rebuild(self, code, bars):
+        """重算指标与评分并写入缓存"""
+        bars = bars[~bars.index.duplicated(keep="last")].sort_index()
+        bars = self.query_tool.calculate_indicators(bars, verbose=False)
+        if bars is None:
+            return
+        self.bars[code] = bars
+        self.scores[code] = self.query_tool.score_frame(bars)
+
+    def _ensure_loaded(self, code, target_dt):
+        """保证缓存覆盖 target_dt（含指标预热），缺失部分按需向前扩展
+
+        网络请求在锁外进行，只在写入缓存时持锁，避免慢请求阻塞其他查询。
+        """
+        with self.lock:
+            bars = self.bars.get(code)
+
+        if bars is None:
+            start = min(
+                datetime.now() - timedelta(days=self.lookback_days),
+                target_dt - timedelta(days=WARMUP_DAYS),
+            )
+            data = self.query_tool._fetch_history(
+                code,
+                start.strftime("%Y%m%d"),
+                datetime.now().strftime("%Y%m%d"),
+                verbose=False,
+            )
+            with self.lock:
+                # 并发请求可能已先一步加载，保留已有缓存
+                if data is not None and code not in self.bars:
+                    self._rebuild(code, data)
+                return code in self.bars
+
+        need_start = target_dt - timedelta(days=WARMUP_DAYS)
+        if need_start < bars.index.min():
+            older = self.query_tool._fetch_history(
+                code,
+                need_start.strftime("%Y%m%d"),
+                (bars.index.min() - timedelta(days=1)).strftime("%Y%m%d"),
+                verbose=False,
+            )
+            if older is not None:
+                with self.lock:
+                    bars = self.bars[code]
+                    self._rebuild(code, pd.concat([older, bars[older.columns]]))
+        elif (
+            bars.index.max() < target_dt <= datetime.now()
+            and time.time() - self.extended_at.get(code, 0) > MIN_EXTEND_GAP
+        ):
+            self._extend_recent(code)
+        return True
+
+    def _extend_recent(self, code):
+        """只补最近几天的K线（与已有数据重叠几天，覆盖盘中未定稿的K线）"""
+        with self.lock:
+            bars = self.bars[code]
+        start = (bars.index.max() - timedelta(days=REFRESH_OVERLAP_DAYS)).strftime(
+            "%Y%m%d"
+        )
+        recent = self.query_tool._fetch_history(
+            code, start, datetime.now().strftime("%Y%m%d"), verbose=False
+        )
+        self.extended_at[code] = time.time()
+        if recent is None:
+            return
+        with self.lock:
+            bars = self.bars[code]
+            self._rebuild(code, pd.concat([bars[recent.columns], recent]))
+
+    def refresh(self):
+        """增量刷新：索引过期则重建，已缓存股票只补最近几天的K线"""
+        if not self.query_tool.symbol_index.is_fresh():
+            self.query_tool.get_stock_list()
+
+        with self.lock:
+            codes = list(self.bars)
+        for code in codes:
+            self._extend_recent(code)
+        self.last_refresh = datetime.now()
+
+    def start_refresher(self, interval=REFRESH_INTERVAL):
+        """后台定时增量刷新"""
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"增量刷新失败: {e}")
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def search(self, query, limit=10):
+        matches = self.query_tool.symbol_index.search(query, limit=limit)
+        return [{"stock_code": code, "stock_name": name} for code, name in matches]
+
+    def score(self, stock_input, date_input, detail=True):
+        """单只股票单日评分，detail=True 时附带得分原因"""
+        stock_code, stock_name = self.query_tool.find_stock_code(stock_input)
+        if not stock_code:
+            return {"error": f"未找到股票: {stock_input}"}
+
+        target_dt = datetime.strptime(date_input, "%Y-%m-%d")
+        if not self._ensure_loaded(stock_code, target_dt):
+            return {"error": f"获取股票数据失败: {stock_code}"}
+
+        with self.lock:
+            bars = self.bars[stock_code]
+            scores = self.scores[stock_code]
+        target_date = pd.Timestamp(target_dt)
+        if target_date not in scores.index or pd.isna(
+            scores.at[target_date, "total_score"]
+        ):
+            return {"error": f"目标日期 {date_input} 不在数据范围内或数据不足"}
+
+        result = {"stock_code": stock_code, "stock_name": stock_name, "date": date_input}
+        result.update(
+            {key: _to_json_value(value) for key, value in scores.loc[target_date].items()}
+        )
+
+        if detail:
+            # 得分原因沿用单只评分逻辑，关闭其控制台输出
+            pos = bars.index.get_loc(target_date)
+            details = self.query_tool._calculate_detailed_score(
+                bars.iloc[pos - 2], bars.iloc[pos - 1], bars.iloc[pos], verbose=False
+            )
+            for key in ["reasons", "conditions_met", "conditions_failed"]:
+                result[key] = details[key]
+        return result
+
+    def batch(self, stock_inputs, dates):
+        return [
+            self.score(stock_input, date, detail=False)
+            for stock_input in stock_inputs
+            for date in dates
+        ]
+
+    def health(self):
+        with self.lock:
+            cached = len(self.bars)
+        return {
+            "status": "ok",
+            "index_date": self.query_tool.symbol_index.built_date,
+            "indexed_stocks": len(self.query_tool.code_name_map),
+            "cached_stocks": cached,
+            "last_refresh": self.last_refresh.strftime("%Y-%m-%d %H:%M:%S")
+            if self.last_refresh
+            else None,
+        }
+
+
+def make_handler(service):
+    class ScoreRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            started = time.perf_counter()
+            try:
+                if url.path == "/score":
+                    payload = service.score(params["stock"], params["date"])
+                elif url.path == "/batch":
+                    payload = service.batch(
+                        params["stocks"].split(","), params["dates"].split(",")
+                    )
+                elif url.path == "/search":
+                    payload = service.search(params["q"], int(params.get("limit", 10)))
+                elif url.path == "/health":
+                    payload = service.health()
+                else:
+                    self._send_json({"error": f"未知接口: {url.path}"}, 404)
+                    return
+            except KeyError as e:
+                self._send_json({"error": f"缺少参数: {e.args[0]}"}, 400)
+                return
+            except ValueError as e:
+                self._send_json({"error": str(e)}, 400)
+                return
+
+            status = 400 if isinstance(payload, dict) and "error" in payload else 200
+            self._send_json(payload, status)
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"{url.path} {params} -> {status} ({elapsed:.1f}ms)")
+
+        def log_message(self, format, *args):
+            pass  # 使用 do_GET 中的简洁日志
+
+    return ScoreRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="股票评分查询常驻服务")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--refresh-interval", type=int, default=REFRESH_INTERVAL, help="增量刷新间隔(秒)"
+    )
+    parser.add_argument("--preload", help="启动时预加载的股票，逗号分隔")
+    args = parser.parse_args()
+
+    service = ScoreService()
+    if args.preload:
+        today = datetime.now()
+        for stock_input in args.preload.split(","):
+            code, name = service.query_tool.find_stock_code(stock_input)
+            if code:
+                service._ensure_loaded(code, today)
+        print(f"预加载完成，缓存 {len(service.bars)} 只股票")
+    service.start_refresher(args.refresh_interval)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"🚀 评分服务已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服务已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
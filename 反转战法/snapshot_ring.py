@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享内存行情快照环形缓冲区
+
+qstock_realtime_screener.py、hybrid_data_strategy.py、job.get_stock_pool、
+qstock_select_predict.get_stock_pool 同时运行时各自调用 qs.realtime_data()，
+上游被重复请求，每个进程还各自保存一份快照。
+
+本模块由一个生产者进程拉取行情，把最近 N 个快照写入共享内存环形缓冲区：
+- 固定的 float64 数值列（最新价、涨跌幅、成交量……）
+- 代码/名称存放在只追加的符号字典中，快照第 i 行即符号 i
+- 消费者进程直接映射同一块内存（连接只建立一次），在顺序锁保护下拷贝最新快照
+
+启动生产者:
+    python snapshot_ring.py --interval 10
+
+消费者:
+    df = read_realtime_data()   # 与 qs.realtime_data() 相同的中文列名，缓冲区不可用时返回 None
+"""
+
+import argparse
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RING_NAME = "qs_snapshot_ring"
+DEFAULT_CAPACITY = 8  # 保留最近的快照个数
+DEFAULT_MAX_SYMBOLS = 8192
+MAX_AGE_SECONDS = 60  # 消费者默认只使用60秒内的快照
+
+# 快照中保存的数值列（qs.realtime_data 的中文列名）
+FIELDS = [
+    "最新价",
+    "涨跌幅",
+    "成交量",
+    "成交额",
+    "最高",
+    "最低",
+    "今开",
+    "昨收",
+    "换手率",
+    "量比",
+    "总市值",
+    "流通市值",
+]
+
+CODE_DTYPE = "S6"
+NAME_DTYPE = "S48"  # UTF-8 编码，最多16个汉字
+
+# 头部字段位置
+_SEQ, _N_SYMBOLS, _CAPACITY, _MAX_SYMBOLS, _N_FIELDS = range(5)
+_HEADER_SIZE = 8
+
+
+def _layout(capacity, max_symbols, n_fields):
+    """各数组在共享内存中的 (偏移, dtype, shape)"""
+    specs = [
+        ("header", np.int64, (_HEADER_SIZE,)),
+        ("slot_seq", np.int64, (capacity,)),
+        ("timestamps", np.float64, (capacity,)),
+        ("counts", np.int64, (capacity,)),
+        ("codes", CODE_DTYPE, (max_symbols,)),
+        ("names", NAME_DTYPE, (max_symbols,)),
+        ("data", np.float64, (capacity, max_symbols, n_fields)),
+    ]
+    layout = {}
+    offset = 0
+    for name, dtype, shape in specs:
+        dtype = np.dtype(dtype)
+        offset = (offset + 63) // 64 * 64  # 64字节对齐
+        layout[name] = (offset, dtype, shape)
+        offset += dtype.itemsize * int(np.prod(shape))
+    return layout, offset
+
+
+_OWNED = set()  # 本进程创建的缓冲区名称
+
+
+def _attach(name):
+    """连接已存在的共享内存，且不让本进程退出时把它回收"""
+    if name in _OWNED:
+        return shared_memory.SharedMemory(name=name)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 没有 track 参数
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SnapshotRing:
+    """共享内存环形缓冲区（单生产者、多消费者）"""
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        self.capacity = int(header[_CAPACITY])
+        self.max_symbols = int(header[_MAX_SYMBOLS])
+        layout, _ = _layout(self.capacity, self.max_symbols, int(header[_N_FIELDS]))
+        for key, (offset, dtype, shape) in layout.items():
+            setattr(self, key, np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset))
+
+        self._symbol_ids = {}  # 生产者: 代码 -> 行号
+        self._reader_codes = None  # 消费者: 已解码的代码（按符号数缓存）
+
+    @classmethod
+    def create(
+        cls, name=DEFAULT_RING_NAME, capacity=DEFAULT_CAPACITY, max_symbols=DEFAULT_MAX_SYMBOLS
+    ):
+        """生产者创建缓冲区（同名旧缓冲区会被替换）"""
+        layout, size = _layout(capacity, max_symbols, len(FIELDS))
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _OWNED.add(name)
+        header = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_CAPACITY] = capacity
+        header[_MAX_SYMBOLS] = max_symbols
+        header[_N_FIELDS] = len(FIELDS)
+        ring = cls(shm, owner=True)
+        ring.slot_seq[:] = 0
+        return ring
+
+    @classmethod
+    def open(cls, name=DEFAULT_RING_NAME):
+        """消费者连接缓冲区，不存在时返回 None"""
+        try:
+            return cls(_attach(name), owner=False)
+        except FileNotFoundError:
+            return None
+
+    def close(self):
+        # 释放 numpy 视图后才能关闭共享内存
+        for key in ["header", "slot_seq", "timestamps", "counts", "codes", "names", "data"]:
+            setattr(self, key, None)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            _OWNED.discard(self.shm.name)
+            reader = _READERS.pop(self.shm.name, None)
+            if reader is not None:
+                reader.close()
+
+    # ------------------------------------------------------------------
+    # 生产者
+    # ------------------------------------------------------------------
+    def _symbol_rows(self, codes, names):
+        """代码 -> 行号，新代码追加到符号字典"""
+        rows = np.empty(len(codes), dtype=np.int64)
+        n_symbols = int(self.header[_N_SYMBOLS])
+        for i, code in enumerate(codes):
+            row = self._symbol_ids.get(code)
+            if row is None:
+                if n_symbols >= self.max_symbols:
+                    raise ValueError(f"符号数超过缓冲区上限 {self.max_symbols}")
+                row = n_symbols
+                self.codes[row] = code.encode("ascii")
+                self.names[row] = str(names[i]).encode("utf-8")[: self.names.itemsize]
+                self._symbol_ids[code] = row
+                n_symbols += 1
+            rows[i] = row
+        self.header[_N_SYMBOLS] = n_symbols
+        return rows
+
+    def write(self, snapshot, timestamp=None):
+        """写入一个快照（含“代码”“名称”列，或以代码为索引）"""
+        if "代码" in snapshot.columns:
+            codes = snapshot["代码"].astype(str).to_numpy()
+        else:
+            codes = snapshot.index.astype(str).to_numpy()
+        names = snapshot["名称"].to_numpy() if "名称" in snapshot.columns else codes
+        values = (
+            snapshot.reindex(columns=FIELDS)
+            .apply(pd.to_numeric, errors="coerce")
+            .to_numpy(dtype=np.float64)
+        )
+        rows = self._symbol_rows(codes, names)
+
+        seq = int(self.header[_SEQ]) + 1
+        slot = (seq - 1) % self.capacity
+        # 顺序锁：先标记槽位正在写，写完再发布序号
+        self.slot_seq[slot] = -1
+        n_symbols = int(self.header[_N_SYMBOLS])
+        self.data[slot, :n_symbols] = np.nan
+        self.data[slot, rows] = values
+        self.counts[slot] = n_symbols
+        self.timestamps[slot] = timestamp if timestamp is not None else time.time()
+        self.slot_seq[slot] = seq
+        self.header[_SEQ] = seq
+        return seq
+
+    def write_update(self, update):
+        """RealtimeFeed 订阅者：每个周期写入完整快照"""
+        if update.snapshot is not None:
+            self.write(update.snapshot, update.timestamp.timestamp())
+
+    # ------------------------------------------------------------------
+    # 消费者
+    # ------------------------------------------------------------------
+    @property
+    def seq(self):
+        return int(self.header[_SEQ])
+
+    def latest(self, back=0, retries=3):
+        """返回 (时间戳, 代码数组, 数值, 名称)；back=1 为上一个快照
+
+        数值与名称在两次读取槽位序号之间拷贝出来，序号未变才说明拷贝期间
+        没有被生产者改写，返回的是与共享内存无关的副本。
+        """
+        for _ in range(retries):
+            seq = self.seq - back
+            if seq <= 0 or back >= self.capacity:
+                return None
+            slot = (seq - 1) % self.capacity
+            if self.slot_seq[slot] != seq:
+                continue  # 正在被写入或已被覆盖
+            n_symbols = int(self.counts[slot])
+            timestamp = float(self.timestamps[slot])
+            values = self.data[slot, :n_symbols].copy()
+            names = self.names[:n_symbols].copy()
+            if self.slot_seq[slot] == seq:
+                return timestamp, self.symbol_codes(n_symbols), values, names
+        return None
+
+    def symbol_codes(self, n_symbols):
+        if self._reader_codes is None or len(self._reader_codes) < n_symbols:
+            self._reader_codes = np.char.decode(self.codes[: int(self.header[_N_SYMBOLS])])
+        return self._reader_codes[:n_symbols]
+
+    def latest_frame(self, back=0, max_age=MAX_AGE_SECONDS):
+        """最新快照转为 DataFrame（列名与 qs.realtime_data 一致），过期或为空时返回 None"""
+        latest = self.latest(back)
+        if latest is None:
+            return None
+        timestamp, codes, values, names = latest
+        if max_age is not None and time.time() - timestamp > max_age:
+            return None
+
+        present = ~np.isnan(values).all(axis=1)
+        df = pd.DataFrame(values[present], columns=FIELDS)
+        df.insert(0, "名称", np.char.decode(names[present], "utf-8"))
+        df.insert(0, "代码", codes[present])
+        return df
+
+
+_READERS = {}  # 缓冲区名称 -> 已连接的 SnapshotRing，避免每次读取都重新映射
+
+
+def read_realtime_data(name=DEFAULT_RING_NAME, max_age=MAX_AGE_SECONDS):
+    """从共享内存读取最新全市场快照，缓冲区不存在或快照过期时返回 None"""
+    ring = _READERS.get(name)
+    if ring is not None:
+        df = ring.latest_frame(max_age=max_age)
+        if df is not None:
+            return df
+        # 快照过期：生产者可能已重建同名缓冲区，丢弃旧映射后重连一次
+        _READERS.pop(name).close()
+
+    ring = SnapshotRing.open(name)
+    if ring is None:
+        return None
+    _READERS[name] = ring
+    return ring.latest_frame(max_age=max_age)
+
+
+def main():
+    from realtime_feed import LiveSource, RealtimeFeed
+
+    parser = argparse.ArgumentParser(description="共享内存行情快照生产者")
+    parser.add_argument("--name", default=DEFAULT_RING_NAME)
+    parser.add_argument("--interval", type=int, default=10, help="快照周期(秒)")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY)
+    args = parser.parse_args()
+
+    ring = SnapshotRing.create(args.name, capacity=args.capacity)
+    feed = RealtimeFeed(LiveSource(), interval=args.interval)
+    feed.subscribe(ring.write_update, only_changes=False)
+    print(f"🚀 快照生产者已启动: {args.name} (保留最近 {args.capacity} 个快照)")
+    try:
+        feed.run()
+    finally:
+        ring.close()
+        print("共享内存已释放")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,15 +8,24 @@
 python stock_score_query.py --stock "大众交通" --date "2023-07-08"
 或
 python stock_score_query.py --code "600611" --date "2023-07-08"
+或
+python stock_score_query.py --stock "dzjt" --date "2023-07-08"  (拼音首字母，需安装 pypinyin)
+
+批量模式（每只股票只请求一次数据，所有日期向量化评分）:
+python stock_score_query.py --stocks "大众交通,600611" --dates "2023-07-06,2023-07-07"
+python stock_score_query.py --batch requests.csv --output scores.csv
 """
 
+import numpy as np
 import pandas as pd
-import akshare as ak
+from bar_store import adjusted_bars  # 不复权K线+复权因子缓存（QUANT_DATA_MODE 录制/回放同样生效）
 from datetime import datetime, timedelta
 import argparse
 import talib
 import warnings
 
+from symbol_index import SymbolIndex
+
 warnings.filterwarnings("ignore")
 
 # 设置matplotlib中文字体
@@ -31,47 +40,31 @@ plt.rcParams["font.sans-serif"] = [
 plt.rcParams["axes.unicode_minus"] = False
 
 
+def _silent(*args, **kwargs):
+    """verbose=False 时代替 print，不输出任何内容"""
+
+
 class StockScoreQuery:
     def __init__(self):
         self.stock_name_map = {}
         self.code_name_map = {}
+        self.symbol_index = None
 
-    def get_stock_list(self):
-        """获取股票列表，建立代码和名称的映射关系"""
-        print("正在获取股票列表...")
-        try:
-            all_stocks = ak.stock_zh_a_spot_em()
-
-            def is_main_board_stock(code, name):
-                if any(code.startswith(prefix) for prefix in ["300", "688"]):
-                    return False
-                if any(keyword in name for keyword in ["ST", "st", "退"]):
-                    return False
-                main_board_prefixes = ["600", "601", "603", "605", "000", "001", "002"]
-                return any(code.startswith(prefix) for prefix in main_board_prefixes)
-
-            main_board_stocks = all_stocks[
-                all_stocks.apply(
-                    lambda row: is_main_board_stock(row["代码"], row["名称"]), axis=1
-                )
-            ]
-
-            # 创建双向映射
-            for _, row in main_board_stocks.iterrows():
-                code = row["代码"]
-                name = row["名称"]
-                self.stock_name_map[name] = code
-                self.code_name_map[code] = name
-
-            print(f"成功获取 {len(main_board_stocks)} 只主板股票信息")
-            return True
+    def get_stock_list(self, force_refresh=False):
+        """加载股票索引，建立代码和名称的映射关系
 
-        except Exception as e:
-            print(f"获取股票列表失败: {e}")
+        索引持久化在本地，当日已建立过时不再请求全市场行情
+        """
+        self.symbol_index = SymbolIndex.load_or_refresh(force=force_refresh)
+        if self.symbol_index is None:
             return False
 
+        self.stock_name_map = self.symbol_index.stock_name_map
+        self.code_name_map = self.symbol_index.code_name_map
+        return True
+
     def find_stock_code(self, stock_input):
-        """根据股票名称或代码查找对应的代码"""
+        """根据股票名称、代码或拼音首字母查找对应的代码"""
         # 如果输入的是6位数字，直接当作代码
         if stock_input.isdigit() and len(stock_input) == 6:
             if stock_input in self.code_name_map:
@@ -79,59 +72,42 @@ class StockScoreQuery:
             else:
                 return None, None
 
-        # 否则当作名称查找
-        for name, code in self.stock_name_map.items():
-            if stock_input in name or name in stock_input:
-                return code, name
-
-        return None, None
+        # 否则通过索引查找名称子串 / 拼音首字母
+        return self.symbol_index.lookup(stock_input)
 
     def get_stock_data(self, stock_code, target_date):
         """获取股票历史数据"""
+        # 计算数据获取范围（需要足够的历史数据计算技术指标）
+        target_dt = datetime.strptime(target_date, "%Y-%m-%d")
+        start_date = (target_dt - timedelta(days=100)).strftime("%Y%m%d")
+        end_date = (target_dt + timedelta(days=5)).strftime("%Y%m%d")
+        return self._fetch_history(stock_code, start_date, end_date)
+
+    def _fetch_history(self, stock_code, start_date, end_date, verbose=True):
+        """获取 [start_date, end_date] 区间的前复权日线"""
+        log = print if verbose else _silent
         try:
-            # 计算数据获取范围（需要足够的历史数据计算技术指标）
-            target_dt = datetime.strptime(target_date, "%Y-%m-%d")
-            start_date = (target_dt - timedelta(days=100)).strftime("%Y%m%d")
-            end_date = (target_dt + timedelta(days=5)).strftime("%Y%m%d")
-
-            print(f"正在获取股票数据: {stock_code}")
-            data = ak.stock_zh_a_hist(
-                symbol=stock_code,
-                period="daily",
-                start_date=start_date,
-                end_date=end_date,
-                adjust="qfq",
-            )
+            log(f"正在获取股票数据: {stock_code}")
+            # 本地缓存不复权K线+复权因子，读取时计算前复权价格（列名已是英文）
+            data = adjusted_bars(stock_code, start_date, end_date, adjust="qfq")
 
-            if data.empty:
-                print("未获取到股票数据")
+            if data is None or data.empty:
+                log("未获取到股票数据")
                 return None
 
-            # 重命名列
-            data = data.rename(
-                columns={
-                    "日期": "date",
-                    "开盘": "open",
-                    "最高": "high",
-                    "最低": "low",
-                    "收盘": "close",
-                    "成交量": "volume",
-                    "涨跌幅": "pct_change",
-                }
-            )
-
             data["date"] = pd.to_datetime(data["date"])
             data.set_index("date", inplace=True)
 
-            print(f"成功获取数据，时间范围: {data.index.min()} 到 {data.index.max()}")
+            log(f"成功获取数据，时间范围: {data.index.min()} 到 {data.index.max()}")
             return data
 
         except Exception as e:
-            print(f"获取股票数据失败: {e}")
+            log(f"获取股票数据失败: {e}")
             return None
 
-    def calculate_indicators(self, data):
+    def calculate_indicators(self, data, verbose=True):
         """计算技术指标"""
+        log = print if verbose else _silent
         try:
             # 计算均线
             data["ma5"] = talib.SMA(data.close.astype(float), timeperiod=5)
@@ -166,7 +142,7 @@ class StockScoreQuery:
             return data
 
         except Exception as e:
-            print(f"计算技术指标失败: {e}")
+            log(f"计算技术指标失败: {e}")
             return None
 
     def score_stock(self, data, target_date_str):
@@ -213,8 +189,11 @@ class StockScoreQuery:
             print(f"评分计算失败: {e}")
             return None
 
-    def _calculate_detailed_score(self, doji_data, confirm_data, strategy_data):
+    def _calculate_detailed_score(
+        self, doji_data, confirm_data, strategy_data, verbose=True
+    ):
         """详细评分计算"""
+        log = print if verbose else _silent
         score_details = {
             "total_score": 0,
             "doji_quality": 0,
@@ -244,17 +223,17 @@ class StockScoreQuery:
             score_details["conditions_failed"].append("十字星日价格数据异常")
             return score_details
 
-        print(f"\n=== 十字星形态分析 ===")
-        print(
+        log(f"\n=== 十字星形态分析 ===")
+        log(
             f"十字星日: 开盘{doji_open:.2f}, 最高{doji_high:.2f}, 最低{doji_low:.2f}, 收盘{doji_close:.2f}"
         )
-        print(
+        log(
             f"确认日: 开盘{confirm_open:.2f}, 最高{confirm_high:.2f}, 收盘{confirm_close:.2f}"
         )
 
         # === 1. 十字星质量评分 ===
         body_size = abs(doji_close - doji_open) / doji_open * 100
-        print(f"实体大小: {body_size:.3f}%")
+        log(f"实体大小: {body_size:.3f}%")
 
         doji_quality = 0
         if body_size < 0.5:
@@ -274,7 +253,7 @@ class StockScoreQuery:
             (min(doji_open, doji_close) - doji_low) / min(doji_open, doji_close) * 100
         )
 
-        print(f"上影线: {upper_shadow_pct:.2f}%, 下影线: {lower_shadow_pct:.2f}%")
+        log(f"上影线: {upper_shadow_pct:.2f}%, 下影线: {lower_shadow_pct:.2f}%")
 
         if upper_shadow_pct > 2 and lower_shadow_pct > 2:
             doji_quality += 15
@@ -305,10 +284,10 @@ class StockScoreQuery:
         volume_ma20_value = doji_data["volume_ma20"]
         volume_ratio = doji_volume / volume_ma20_value if volume_ma20_value > 0 else 999
 
-        print(f"\n=== 成交量分析 ===")
-        print(f"十字星日成交量: {doji_volume:,.0f}")
-        print(f"20日平均成交量: {volume_ma20_value:,.0f}")
-        print(f"缩量比例: {volume_ratio:.3f}")
+        log(f"\n=== 成交量分析 ===")
+        log(f"十字星日成交量: {doji_volume:,.0f}")
+        log(f"20日平均成交量: {volume_ma20_value:,.0f}")
+        log(f"缩量比例: {volume_ratio:.3f}")
 
         volume_score = 0
         if volume_ratio < 0.5:
@@ -327,8 +306,8 @@ class StockScoreQuery:
 
         # === 3. 反转强度评分 ===
         reversal_pct = (confirm_close - doji_high) / doji_high * 100
-        print(f"\n=== 反转确认分析 ===")
-        print(
+        log(f"\n=== 反转确认分析 ===")
+        log(
             f"反转幅度: {reversal_pct:.2f}% (确认日收盘 {confirm_close:.2f} vs 十字星最高 {doji_high:.2f})"
         )
 
@@ -357,7 +336,7 @@ class StockScoreQuery:
             score_details["conditions_failed"].append("确认日非阳线")
 
         # === 4. 技术面加分 ===
-        print(f"\n=== 技术面分析 ===")
+        log(f"\n=== 技术面分析 ===")
         tech_bonus = 0
 
         # 均线数据
@@ -365,7 +344,7 @@ class StockScoreQuery:
         ma20_confirm = confirm_data["ma20"]
         ma30_confirm = confirm_data["ma30"]
 
-        print(
+        log(
             f"确认日均线: MA5={ma5_confirm:.2f}, MA20={ma20_confirm:.2f}, MA30={ma30_confirm:.2f}"
         )
 
@@ -398,7 +377,7 @@ class StockScoreQuery:
         dea_confirm = confirm_data["dea_line"]
         macd_confirm = confirm_data["macd_line"]
 
-        print(
+        log(
             f"MACD指标: 十字星日DEA={dea_doji:.4f}, 确认日DEA={dea_confirm:.4f}, 确认日MACD={macd_confirm:.4f}"
         )
 
@@ -423,7 +402,7 @@ class StockScoreQuery:
 
         # 确认日涨幅加分
         confirm_daily_gain_pct = (confirm_close - confirm_open) / confirm_open * 100
-        print(f"确认日涨幅: {confirm_daily_gain_pct:.2f}%")
+        log(f"确认日涨幅: {confirm_daily_gain_pct:.2f}%")
 
         if confirm_daily_gain_pct > 9:
             tech_bonus += 20
@@ -438,7 +417,7 @@ class StockScoreQuery:
 
         # KDJ条件
         j_value = confirm_data["kdj_j"]
-        print(f"KDJ指标: J值={j_value:.1f}")
+        log(f"KDJ指标: J值={j_value:.1f}")
 
         if pd.notna(j_value):
             if j_value < 90:
@@ -453,8 +432,8 @@ class StockScoreQuery:
         confirmation_to_doji_volume_ratio = (
             confirm_volume / doji_volume if doji_volume > 0 else 999
         )
-        print(f"\n=== 成交量加分检查 ===")
-        print(f"确认日成交量比例: {confirmation_to_doji_volume_ratio:.2f}")
+        log(f"\n=== 成交量加分检查 ===")
+        log(f"确认日成交量比例: {confirmation_to_doji_volume_ratio:.2f}")
 
         if confirmation_to_doji_volume_ratio > 6.0:
             volume_bonus = 10
@@ -465,6 +444,7 @@ class StockScoreQuery:
             score_details["conditions_met"].append("确认日大幅放量确认")
 
         score_details["volume_bonus"] = volume_bonus
+        score_details["tech_bonus"] = tech_bonus
 
         # === 总分计算 ===
         total_score = doji_quality + volume_score + reversal_score + tech_bonus
@@ -486,6 +466,166 @@ class StockScoreQuery:
 
         return score_details
 
+    def score_frame(self, data):
+        """向量化评分：对每一行（作为策略执行日）同时计算评分
+
+        与 _calculate_detailed_score 规则完全一致，十字星日为前两天、确认日为前一天。
+        返回与 data 同索引的 DataFrame，前两行及价格异常的行为 NaN。
+        """
+        doji = data.shift(2)
+        confirm = data.shift(1)
+
+        d_open, d_high, d_low, d_close = (
+            doji["open"],
+            doji["high"],
+            doji["low"],
+            doji["close"],
+        )
+        d_volume = doji["volume"]
+        c_open, c_close, c_volume = confirm["open"], confirm["close"], confirm["volume"]
+
+        # === 1. 十字星质量 ===
+        body_size = (d_close - d_open).abs() / d_open * 100
+        body_top = np.maximum(d_open, d_close)
+        body_bottom = np.minimum(d_open, d_close)
+        upper_shadow_pct = (d_high - body_top) / body_top * 100
+        lower_shadow_pct = (body_bottom - d_low) / body_bottom * 100
+
+        doji_quality = np.select([body_size < 0.5, body_size < 1.0], [20, 15], 0)
+        doji_quality = doji_quality + np.select(
+            [
+                (upper_shadow_pct > 2) & (lower_shadow_pct > 2),
+                (upper_shadow_pct > 1) | (lower_shadow_pct > 1),
+            ],
+            [15, 10],
+            0,
+        )
+
+        # === 2. 缩量程度 ===
+        volume_ma20 = doji["volume_ma20"]
+        volume_ratio = (d_volume / volume_ma20).where(volume_ma20 > 0, 999)
+        volume_score = np.select(
+            [volume_ratio < 0.5, volume_ratio < 0.8, volume_ratio < 1.0], [20, 15, 10], 0
+        )
+
+        # === 3. 反转强度 ===
+        reversal_pct = (c_close - d_high) / d_high * 100
+        reversal_score = np.where(
+            c_close > d_high,
+            np.select([reversal_pct > 3, reversal_pct > 1], [20, 15], 10),
+            0,
+        )
+
+        # === 4. 技术面加分 ===
+        ma5, ma20, ma30 = confirm["ma5"], confirm["ma20"], confirm["ma30"]
+        tech_bonus = (
+            np.where(c_open < ma30, 20, 0)
+            + np.where(c_open < ma20, 10, 0)
+            + np.where(c_close > ma30, 10, 0)
+            + np.where(c_close > ma20, 20, 0)
+            + np.where((ma5 > ma20) & (ma20 > ma30), 20, 0)
+        )
+
+        dea_doji, dea_confirm = doji["dea_line"], confirm["dea_line"]
+        dea_ok = (
+            (dea_confirm > dea_doji)
+            & (dea_confirm < 0)
+            & (confirm["macd_line"] > dea_confirm)
+        )
+        tech_bonus = tech_bonus + np.where(
+            dea_ok, np.where(dea_confirm - dea_doji > 0.02, 15, 10), 0
+        )
+
+        confirm_daily_gain_pct = (c_close - c_open) / c_open * 100
+        tech_bonus = tech_bonus + np.select(
+            [confirm_daily_gain_pct > 9, confirm_daily_gain_pct > 5], [20, 10], 0
+        )
+
+        # === 5. 成交量加分 ===
+        confirmation_to_doji_volume_ratio = (c_volume / d_volume).where(d_volume > 0, 999)
+        volume_bonus = np.where(confirmation_to_doji_volume_ratio > 6.0, 10, 0)
+        tech_bonus = tech_bonus + volume_bonus
+
+        scores = pd.DataFrame(
+            {
+                "total_score": doji_quality + volume_score + reversal_score + tech_bonus,
+                "doji_quality": doji_quality,
+                "volume_score": volume_score,
+                "reversal_score": reversal_score,
+                "tech_bonus": tech_bonus,
+                "volume_bonus": volume_bonus,
+                "body_size": body_size,
+                "volume_ratio": volume_ratio,
+                "reversal_pct": reversal_pct,
+                "confirm_daily_gain_pct": confirm_daily_gain_pct,
+                "upper_shadow_pct": upper_shadow_pct,
+                "lower_shadow_pct": lower_shadow_pct,
+                "confirmation_to_doji_volume_ratio": confirmation_to_doji_volume_ratio,
+                "j_value": confirm["kdj_j"],
+                "is_valid_doji": (d_high > body_top) & (d_low < body_bottom),
+                "is_positive_candle": c_close > c_open,
+            },
+            index=data.index,
+        )
+
+        # 十字星日价格异常时单只评分直接返回0分
+        price_error = (d_open <= 0) | (d_close <= 0)
+        score_cols = [
+            "total_score",
+            "doji_quality",
+            "volume_score",
+            "reversal_score",
+            "tech_bonus",
+            "volume_bonus",
+        ]
+        scores[score_cols] = scores[score_cols].astype(float)
+        scores.loc[price_error, score_cols] = 0
+
+        # 前两行没有十字星日/确认日
+        scores.iloc[:2, : len(score_cols)] = np.nan
+        return scores
+
+    def batch_score(self, requests):
+        """批量评分：requests 为 {股票名称/代码: [日期, ...]}，只评分请求到的 股票 × 日期
+
+        每只股票只请求一次覆盖其全部日期的历史数据、只计算一次指标，
+        再用 score_frame 一次算出这些日期的评分。
+        返回评分明细 DataFrame（每行一个 股票 × 日期）。
+        """
+        if not self.code_name_map and not self.get_stock_list():
+            return pd.DataFrame()
+
+        rows = []
+        for stock_input, dates in requests.items():
+            stock_code, stock_name = self.find_stock_code(str(stock_input))
+            if not stock_code:
+                print(f"未找到股票: {stock_input}")
+                continue
+
+            target_dates = pd.to_datetime(sorted(set(dates)))
+            start_date = (target_dates.min() - timedelta(days=100)).strftime("%Y%m%d")
+            end_date = (target_dates.max() + timedelta(days=5)).strftime("%Y%m%d")
+
+            data = self._fetch_history(stock_code, start_date, end_date)
+            if data is not None:
+                data = self.calculate_indicators(data)
+            if data is None:
+                continue
+
+            scores = self.score_frame(data).reindex(target_dates)
+            scores.insert(0, "date", target_dates.strftime("%Y-%m-%d"))
+            scores.insert(0, "stock_name", stock_name)
+            scores.insert(0, "stock_code", stock_code)
+            rows.append(scores)
+
+        if not rows:
+            return pd.DataFrame()
+        result = pd.concat(rows, ignore_index=True)
+        # 目标日期不是交易日或数据不足时 total_score 为 NaN
+        return result.sort_values(
+            ["date", "total_score"], ascending=[True, False], na_position="last"
+        ).reset_index(drop=True)
+
     def print_score_report(self, stock_name, stock_code, target_date, score_details):
         """打印详细的评分报告"""
         if not score_details:
@@ -585,14 +725,81 @@ class StockScoreQuery:
         return True
 
 
+def load_batch_requests(csv_path):
+    """读取批量请求 CSV（列: stock 或 code, date），返回 {股票: [日期, ...]}，只包含文件中出现的组合"""
+    requests = pd.read_csv(csv_path, dtype=str)
+    stock_col = "stock" if "stock" in requests.columns else "code"
+    requests = requests[[stock_col, "date"]].dropna()
+    return {
+        stock: group["date"].tolist()
+        for stock, group in requests.groupby(stock_col, sort=False)
+    }
+
+
+def run_batch(args):
+    """批量模式：CSV 中的 股票,日期 组合，或 --stocks × --dates 的全部组合；结果打印并可保存为 CSV"""
+    if args.batch:
+        requests = load_batch_requests(args.batch)
+    else:
+        dates = [d for d in args.dates.split(",") if d]
+        requests = {s: dates for s in args.stocks.split(",") if s}
+
+    try:
+        for dates in requests.values():
+            for date in dates:
+                datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        print("日期格式错误，请使用 YYYY-MM-DD 格式")
+        return False
+
+    query_tool = StockScoreQuery()
+    result = query_tool.batch_score(requests)
+    if result.empty:
+        return False
+
+    pd.set_option("display.unicode.ambiguous_as_wide", True)
+    pd.set_option("display.unicode.east_asian_width", True)
+    columns = [
+        "stock_code",
+        "stock_name",
+        "date",
+        "total_score",
+        "doji_quality",
+        "volume_score",
+        "reversal_score",
+        "tech_bonus",
+        "volume_bonus",
+    ]
+    print(f"\n📊 批量评分结果 ({len(result)} 条):")
+    print(result[columns].to_string(index=False))
+
+    if args.output:
+        result.to_csv(args.output, index=False, encoding="utf-8-sig")
+        print(f"\n💾 评分明细已保存到: {args.output}")
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(description="股票评分查询工具")
-    parser.add_argument("--stock", "--name", help="股票名称(如: 大众交通)")
+    parser.add_argument("--stock", "--name", help="股票名称或拼音首字母(如: 大众交通 / dzjt)")
     parser.add_argument("--code", help="股票代码(如: 600611)")
-    parser.add_argument("--date", required=True, help="查询日期(格式: 2023-07-08)")
+    parser.add_argument("--date", help="查询日期(格式: 2023-07-08)")
+    parser.add_argument("--stocks", help="批量模式: 逗号分隔的股票名称/代码")
+    parser.add_argument("--dates", help="批量模式: 逗号分隔的日期")
+    parser.add_argument("--batch", help="批量模式: 包含 stock(或code),date 列的 CSV")
+    parser.add_argument("--output", help="批量模式: 评分明细保存路径")
 
     args = parser.parse_args()
 
+    if args.batch or (args.stocks and args.dates):
+        if not run_batch(args):
+            print("查询失败")
+        return
+
+    if not args.date:
+        print("请提供查询日期(--date)")
+        return
+
     # 验证参数
     if not args.stock and not args.code:
         print("请提供股票名称(--stock)或股票代码(--code)")
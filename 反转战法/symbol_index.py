@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+股票代码/名称检索索引
+
+StockScoreQuery 原先每次查询都要下载全市场实时行情来建立代码-名称映射，
+再对全部名称做线性子串扫描。本模块把主板股票列表持久化到本地，每天最多刷新一次：
+- 6位代码精确查找
+- 名称子串查找（预先建立的字符 n-gram 倒排索引）
+- 拼音首字母查找（需要安装 pypinyin，例如 "dzjt" -> 大众交通）
+
+索引当天有效时，查询完全不需要网络请求。
+"""
+
+import os
+import pickle
+from datetime import datetime
+
+from universe import load_universe
+
+try:
+    from pypinyin import Style, lazy_pinyin
+
+    PYPINYIN_AVAILABLE = True
+except ImportError:
+    PYPINYIN_AVAILABLE = False
+
+DEFAULT_INDEX_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "symbol_index.pkl"
+)
+
+NGRAM_SIZES = (1, 2)  # 单字 + 双字索引，足以覆盖中文名称的子串查询
+
+
+def _ngrams(text):
+    """生成文本的所有 1/2-gram"""
+    grams = set()
+    for n in NGRAM_SIZES:
+        for i in range(len(text) - n + 1):
+            grams.add(text[i : i + n])
+    return grams
+
+
+def _initials(name):
+    """名称的拼音首字母（小写），非中文字符原样保留"""
+    if not PYPINYIN_AVAILABLE:
+        return ""
+    letters = lazy_pinyin(name, style=Style.FIRST_LETTER, errors="default")
+    return "".join(letters).lower()
+
+
+class SymbolIndex:
+    """持久化的主板股票检索索引"""
+
+    def __init__(self, index_file=DEFAULT_INDEX_FILE):
+        self.index_file = index_file
+        self.built_date = None
+        self.code_name_map = {}  # 代码 -> 名称
+        self.stock_name_map = {}  # 名称 -> 代码
+        self.initials_map = {}  # 代码 -> 拼音首字母
+        self.name_grams = {}  # n-gram -> {代码}
+        self.initial_grams = {}  # 首字母 n-gram -> {代码}
+
+    # ------------------------------------------------------------------
+    # 构建与持久化
+    # ------------------------------------------------------------------
+    @classmethod
+    def load_or_refresh(cls, index_file=DEFAULT_INDEX_FILE, force=False):
+        """加载本地索引，过期（非当日）时才刷新；刷新失败则退回旧索引"""
+        index = cls(index_file)
+        loaded = index.load()
+        if loaded and not force and index.is_fresh():
+            return index
+        if index.refresh(force=force):
+            return index
+        if loaded:
+            print(f"⚠️  使用 {index.built_date} 的旧索引")
+            return index
+        return None
+
+    def is_fresh(self):
+        return self.built_date == datetime.now().strftime("%Y-%m-%d")
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            with open(self.index_file, "rb") as f:
+                state = pickle.load(f)
+            self.__dict__.update(state)
+            return True
+        except Exception as e:
+            print(f"读取股票索引失败: {e}")
+            return False
+
+    def save(self):
+        state = {k: v for k, v in self.__dict__.items() if k != "index_file"}
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.index_file)
+
+    def refresh(self, force=False):
+        """读取当日主板股票池（universe 快照，force 时重新下载）并重建索引"""
+        print("正在刷新股票索引...")
+        universe = load_universe(force_refresh=force)
+        if universe is None:
+            print("获取股票列表失败")
+            return False
+
+        self.build(zip(universe["代码"], universe["名称"]))
+        self.save()
+        print(f"成功索引 {len(self.code_name_map)} 只主板股票")
+        return True
+
+    def build(self, code_name_pairs):
+        self.built_date = datetime.now().strftime("%Y-%m-%d")
+        self.code_name_map = dict(code_name_pairs)
+        self.stock_name_map = {name: code for code, name in self.code_name_map.items()}
+        self.initials_map = {
+            code: _initials(name) for code, name in self.code_name_map.items()
+        }
+        self.name_grams = {}
+        self.initial_grams = {}
+        for code, name in self.code_name_map.items():
+            for gram in _ngrams(name):
+                self.name_grams.setdefault(gram, set()).add(code)
+            for gram in _ngrams(self.initials_map[code]):
+                self.initial_grams.setdefault(gram, set()).add(code)
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _candidates(query, grams):
+        """用 n-gram 倒排表求候选集合（交集），再由调用方精确校验"""
+        keys = [query[i : i + 2] for i in range(len(query) - 1)] or [query]
+        candidates = None
+        for key in keys:
+            codes = grams.get(key)
+            if not codes:
+                return set()
+            candidates = set(codes) if candidates is None else candidates & codes
+            if not candidates:
+                break
+        return candidates or set()
+
+    def _name_matches(self, query):
+        return {
+            code
+            for code in self._candidates(query, self.name_grams)
+            if query in self.code_name_map[code]
+        }
+
+    def search(self, query, limit=10):
+        """返回匹配的 [(代码, 名称)]，按名称长度排序（越短越接近）"""
+        query = query.strip()
+        if not query:
+            return []
+
+        if query.isdigit() and len(query) == 6:
+            name = self.code_name_map.get(query)
+            return [(query, name)] if name else []
+
+        codes = set()
+        if query.isascii() and query.isalpha():
+            text = query.lower()
+            codes = {
+                code
+                for code in self._candidates(text, self.initial_grams)
+                if text in self.initials_map[code]
+            }
+            # 未安装 pypinyin 或首字母无匹配时按名称查找（如 "TCL" -> TCL科技）
+            if not codes and query.upper() != query:
+                codes = self._name_matches(query.upper())
+        if not codes:
+            codes = self._name_matches(query)
+
+        matches = sorted(
+            ((code, self.code_name_map[code]) for code in codes),
+            key=lambda item: (len(item[1]), item[0]),
+        )
+        return matches[:limit]
+
+    def lookup(self, stock_input):
+        """与 StockScoreQuery.find_stock_code 语义一致：返回最匹配的 (代码, 名称)"""
+        if stock_input in self.stock_name_map:
+            return self.stock_name_map[stock_input], stock_input
+
+        matches = self.search(stock_input, limit=1)
+        if matches:
+            return matches[0]
+
+        # 输入包含完整名称的情况（如 "大众交通股份"），枚举输入的子串精确匹配
+        for length in range(len(stock_input) - 1, 1, -1):
+            for i in range(len(stock_input) - length + 1):
+                code = self.stock_name_map.get(stock_input[i : i + length])
+                if code:
+                    return code, stock_input[i : i + length]
+        return None, None
+
+
+if __name__ == "__main__":
+    import sys
+
+    index = SymbolIndex.load_or_refresh()
+    if index is not None:
+        for query in sys.argv[1:]:
+            print(f"{query}: {index.search(query)}")
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+确定性的合成A股行情
+
+各组件的性能只能在请求 akshare/qstock 时顺带测量，耗时被网络淹没且无法复现。
+generate_market 按随机种子生成可复现的全市场日K线，字段与 get_stock_data 一致
+（date/open/high/low/close/volume/pct_change），包含：
+- 主板代码与名称（少量 ST，涨跌停幅度 5%）
+- 市场因子 + 个股因子的厚尾收益率，波动率随时间聚集
+- 按前收盘价计算的涨跌停价，价格按 0.01 元取整
+- 新股在区间中途上市、随机停牌（停牌日无K线，与 akshare 一致）
+- 注入的缩量十字星反转形态：连续下跌 → 横盘 → 缩量十字星 → 放量阳线确认
+  （受 KDJ/DEA 条件影响，约三分之一能通过 check_doji_reversal_signal 的全部条件）
+
+用法:
+    market = generate_market(n_symbols=2000, start="2022-01-01", end="2024-12-31", seed=7)
+    market.bars                         # 长表: date, symbol, open, high, low, close, volume, pct_change
+    for code, data in market.by_symbol():   # 单只股票的 DataFrame，与 get_stock_data 返回格式相同
+        ...
+"""
+
+import numpy as np
+import pandas as pd
+
+from universe import MAIN_BOARD_PREFIXES
+
+FIELDS = ["open", "high", "low", "close", "volume", "pct_change"]
+
+ST_RATIO = 0.03  # ST 股票比例
+IPO_RATIO = 0.1  # 区间内新上市的股票比例
+SUSPENSIONS_PER_YEAR = 0.5  # 每只股票每年的平均停牌次数
+SUSPENSION_DAYS = 5  # 平均停牌天数
+DOJI_PER_YEAR = 2.0  # 每只股票每年注入的十字星反转形态数
+DECLINE_DAYS = 10  # 十字星之前的连续下跌天数
+DECLINE_RET = 0.015  # 下跌日的平均跌幅
+BASE_DAYS = 6  # 十字星之前的横盘天数（让MACD线回到DEA之上）
+WARMUP_DAYS = 40  # 上市后至少这么多个交易日才注入形态（保证指标有足够数据）
+
+DECLINE, BASE, DOJI, CONFIRM = 1, 2, 3, 4
+
+
+def _round_price(price):
+    return np.round(price, 2)
+
+
+class SyntheticMarket:
+    """合成行情：股票列表、长表K线和注入的十字星事件"""
+
+    def __init__(self, dates, stocks, bars, doji_events):
+        self.dates = pd.DatetimeIndex(dates)
+        self.stocks = stocks  # 代码, 名称, 上市日期
+        self.bars = bars  # 按 symbol、date 排序
+        self.doji_events = doji_events  # symbol, doji_date, confirm_date
+
+    @property
+    def symbols(self):
+        return self.stocks["代码"].tolist()
+
+    def by_symbol(self):
+        """依次产出 (代码, 单只股票K线)，不经过 groupby"""
+        codes = self.bars["symbol"].to_numpy()
+        bounds = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        starts = np.r_[0, bounds]
+        ends = np.r_[bounds, len(codes)]
+        columns = ["date"] + FIELDS
+        for lo, hi in zip(starts, ends):
+            data = self.bars.iloc[lo:hi][columns].reset_index(drop=True)
+            yield str(codes[lo]), data
+
+    def panel(self, field):
+        """单个字段的 日期 × 股票 DataFrame（停牌/未上市为 NaN）"""
+        return self.bars.pivot(index="date", columns="symbol", values=field).reindex(
+            index=self.dates, columns=self.symbols
+        )
+
+
+def _make_codes(rng, n_symbols):
+    pool = np.array(
+        [f"{prefix}{i:03d}" for prefix in MAIN_BOARD_PREFIXES for i in range(1000)]
+    )
+    if n_symbols > len(pool):
+        raise ValueError(f"最多生成 {len(pool)} 只主板股票")
+    return np.sort(rng.choice(pool, n_symbols, replace=False))
+
+
+def _runs_mask(rng, shape, starts_per_day, mean_length):
+    """在 (日期, 股票) 上随机放置若干段连续 True，用于停牌"""
+    n_days, n_symbols = shape
+    mask = np.zeros(shape, dtype=bool)
+    n_runs = rng.poisson(starts_per_day * n_days * n_symbols)
+    days = rng.integers(0, n_days, n_runs)
+    symbols = rng.integers(0, n_symbols, n_runs)
+    lengths = rng.geometric(1 / mean_length, n_runs)
+    for day, symbol, length in zip(days, symbols, lengths):
+        mask[day : day + length, symbol] = True
+    return mask
+
+
+def _doji_schedule(rng, n_days, listed_from, doji_rate):
+    """为每只股票安排互不重叠的 下跌 → 横盘 → 十字星 → 确认 形态，返回 (日期, 股票) 的形态编号"""
+    pattern = np.zeros((n_days, len(listed_from)), dtype=np.int8)
+    span = DECLINE_DAYS + BASE_DAYS + 2
+    for s, first in enumerate(listed_from):
+        lo = first + WARMUP_DAYS
+        if lo + span >= n_days:
+            continue
+        count = rng.poisson(doji_rate * (n_days - lo))
+        for start in np.sort(rng.integers(lo, n_days - span, count)):
+            window = pattern[start : start + span, s]
+            if window.any() or (start > 0 and pattern[start - 1, s]):
+                continue
+            window[:DECLINE_DAYS] = DECLINE
+            window[DECLINE_DAYS:-2] = BASE
+            window[-2] = DOJI
+            window[-1] = CONFIRM
+    return pattern
+
+
+def generate_market(
+    n_symbols=3000,
+    start="2022-01-01",
+    end="2024-12-31",
+    seed=42,
+    st_ratio=ST_RATIO,
+    ipo_ratio=IPO_RATIO,
+    suspensions_per_year=SUSPENSIONS_PER_YEAR,
+    doji_per_year=DOJI_PER_YEAR,
+):
+    """生成合成行情；相同参数与种子得到完全相同的结果
+
+    交易日为 start~end 之间的工作日（不含节假日）。逐日推进、按股票向量化，
+    涨跌停和价格取整依赖前一日收盘价，所以不能整体一次生成。
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, end)
+    n_days = len(dates)
+
+    # 股票列表
+    codes = _make_codes(rng, n_symbols)
+    is_st = rng.random(n_symbols) < st_ratio
+    names = np.array([f"合成{i:04d}" for i in range(n_symbols)], dtype=object)
+    names[is_st] = "ST" + names[is_st]
+    listed_from = np.where(
+        rng.random(n_symbols) < ipo_ratio, rng.integers(1, max(n_days, 2), n_symbols), 0
+    )
+
+    # 上市/停牌/形态
+    day_idx = np.arange(n_days)[:, None]
+    listed = day_idx >= listed_from[None, :]
+    suspended = _runs_mask(
+        rng, (n_days, n_symbols), suspensions_per_year / 250, SUSPENSION_DAYS
+    )
+    pattern = _doji_schedule(rng, n_days, listed_from, doji_per_year / 250)
+    in_pattern = (pattern > 0) | (np.roll(pattern, -1, axis=0) == DECLINE)
+    suspended &= ~in_pattern  # 形态期间不停牌
+    trading = listed & ~suspended
+
+    # 收益率：市场因子（波动聚集）+ 个股因子，学生t分布厚尾
+    log_vol = np.zeros(n_days)
+    shocks = rng.normal(0, 0.15, n_days)
+    for t in range(1, n_days):
+        log_vol[t] = 0.97 * log_vol[t - 1] + shocks[t]
+    market_ret = 0.012 * np.exp(log_vol) * rng.standard_t(4, n_days) / np.sqrt(2) + 0.0002
+    beta = rng.uniform(0.6, 1.4, n_symbols)
+    sigma = rng.uniform(0.012, 0.03, n_symbols)
+    # 注入的下跌段会拖低价格，用个股漂移抵消，避免长区间后价格跌到几毛钱
+    drift = doji_per_year * DECLINE_DAYS * DECLINE_RET / 250
+    base_volume = np.exp(rng.normal(np.log(2e5), 1.0, n_symbols))
+    limit = np.where(is_st, 0.05, 0.10)
+
+    # 结果数组 (日期, 股票)
+    shape = (n_days, n_symbols)
+    out = {field: np.full(shape, np.nan) for field in FIELDS}
+    prev_close = _round_price(np.exp(rng.normal(np.log(10), 0.7, n_symbols)).clip(2, None))
+    prev_high = prev_close.copy()
+
+    for t in range(n_days):
+        ret = beta * market_ret[t] + drift + sigma * rng.standard_t(4, n_symbols) / np.sqrt(2)
+        up = _round_price(prev_close * (1 + limit))
+        down = _round_price(prev_close * (1 - limit))
+        phase = pattern[t]
+
+        # 普通交易日（形态中的下跌/横盘日只改写收益率）
+        ret = np.where(phase == DECLINE, -np.abs(rng.normal(DECLINE_RET, 0.006, n_symbols)), ret)
+        ret = np.where(phase == BASE, rng.uniform(-0.004, 0.003, n_symbols), ret)
+        close = np.clip(_round_price(prev_close * (1 + ret)), down, up)
+        open_ = np.clip(
+            _round_price(prev_close * (1 + rng.normal(0, 0.4, n_symbols) * sigma)), down, up
+        )
+        wick = np.abs(rng.normal(0, 0.6, (2, n_symbols))) * sigma
+        high = np.clip(_round_price(np.maximum(open_, close) * (1 + wick[0])), None, up)
+        low = np.clip(_round_price(np.minimum(open_, close) * (1 - wick[1])), down, None)
+        volume = base_volume * np.exp(rng.normal(0, 0.3, n_symbols)) * (1 + 8 * np.abs(ret))
+
+        # 十字星：实体极小、上下影线明显、缩量
+        doji = phase == DOJI
+        if doji.any():
+            o = _round_price(prev_close * (1 + rng.normal(0, 0.003, n_symbols)))
+            c = _round_price(o * (1 + rng.uniform(-0.003, 0.003, n_symbols)))
+            shadow = rng.uniform(0.015, 0.035, (2, n_symbols))
+            h = np.clip(_round_price(np.maximum(o, c) * (1 + shadow[0])), None, up)
+            l = np.clip(_round_price(np.minimum(o, c) * (1 - shadow[1])), down, None)
+            open_ = np.where(doji, o, open_)
+            close = np.where(doji, c, close)
+            high = np.where(doji, h, high)
+            low = np.where(doji, l, low)
+            volume = np.where(doji, base_volume * rng.uniform(0.3, 0.6, n_symbols), volume)
+
+        # 确认日：放量阳线，收盘价高于十字星最高价
+        confirm = phase == CONFIRM
+        if confirm.any():
+            o = _round_price(prev_close * (1 + rng.uniform(0, 0.01, n_symbols)))
+            c = np.clip(_round_price(prev_high * (1 + rng.uniform(0.02, 0.05, n_symbols))), None, up)
+            h = np.clip(_round_price(c * (1 + rng.uniform(0, 0.01, n_symbols))), None, up)
+            l = np.clip(_round_price(o * (1 - rng.uniform(0, 0.01, n_symbols))), down, None)
+            open_ = np.where(confirm, o, open_)
+            close = np.where(confirm, c, close)
+            high = np.where(confirm, h, high)
+            low = np.where(confirm, l, low)
+            volume = np.where(confirm, base_volume * rng.uniform(2.5, 4, n_symbols), volume)
+
+        # 停牌/未上市的股票价格不变、不输出K线
+        active = trading[t]
+        out["open"][t, active] = open_[active]
+        out["high"][t, active] = high[active]
+        out["low"][t, active] = low[active]
+        out["close"][t, active] = close[active]
+        out["volume"][t, active] = np.round(volume[active])
+        out["pct_change"][t, active] = np.round((close[active] / prev_close[active] - 1) * 100, 2)
+        prev_close = np.where(active, close, prev_close)
+        prev_high = np.where(active, high, prev_high)
+
+    # 长表，按 symbol、date 排序
+    sym_pos, day_pos = np.nonzero(trading.T)
+    bars = pd.DataFrame(
+        {
+            "date": dates.values[day_pos],
+            "symbol": pd.Categorical.from_codes(sym_pos, categories=codes),
+            **{field: out[field][day_pos, sym_pos] for field in FIELDS},
+        }
+    )
+
+    stocks = pd.DataFrame(
+        {"代码": codes, "名称": names, "上市日期": dates.values[listed_from]}
+    )
+    doji_days, doji_syms = np.nonzero(pattern == DOJI)
+    doji_events = (
+        pd.DataFrame(
+            {
+                "symbol": codes[doji_syms],
+                "doji_date": dates.values[doji_days],
+                "confirm_date": dates.values[doji_days + 1],
+            }
+        )
+        .sort_values(["symbol", "doji_date"])
+        .reset_index(drop=True)
+    )
+    return SyntheticMarket(dates, stocks, bars, doji_events)
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+主板股票池
+
+backetest.py、daily_stock_screener.py、StockScoreQuery、QstockRealtimeScreener 各有一份
+“获取主板股票列表”的实现：逐行 apply 判断代码前缀和名称，iterrows 填充名称映射，
+每次运行都重新下载全市场列表。本模块统一为：
+- 代码前缀、ST/退市名称用向量化字符串操作一次筛选
+- 代码 -> 名称映射用 dict(zip(...)) 一次建立
+- 全市场 代码/名称 按日期保存快照（universe_snapshots/YYYY-MM-DD.pkl），
+  同一天重复运行直接读取本地文件
+
+用法:
+    universe = load_universe()             # 当日主板股票 DataFrame（代码, 名称）
+    names = code_name_map(universe)
+    mask = main_board_mask(df["代码"], df["名称"])  # 对任意行情表筛选
+"""
+
+import glob
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    from data_provider import akshare as ak
+
+    AKSHARE_AVAILABLE = True
+except ImportError:
+    AKSHARE_AVAILABLE = False
+
+MAIN_BOARD_PREFIXES = ("600", "601", "603", "605", "000", "001", "002")
+EXCLUDED_NAME_PATTERN = "ST|st|退"  # ST、*ST 及退市整理股票
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "universe_snapshots"
+)
+
+
+def main_board_mask(codes, names):
+    """主板且非ST/退市股票的布尔掩码（numpy 数组，与输入按位置对应）"""
+    codes = pd.Series(np.asarray(codes)).astype(str)
+    names = pd.Series(np.asarray(names)).astype(str)
+    return (
+        codes.str.startswith(MAIN_BOARD_PREFIXES)
+        & ~names.str.contains(EXCLUDED_NAME_PATTERN)
+    ).to_numpy()
+
+
+def find_code_name_columns(df):
+    """适配不同接口的代码/名称列名"""
+    code_col = next((c for c in df.columns if "代码" in str(c) or "code" in str(c).lower()), None)
+    name_col = next((c for c in df.columns if "名称" in str(c) or "name" in str(c).lower()), None)
+    if code_col is None or name_col is None:
+        code_col, name_col = df.columns[0], df.columns[1]
+    return code_col, name_col
+
+
+def filter_main_board(df):
+    """筛选主板股票，返回 (主板股票, 代码列, 名称列)"""
+    code_col, name_col = find_code_name_columns(df)
+    return df[main_board_mask(df[code_col], df[name_col])], code_col, name_col
+
+
+def code_name_map(df, code_col="代码", name_col="名称"):
+    return dict(zip(df[code_col], df[name_col]))
+
+
+# ----------------------------------------------------------------------
+# 按日期保存的全市场快照
+# ----------------------------------------------------------------------
+def _snapshot_path(date, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"{pd.Timestamp(date):%Y-%m-%d}.pkl")
+
+
+def fetch_all_stocks():
+    """下载全市场 代码/名称 列表（东方财富行情，失败时退回交易所代码表）"""
+    if not AKSHARE_AVAILABLE:
+        print("❌ akshare 未安装，无法获取股票列表")
+        return None
+    for api in ("stock_zh_a_spot_em", "stock_info_a_code_name"):
+        try:
+            data = getattr(ak, api)()
+        except Exception as e:
+            print(f"获取股票列表失败 ({api}): {e}")
+            continue
+        if data is not None and not data.empty:
+            code_col, name_col = find_code_name_columns(data)
+            return pd.DataFrame(
+                {"代码": data[code_col].astype(str), "名称": data[name_col].astype(str)}
+            )
+    return None
+
+
+def load_all_stocks(date=None, force_refresh=False, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """全市场 代码/名称 快照；当日快照不存在时下载并保存，历史日期只读本地"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    date = pd.Timestamp(date or today).strftime("%Y-%m-%d")
+    path = _snapshot_path(date, snapshot_dir)
+
+    if os.path.exists(path) and not force_refresh:
+        return pd.read_pickle(path)
+    if date != today:
+        return None  # 过去的股票池无法从当前行情重建
+
+    all_stocks = fetch_all_stocks()
+    if all_stocks is None:
+        return None
+    os.makedirs(snapshot_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    all_stocks.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+    return all_stocks
+
+
+def load_universe(date=None, force_refresh=False, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """主板股票池（代码, 名称）；当日获取失败时退回最近一次的快照"""
+    all_stocks = load_all_stocks(date, force_refresh, snapshot_dir)
+    if all_stocks is None and date is None:
+        snapshots = sorted(glob.glob(os.path.join(snapshot_dir, "*.pkl")))
+        if snapshots:
+            print(f"⚠️  使用 {os.path.basename(snapshots[-1])[:-4]} 的股票列表快照")
+            all_stocks = pd.read_pickle(snapshots[-1])
+    if all_stocks is None:
+        return None
+    universe, _, _ = filter_main_board(all_stocks)
+    return universe.reset_index(drop=True)
+
+
+# ----------------------------------------------------------------------
+# 时点股票池（上市/退市日期、ST 区间、板块）
+# ----------------------------------------------------------------------
+DEFAULT_HISTORY_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "universe_history.pkl"
+)
+FAR_FUTURE = pd.Timestamp("2262-01-01")  # 未退市股票的退市日期占位
+
+
+def board_of(codes):
+    """按代码前缀划分板块：main / gem(创业板) / star(科创板) / bse(北交所) / other"""
+    codes = pd.Series(np.asarray(codes)).astype(str)
+    conditions = [
+        codes.str.startswith(MAIN_BOARD_PREFIXES),
+        codes.str.startswith(("300", "301")),
+        codes.str.startswith(("688", "689")),
+        codes.str.startswith(("4", "8", "92")),
+    ]
+    return np.select(conditions, ["main", "gem", "star", "bse"], default="other")
+
+
+def _pick(df, candidates):
+    """返回第一个存在的列名"""
+    return next((col for col in candidates if col in df.columns), None)
+
+
+def _listing_frame(data, code_cols, name_cols, list_cols, delist_cols=()):
+    code_col = _pick(data, code_cols)
+    name_col = _pick(data, name_cols)
+    list_col = _pick(data, list_cols)
+    delist_col = _pick(data, delist_cols)
+    if code_col is None or list_col is None:
+        return None
+    return pd.DataFrame(
+        {
+            "代码": data[code_col].astype(str).str.zfill(6),
+            "名称": data[name_col].astype(str) if name_col else "",
+            "list_date": pd.to_datetime(data[list_col], errors="coerce"),
+            "delist_date": pd.to_datetime(data[delist_col], errors="coerce")
+            if delist_col
+            else pd.NaT,
+        }
+    )
+
+
+def fetch_listings():
+    """沪深交易所的上市、终止上市信息，返回 代码/名称/list_date/delist_date"""
+    if not AKSHARE_AVAILABLE:
+        print("❌ akshare 未安装，无法获取上市信息")
+        return None
+
+    sources = [
+        ("stock_info_sh_name_code", {"symbol": "主板A股"},
+         (["证券代码", "A股代码"], ["证券简称", "A股简称"], ["上市日期", "A股上市日期"])),
+        ("stock_info_sz_name_code", {"symbol": "A股列表"},
+         (["A股代码", "证券代码"], ["A股简称", "证券简称"], ["A股上市日期", "上市日期"])),
+        ("stock_info_sh_delist", {"symbol": "全部"},
+         (["公司代码", "证券代码"], ["公司简称", "证券简称"], ["上市日期"], ["暂停上市日期", "终止上市日期"])),
+        ("stock_info_sz_delist", {"symbol": "终止上市公司"},
+         (["证券代码", "公司代码"], ["证券简称", "公司简称"], ["上市日期"], ["终止上市日期", "暂停上市日期"])),
+    ]
+    frames = []
+    for api, kwargs, columns in sources:
+        try:
+            frame = _listing_frame(getattr(ak, api)(**kwargs), *columns)
+        except Exception as e:
+            print(f"⚠️  获取上市信息失败 ({api}): {e}")
+            continue
+        if frame is not None:
+            frames.append(frame)
+    if not frames:
+        return None
+
+    listings = pd.concat(frames, ignore_index=True)
+    # 同一代码同时出现在上市列表和退市列表时，保留带退市日期的记录
+    listings = listings.sort_values("delist_date", na_position="first")
+    listings = listings.drop_duplicates("代码", keep="last").reset_index(drop=True)
+    return listings
+
+
+def st_periods_from_snapshots(snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """由每日 代码/名称 快照推导 ST 区间 [start, end)，end 为 NaT 表示至今仍为 ST"""
+    paths = sorted(glob.glob(os.path.join(snapshot_dir, "*.pkl")))
+    if not paths:
+        return pd.DataFrame(columns=["代码", "start", "end"]), None
+
+    frames = []
+    for path in paths:
+        snapshot = pd.read_pickle(path)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "代码": snapshot["代码"].to_numpy(),
+                    "date": pd.Timestamp(os.path.basename(path)[:-4]),
+                    "is_st": snapshot["名称"].str.contains(EXCLUDED_NAME_PATTERN).to_numpy(),
+                }
+            )
+        )
+    flags = pd.concat(frames, ignore_index=True).sort_values(["代码", "date"], ignore_index=True)
+
+    # 每只股票按日期做游程编码：ST 状态变化处开始新区间
+    changed = flags["is_st"].ne(flags.groupby("代码")["is_st"].shift())
+    flags["run"] = changed.cumsum()
+    runs = flags.groupby("run").agg(代码=("代码", "first"), start=("date", "first"), is_st=("is_st", "first"))
+    runs["end"] = runs.groupby("代码")["start"].shift(-1)
+    periods = runs.loc[runs["is_st"], ["代码", "start", "end"]].reset_index(drop=True)
+    return periods, pd.Timestamp(os.path.basename(paths[0])[:-4])
+
+
+class UniverseHistory:
+    """时点股票池：按日期查询当时已上市、未退市、非ST的股票
+
+    ST 区间来自每日股票列表快照（load_all_stocks 每天保存一次）。
+    最早快照（st_since）之前没有 ST 记录，沿用最近快照里的 ST 状态：
+    至今仍为 ST 的股票在 st_since 之前一律按 ST 处理，已摘帽的股票按非ST处理。
+    这是近似，与只按当前名称剔除 ST 的做法一致，快照积累越久越准确。
+    """
+
+    def __init__(self, listings, st_periods, st_since=None, built_date=None):
+        self.listings = listings.reset_index(drop=True)
+        self.st_periods = st_periods.reset_index(drop=True)
+        self.st_since = st_since  # ST 区间覆盖的起始日期
+        self.built_date = built_date
+
+        self.codes = pd.Index(self.listings["代码"])
+        self.board = board_of(self.listings["代码"])
+        self._list_date = self.listings["list_date"].fillna(pd.Timestamp.min).to_numpy()
+        self._delist_date = self.listings["delist_date"].fillna(FAR_FUTURE).to_numpy()
+
+    @classmethod
+    def load_or_build(cls, history_file=DEFAULT_HISTORY_FILE, force=False):
+        """每天最多重建一次；重建失败时沿用旧表"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        cached = None
+        if os.path.exists(history_file):
+            try:
+                cached = pd.read_pickle(history_file)
+            except Exception as e:
+                print(f"⚠️  读取股票池历史失败: {e}")
+        if cached is not None and cached.built_date == today and not force:
+            return cached
+
+        history = cls.build()
+        if history is None:
+            if cached is not None:
+                print(f"⚠️  使用 {cached.built_date} 的股票池历史")
+            return cached
+        tmp_file = f"{history_file}.tmp"
+        pd.to_pickle(history, tmp_file)
+        os.replace(tmp_file, history_file)
+        return history
+
+    @classmethod
+    def build(cls, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+        print("🔧 正在构建时点股票池...")
+        load_all_stocks(snapshot_dir=snapshot_dir)  # 确保当日快照存在
+        listings = fetch_listings()
+        if listings is None:
+            return None
+        st_periods, st_since = st_periods_from_snapshots(snapshot_dir)
+        history = cls(listings, st_periods, st_since, datetime.now().strftime("%Y-%m-%d"))
+        print(
+            f"✅ 时点股票池: {len(listings)} 只股票（含 {listings['delist_date'].notna().sum()} 只已退市），"
+            f"{len(st_periods)} 个ST区间"
+        )
+        return history
+
+    def membership(self, dates, codes=None, board="main", exclude_st=True):
+        """日期 × 股票 的布尔矩阵（DataFrame）：当日已上市、未退市、属于 board、且非ST"""
+        dates = pd.DatetimeIndex(pd.to_datetime(dates))
+        if codes is None:
+            cols = np.arange(len(self.codes))
+            codes = self.codes
+        else:
+            codes = pd.Index([str(code) for code in codes])
+            cols = self.codes.get_indexer(codes)
+
+        known = cols >= 0
+        cols = np.where(known, cols, 0)
+        d = dates.to_numpy()[:, None]
+        member = (self._list_date[cols] <= d) & (d < self._delist_date[cols])
+        member &= known
+        if board is not None:
+            member &= self.board[cols] == board
+
+        if exclude_st and len(self.st_periods):
+            member &= ~self._st_matrix(dates, codes)
+        return pd.DataFrame(member, index=dates, columns=codes)
+
+    def _st_matrix(self, dates, codes):
+        """ST 标记矩阵：区间起止处 +1/-1，沿日期累加"""
+        if not dates.is_monotonic_increasing:
+            order = np.argsort(dates.to_numpy(), kind="stable")
+            matrix = np.empty((len(dates), len(codes)), dtype=bool)
+            matrix[order] = self._st_matrix(dates[order], codes)
+            return matrix
+
+        periods = self.st_periods
+        col = codes.get_indexer(periods["代码"])
+        periods = periods[col >= 0]
+        col = col[col >= 0]
+        start = dates.searchsorted(periods["start"].to_numpy(), side="left")
+        end = dates.searchsorted(periods["end"].fillna(FAR_FUTURE).to_numpy(), side="left")
+
+        diff = np.zeros((len(dates) + 1, len(codes)), dtype=np.int32)
+        np.add.at(diff, (start, col), 1)
+        np.add.at(diff, (end, col), -1)
+        matrix = np.cumsum(diff, axis=0)[:-1] > 0
+
+        if self.st_since is not None:
+            # 最早快照之前：沿用最近快照的 ST 状态（区间至今未结束即当前为 ST）
+            before = dates.searchsorted(pd.Timestamp(self.st_since), side="left")
+            matrix[:before, col[periods["end"].isna().to_numpy()]] = True
+        return matrix
+
+    def members(self, date, board="main", exclude_st=True):
+        """某一日的股票池代码"""
+        row = self.membership([date], board=board, exclude_st=exclude_st).iloc[0]
+        return row.index[row.to_numpy()].tolist()
+
+    def members_between(self, start, end, board="main", exclude_st=True):
+        """区间内任一交易日属于股票池的代码（含区间内退市、新上市的股票，整段为 ST 的除外）"""
+        dates = pd.bdate_range(start, end)
+        if dates.empty:
+            dates = pd.DatetimeIndex([pd.Timestamp(start)])
+        member = self.membership(dates, board=board, exclude_st=exclude_st)
+        return member.columns[member.to_numpy().any(axis=0)].tolist()
+
+    def eligible_mask(self, symbols, dates, board="main", exclude_st=True):
+        """长表逐行（股票, 日期）是否属于当日股票池，返回 numpy 布尔数组"""
+        symbol_codes, unique_symbols = pd.factorize(pd.Series(np.asarray(symbols)).astype(str))
+        date_codes, unique_dates = pd.factorize(pd.to_datetime(pd.Series(np.asarray(dates))))
+        matrix = self.membership(unique_dates, unique_symbols, board, exclude_st).to_numpy()
+        return matrix[date_codes, symbol_codes]
+
+    def name_map(self):
+        return code_name_map(self.listings)